@@ -0,0 +1,51 @@
+from collections import Counter
+from datetime import date, datetime, timedelta
+from pymongo import ASCENDING, UpdateOne
+
+
+def day_key(timestamp: datetime) -> str:
+    """UTC calendar day of a chat, as stored in emotion_daily.day."""
+    return timestamp.strftime("%Y-%m-%d")
+
+
+def rollup_updates(records) -> list:
+    """One upserting $inc per (user, day) for a batch of chat records."""
+    counts = Counter((r["user_id"], day_key(r["timestamp"]), r["emotion"]) for r in records)
+    per_day = {}
+    for (user_id, day, emotion), n in counts.items():
+        inc = per_day.setdefault((user_id, day), {"total": 0})
+        inc[f"counts.{emotion}"] = n
+        inc["total"] += n
+    return [
+        UpdateOne({"user_id": user_id, "day": day}, {"$inc": inc}, upsert=True)
+        for (user_id, day), inc in per_day.items()
+    ]
+
+
+async def apply_rollups(collection, records):
+    updates = rollup_updates(records)
+    if updates:
+        await collection.bulk_write(updates, ordered=False)
+
+
+async def daily_emotions(collection, user_id, start: date, end: date) -> dict:
+    """Per-day emotion counts for `user_id` between `start` and `end` inclusive, plus range totals."""
+    query = {"user_id": user_id, "day": {"$gte": start.isoformat(), "$lte": end.isoformat()}}
+    cursor = collection.find(query, {"_id": 0, "day": 1, "counts": 1, "total": 1}).sort("day", ASCENDING)
+    days = await cursor.to_list(None)
+
+    totals = Counter()
+    for doc in days:
+        totals.update(doc["counts"])
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "days": days,
+        "totals": dict(totals),
+        "total": sum(totals.values()),
+    }
+
+
+def default_range(days=30):
+    end = datetime.utcnow().date()
+    return end - timedelta(days=days - 1), end
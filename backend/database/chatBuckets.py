@@ -0,0 +1,78 @@
+import os
+from collections import defaultdict
+from bson import ObjectId
+from pymongo import UpdateOne
+from database.analytics import day_key
+
+# 🪣 "documents": one chats document per message (default). "buckets": one chat_buckets document per
+# user and UTC day holding up to BUCKET_MAX_TURNS turns, with short field names:
+#   {user_id, day, start, end, count, turns: [{i: _id, t: timestamp, m: message, r: bot_reply, e: emotion}]}
+# Reads always understand both layouts, so switching modes or migrating never hides history.
+STORAGE_MODE = os.getenv("CHAT_STORAGE_MODE", "documents")
+BUCKET_MAX_TURNS = int(os.getenv("CHAT_BUCKET_MAX_TURNS", "200"))
+
+_TURN_FIELDS = {"i": "_id", "t": "timestamp", "m": "message", "r": "bot_reply", "e": "emotion"}
+
+
+def to_turn(record: dict) -> dict:
+    return {short: record[name] for short, name in _TURN_FIELDS.items() if name in record}
+
+
+def from_turn(turn: dict) -> dict:
+    """A bucket turn in the same shape as a chats document."""
+    return {name: turn[short] for short, name in _TURN_FIELDS.items() if short in turn}
+
+
+def _chunks(records, size):
+    for i in range(0, len(records), size):
+        yield records[i:i + size]
+
+
+def bucket_updates(records, max_turns=BUCKET_MAX_TURNS):
+    """Upserting $push updates that append a batch of chat records to their day buckets.
+
+    Records for the same user and day go in with one $each. The filter only matches a bucket with
+    room for the whole group, so arrays stay capped: a full bucket makes the upsert start a new one.
+    Returns (updates, members), where members[i] lists the indexes in `records` that updates[i] writes.
+    """
+    groups = defaultdict(list)
+    for i, record in enumerate(records):
+        record.setdefault("_id", ObjectId())
+        groups[(record["user_id"], day_key(record["timestamp"]))].append(i)
+
+    updates, members = [], []
+    for (user_id, day), group in groups.items():
+        for indexes in _chunks(sorted(group, key=lambda i: (records[i]["timestamp"], records[i]["_id"])), max_turns):
+            chunk = [records[i] for i in indexes]
+            members.append(indexes)
+            updates.append(UpdateOne(
+                {"user_id": user_id, "day": day, "count": {"$lte": max_turns - len(chunk)}},
+                {
+                    "$push": {"turns": {"$each": [to_turn(r) for r in chunk]}},
+                    "$inc": {"count": len(chunk)},
+                    "$min": {"start": chunk[0]["timestamp"]},
+                    "$max": {"end": chunk[-1]["timestamp"]},
+                },
+                upsert=True,
+            ))
+    return updates, members
+
+
+def build_buckets(records, max_turns=BUCKET_MAX_TURNS) -> list:
+    """Complete bucket documents for records already sorted by (user_id, timestamp); used by the migration.
+
+    Each bucket takes the _id of its first chat, so rebuilding the same records gives the same
+    buckets and a resumed migration gets duplicate-key errors instead of a second copy.
+    """
+    buckets = []
+    for record in records:
+        day = day_key(record["timestamp"])
+        last = buckets[-1] if buckets else None
+        if last is None or last["user_id"] != record["user_id"] or last["day"] != day or last["count"] >= max_turns:
+            last = {"_id": record["_id"], "user_id": record["user_id"], "day": day,
+                    "start": record["timestamp"], "count": 0, "turns": []}
+            buckets.append(last)
+        last["turns"].append(to_turn(record))
+        last["count"] += 1
+        last["end"] = record["timestamp"]
+    return buckets
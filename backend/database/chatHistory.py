@@ -0,0 +1,167 @@
+from contextlib import aclosing
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING
+from database.chatBuckets import from_turn
+
+HISTORY_FIELDS = ("message", "bot_reply", "emotion", "timestamp")
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(doc: dict) -> str:
+    """Opaque page position: the (timestamp, _id) key of a chat document."""
+    return f"{doc['timestamp'].isoformat()}_{doc['_id']}"
+
+
+def decode_cursor(cursor: str):
+    try:
+        timestamp, _, oid = cursor.rpartition("_")
+        return datetime.fromisoformat(timestamp), ObjectId(oid)
+    except (ValueError, InvalidId):
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+
+
+def parse_fields(fields):
+    """Comma-separated field list -> tuple of history fields (all of them when empty)."""
+    if not fields:
+        return HISTORY_FIELDS
+    wanted = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in wanted if f not in HISTORY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Choose from: {', '.join(HISTORY_FIELDS)}")
+    return wanted
+
+
+def _keyset(position, op, timestamp_field, id_field):
+    # Keyset condition on (timestamp, _id): strictly past the cursor, ties broken by _id
+    timestamp, oid = position
+    return [{timestamp_field: {op: timestamp}}, {timestamp_field: timestamp, id_field: {op: oid}}]
+
+
+def _key(doc):
+    return doc["timestamp"], doc["_id"]
+
+
+def _past(doc, position, descending):
+    return position is None or (_key(doc) < position if descending else _key(doc) > position)
+
+
+async def _documents(collection, user_id, position, descending, fields, limit=None, batch_size=500):
+    """Chats from the one-document-per-message layout, in key order."""
+    query = {"user_id": user_id}
+    if position:
+        query["$or"] = _keyset(position, "$lt" if descending else "$gt", "timestamp", "_id")
+    direction = DESCENDING if descending else ASCENDING
+    # timestamp and _id are always read because the page cursors are built from them
+    projection = {"_id": 1, "timestamp": 1, **{field: 1 for field in fields}}
+    cursor = collection.find(query, projection).sort([("timestamp", direction), ("_id", direction)])
+    cursor = cursor.limit(limit) if limit else cursor.batch_size(batch_size)
+    try:
+        async for doc in cursor:
+            yield doc
+    finally:
+        await cursor.close()
+
+
+def _partition(docs, released):
+    ready, rest = [], []
+    for doc in docs:
+        (ready if released(doc) else rest).append(doc)
+    return ready, rest
+
+
+async def _bucketed(collection, user_id, position, descending):
+    """Chats from the bucket layout, in key order.
+
+    Buckets are read in order of their first (or, going back in time, last) turn; a bucket's turns
+    are only released once no later bucket can hold an earlier one, so overlapping buckets
+    (two writers racing to start one) still come out in order.
+    """
+    query = {"user_id": user_id}
+    if position:
+        query["end" if not descending else "start"] = {"$gte" if not descending else "$lte": position[0]}
+    bound, direction = ("end", DESCENDING) if descending else ("start", ASCENDING)
+    cursor = collection.find(query, {"turns": 1, "start": 1, "end": 1}).sort(bound, direction)
+
+    pending = []
+    try:
+        async for bucket in cursor:
+            ready, pending = _partition(pending, lambda doc: doc["timestamp"] > bucket[bound] if descending else doc["timestamp"] < bucket[bound])
+            for doc in sorted(ready, key=_key, reverse=descending):
+                yield doc
+            pending.extend(doc for doc in map(from_turn, bucket["turns"]) if _past(doc, position, descending))
+    finally:
+        await cursor.close()
+    for doc in sorted(pending, key=_key, reverse=descending):
+        yield doc
+
+
+async def _merged(chats, buckets, user_id, position, descending, fields, limit=None):
+    """Both layouts merged in key order; a chat present in both (mid-migration) is yielded once."""
+    sources = []
+    if chats is not None:
+        sources.append(_documents(chats, user_id, position, descending, fields, limit))
+    if buckets is not None:
+        sources.append(_bucketed(buckets, user_id, position, descending))
+
+    try:
+        heads = [await anext(source, None) for source in sources]
+        last = None
+        while any(head is not None for head in heads):
+            live = [(i, head) for i, head in enumerate(heads) if head is not None]
+            i, doc = (max if descending else min)(live, key=lambda pair: _key(pair[1]))
+            heads[i] = await anext(sources[i], None)
+            if _key(doc) != last:
+                last = _key(doc)
+                yield doc
+    finally:
+        for source in sources:
+            await source.aclose()  # closes the server-side cursors once enough chats were read
+
+
+def _public(doc, fields):
+    return {field: doc[field] for field in fields if field in doc}
+
+
+async def history_page(chats, buckets, user_id, limit=50, before=None, after=None, fields=HISTORY_FIELDS) -> dict:
+    """One page of a user's chats, oldest first, from either storage layout.
+
+    Without a cursor this is the newest `limit` chats; `before` pages back in time and `after`
+    pages forward. Each page returns the cursors to continue in either direction.
+    """
+    newer_first = not after
+    position = decode_cursor(before or after) if (before or after) else None
+    docs = []
+    async with aclosing(_merged(chats, buckets, user_id, position, newer_first, fields, limit + 1)) as merged:
+        async for doc in merged:
+            docs.append(doc)
+            if len(docs) > limit:
+                break
+
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    if newer_first:
+        docs.reverse()
+
+    return {
+        "history": [_public(doc, fields) for doc in docs],
+        "before": encode_cursor(docs[0]) if docs and (has_more or not newer_first) else None,
+        "after": encode_cursor(docs[-1]) if docs else after,
+        "has_more": has_more,
+    }
+
+
+async def iter_history(chats, buckets, user_id, after=None, limit=None, fields=HISTORY_FIELDS):
+    """Yields a user's chats oldest first straight off the cursors, each with its resume cursor."""
+    position = decode_cursor(after) if after else None
+    count = 0
+    async with aclosing(_merged(chats, buckets, user_id, position, False, fields, limit)) as merged:
+        async for doc in merged:
+            yield {**_public(doc, fields), "cursor": encode_cursor(doc)}
+            count += 1
+            if limit and count >= limit:
+                break
@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+from pymongo.errors import AutoReconnect, BulkWriteError, ConnectionFailure, ExecutionTimeout, WTimeoutError
+from database.dbConnection import chat_collection, bucket_collection, analytics_collection
+from database.analytics import apply_rollups
+from database.chatBuckets import STORAGE_MODE, BUCKET_MAX_TURNS, bucket_updates
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+TRANSIENT_ERRORS = (AutoReconnect, ConnectionFailure, ExecutionTimeout, WTimeoutError)
+DUPLICATE_KEY = 11000
+
+
+class ChatLogWriter:
+    """Write-behind persistence for chat records.
+
+    Routes hand records to `write()` and respond without waiting on MongoDB; a background task
+    drains the bounded queue with `insert_many`, flushing when `max_batch_size` records are waiting
+    or `flush_interval_ms` has passed since the first one. When the queue is full `write()` waits,
+    so a slow database pushes back on callers instead of growing memory. Readers that need their
+    own writes (history, clear) wait on `flush_user()`, which only covers that user's records.
+    Each written batch is also folded into the daily emotion rollups in `rollups`, if given.
+    With `layout="buckets"`, `collection` is chat_buckets and batches are appended as turns.
+    """
+
+    def __init__(self, collection, rollups=None, layout="documents", bucket_max_turns=BUCKET_MAX_TURNS,
+                 max_batch_size=100, flush_interval_ms=200.0, max_queue=10000, max_retries=5, retry_backoff_ms=100.0):
+        self.collection = collection
+        self.rollups = rollups
+        self.layout = layout
+        self.bucket_max_turns = bucket_max_turns
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff_ms / 1000
+        self._queue = None
+        self._task = None
+        self._pending = Counter()
+        self._drained = None
+        self.written = self.batches = self.retries = self.failed = self.backpressure_waits = 0
+        self.rollup_failures = 0
+        self.flush_ms_total = self.flush_ms_max = self.last_flush_ms = 0.0
+
+    def start(self):
+        """Starts the flush task; must be called from the running event loop (app lifespan)."""
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._drained = asyncio.Condition()
+        self._task = asyncio.create_task(self._run(), name="chat-log-writer")
+
+    async def write(self, record: dict):
+        if self._task is None:
+            # Not started (scripts, tests): write through
+            await self._flush([record])
+            return
+        if self._queue.full():
+            self.backpressure_waits += 1
+        self._pending[record.get("user_id")] += 1
+        await self._queue.put(record)
+
+    async def flush_user(self, user_id):
+        """Waits until the records already queued for `user_id` have been written (or given up on)."""
+        if self._task is None or not self._pending[user_id]:
+            return
+        async with self._drained:
+            await self._drained.wait_for(lambda: not self._pending[user_id])
+
+    async def flush(self):
+        """Waits until the queue is empty; used on shutdown."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def close(self):
+        if self._task is None:
+            return
+        await self.flush()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                logger.error("Dropped %d chat records: %s", len(batch), e)
+            finally:
+                for record in batch:
+                    self._queue.task_done()
+                    self._pending[record.get("user_id")] -= 1
+                    if not self._pending[record.get("user_id")]:
+                        del self._pending[record.get("user_id")]
+                async with self._drained:
+                    self._drained.notify_all()
+
+    async def _retrying(self, operation):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await operation()
+            except TRANSIENT_ERRORS:
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+
+    async def _flush(self, batch):
+        start = time.perf_counter()
+        rejected = await self._store(batch)
+        written = [record for i, record in enumerate(batch) if i not in rejected]
+        await self._roll_up(written)
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.written += len(written)
+        self.batches += 1
+        self.last_flush_ms = elapsed_ms
+        self.flush_ms_total += elapsed_ms
+        self.flush_ms_max = max(self.flush_ms_max, elapsed_ms)
+
+    async def _store(self, batch) -> set:
+        """Writes a batch in the configured layout; returns the indexes of records the server rejected."""
+        if self.layout == "buckets":
+            return await self._store_buckets(batch)
+        try:
+            # insert_many sets _id on each record, so a retry after a partial write only
+            # re-sends documents that then fail as duplicates, which count as written
+            await self._retrying(lambda: self.collection.insert_many(batch, ordered=False))
+        except BulkWriteError as e:
+            errors = [err for err in e.details.get("writeErrors", []) if err.get("code") != DUPLICATE_KEY]
+            if errors:
+                self.failed += len(errors)
+                logger.error("Failed to write %d chat records: %s", len(errors), errors[0].get("errmsg"))
+                return {err["index"] for err in errors}
+        return set()
+
+    async def _store_buckets(self, batch) -> set:
+        updates, members = bucket_updates(batch, self.bucket_max_turns)
+        pending = list(range(len(updates)))
+        retried = False
+
+        async def append():
+            nonlocal pending, retried
+            if retried:
+                # $push isn't idempotent, so a retry only re-sends the appends that didn't land
+                pending = await self._unwritten(batch, members, pending)
+            retried = True
+            if pending:
+                await self.collection.bulk_write([updates[i] for i in pending], ordered=False)
+
+        try:
+            await self._retrying(append)
+        except BulkWriteError as e:
+            # Unordered: the other updates went through, so only the failed ones' records are lost
+            rejected = {i for err in e.details.get("writeErrors", []) for i in members[pending[err["index"]]]}
+            self.failed += len(rejected)
+            logger.error("Failed to write %d chat records: %s", len(rejected), e.details["writeErrors"][0].get("errmsg"))
+            return rejected
+        return set()
+
+    async def _unwritten(self, batch, members, pending) -> list:
+        """The updates in `pending` whose turns aren't stored: each $push lands whole, so checking its first turn is enough."""
+        firsts = {i: batch[members[i][0]] for i in pending}
+        query = {
+            "user_id": {"$in": list({r["user_id"] for r in firsts.values()})},
+            "turns.i": {"$in": [r["_id"] for r in firsts.values()]},
+        }
+        stored = set(await self.collection.distinct("turns.i", query))
+        return [i for i in pending if firsts[i]["_id"] not in stored]
+
+    async def _roll_up(self, records):
+        if self.rollups is None or not records:
+            return
+        try:
+            # Not retried here: $inc isn't idempotent, and the driver's retryable writes already
+            # cover a single network blip safely
+            await apply_rollups(self.rollups, records)
+        except Exception as e:
+            # The chats themselves are stored; scripts.backfill_analytics can rebuild the counts
+            self.rollup_failures += 1
+            logger.error("Failed to update emotion rollups for %d chats: %s", len(records), e)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "written": self.written,
+            "batches": self.batches,
+            "avg_batch_size": round(self.written / self.batches, 2) if self.batches else 0.0,
+            "retries": self.retries,
+            "failed": self.failed,
+            "rollup_failures": self.rollup_failures,
+            "backpressure_waits": self.backpressure_waits,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "avg_flush_ms": round(self.flush_ms_total / self.batches, 2) if self.batches else 0.0,
+            "max_flush_ms": round(self.flush_ms_max, 2),
+        }
+
+
+chat_log_writer = ChatLogWriter(
+    bucket_collection if STORAGE_MODE == "buckets" else chat_collection,
+    rollups=analytics_collection,
+    layout=STORAGE_MODE,
+    max_batch_size=int(os.getenv("CHAT_LOG_BATCH_SIZE", "100")),
+    flush_interval_ms=float(os.getenv("CHAT_LOG_FLUSH_MS", "200")),
+    max_queue=int(os.getenv("CHAT_LOG_MAX_QUEUE", "10000")),
+    max_retries=int(os.getenv("CHAT_LOG_MAX_RETRIES", "5")),
+)
+metrics.register("chat_log_writer", chat_log_writer.stats)
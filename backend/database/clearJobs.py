@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from bson import ObjectId
+from bson.errors import InvalidId
+from database.dbConnection import db, chat_collection, bucket_collection, analytics_collection
+from database.chatBuckets import BUCKET_MAX_TURNS
+from database.analytics import day_key
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ClearJobManager:
+    """Deletes a user's chat history in the background, in bounded chunks.
+
+    Job state lives in the `jobs` collection so any API process can answer a poll. Chunks are
+    deleted by _id with a short pause in between, so one large clear never holds the collection
+    (or the event loop) long enough to stall other users; at most `concurrency` clears run at once.
+    Only chats logged before the clear was requested are deleted, in both storage layouts, and the
+    rollups lose exactly those chats: earlier days go whole, the request's own day is decremented.
+    Live jobs bump `updated_at` as they go, so `recover` can tell the ones a killed process left behind.
+    """
+
+    def __init__(self, jobs, chats, buckets, rollups, chunk_size=500, pause_ms=20.0, concurrency=2,
+                 stale_seconds=900.0):
+        self.jobs = jobs
+        self.chats = chats
+        self.buckets = buckets
+        self.rollups = rollups
+        self.chunk_size = chunk_size
+        self.bucket_chunk_size = max(1, chunk_size // BUCKET_MAX_TURNS)  # roughly chunk_size turns per delete
+        self.pause = pause_ms / 1000
+        self.stale_after = timedelta(seconds=stale_seconds)
+        self._slots = asyncio.Semaphore(concurrency)
+        self._tasks = set()
+        self.started = self.completed = self.failed = self.recovered = 0
+
+    async def submit(self, user_id) -> dict:
+        job = {
+            "_id": ObjectId(),
+            "type": "clear",
+            "user_id": user_id,
+            "status": "queued",
+            "deleted": 0,
+            "requested_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow(),
+            "finished_at": None,
+        }
+        await self.jobs.insert_one(job)
+        task = asyncio.create_task(self._run(job), name=f"clear-{job['_id']}")
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        self.started += 1
+        return self.public(job)
+
+    async def recover(self) -> int:
+        """Fails jobs still queued or running that no process has touched in `stale_after`.
+
+        A hard kill skips the shutdown path in `close`, so those jobs would otherwise be polled
+        forever (and never expire, since the TTL index keys on `finished_at`). Called at startup;
+        jobs live in another API process keep updating and are left alone.
+        """
+        cutoff = datetime.utcnow() - self.stale_after
+        try:
+            result = await self.jobs.update_many(
+                {
+                    "status": {"$in": ["queued", "running"]},
+                    "$or": [
+                        {"updated_at": {"$lt": cutoff}},
+                        {"updated_at": {"$exists": False}, "requested_at": {"$lt": cutoff}},
+                    ],
+                },
+                {"$set": {
+                    "status": "failed",
+                    "error": "Interrupted by a server restart; clear again to finish.",
+                    "finished_at": datetime.utcnow(),
+                }},
+            )
+        except Exception as e:
+            logger.warning("Recovering interrupted clear jobs failed: %s", e)  # not fatal at startup
+            return 0
+        if result.modified_count:
+            logger.warning("Marked %d interrupted clear jobs as failed", result.modified_count)
+        self.recovered += result.modified_count
+        return result.modified_count
+
+    async def get(self, job_id, user_id):
+        """The job if it exists and belongs to `user_id`, else None."""
+        try:
+            job = await self.jobs.find_one({"_id": ObjectId(job_id), "user_id": user_id})
+        except InvalidId:
+            return None
+        return self.public(job) if job else None
+
+    @staticmethod
+    def public(job) -> dict:
+        return {
+            "job_id": str(job["_id"]),
+            "status": job["status"],
+            "deleted": job["deleted"],
+            "requested_at": job["requested_at"],
+            "finished_at": job["finished_at"],
+            **({"error": job["error"]} if job.get("error") else {}),
+        }
+
+    async def _run(self, job):
+        user_id, requested_at = job["user_id"], job["requested_at"]
+        today = day_key(requested_at)
+        deleted = 0
+        removed_today = Counter()  # emotions of deleted chats from the request's day, for its rollup
+
+        async def progress(n):
+            nonlocal deleted
+            deleted += n
+            await self.jobs.update_one({"_id": job["_id"]}, {"$set": {"deleted": deleted, "updated_at": datetime.utcnow()}})
+            await asyncio.sleep(self.pause)
+
+        try:
+            async with self._slots:
+                await self.jobs.update_one({"_id": job["_id"]}, {"$set": {"status": "running", "updated_at": datetime.utcnow()}})
+                query = {"user_id": user_id, "timestamp": {"$lte": requested_at}}
+                while docs := await self.chats.find(query, {"timestamp": 1, "emotion": 1}).limit(self.chunk_size).to_list(None):
+                    result = await self.chats.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+                    removed_today.update(doc["emotion"] for doc in docs if day_key(doc["timestamp"]) == today)
+                    await progress(result.deleted_count)
+
+                # Buckets whose newest turn predates the request go whole; the few that straddle it
+                # (today's) only lose their older turns, atomically, so concurrent appends survive
+                query = {"user_id": user_id, "end": {"$lte": requested_at}}
+                while buckets := await self.buckets.find(query, {"count": 1, "day": 1, "turns.e": 1}).limit(self.bucket_chunk_size).to_list(None):
+                    await self.buckets.delete_many({"_id": {"$in": [b["_id"] for b in buckets]}})
+                    for bucket in buckets:
+                        if bucket["day"] == today:
+                            removed_today.update(turn["e"] for turn in bucket["turns"])
+                    await progress(sum(b["count"] for b in buckets))
+                straddling = {"user_id": user_id, "start": {"$lte": requested_at}, "end": {"$gt": requested_at}}
+                for bucket in await self.buckets.find(straddling, {"turns.t": 1, "turns.e": 1}).to_list(None):
+                    removed = [turn["e"] for turn in bucket["turns"] if turn["t"] <= requested_at]
+                    await self.buckets.update_one(
+                        {"_id": bucket["_id"]},
+                        {"$pull": {"turns": {"t": {"$lte": requested_at}}}, "$inc": {"count": -len(removed)}},
+                    )
+                    removed_today.update(removed)  # a bucket only straddles the request on its own day
+                    await progress(len(removed))
+                await self.buckets.delete_many({"user_id": user_id, "count": {"$lte": 0}})
+
+                # Earlier days only held deleted chats; the request's day keeps whatever came after it,
+                # so it's decremented rather than recomputed (live $inc updates may be landing on it)
+                await self.rollups.delete_many({"user_id": user_id, "day": {"$lt": today}})
+                if removed_today:
+                    inc = {f"counts.{emotion}": -n for emotion, n in removed_today.items()}
+                    inc["total"] = -sum(removed_today.values())
+                    await self.rollups.update_one({"user_id": user_id, "day": today}, {"$inc": inc})
+                    await self.rollups.delete_many({"user_id": user_id, "day": today, "total": {"$lte": 0}})
+            update = {"status": "done"}
+            self.completed += 1
+        except asyncio.CancelledError:
+            # Shutdown: record the job as finished so pollers stop waiting and the TTL index expires it
+            update = {"status": "failed", "error": "Interrupted by a server restart; clear again to finish."}
+            self.failed += 1
+            await self._finish(job, update, deleted)
+            raise
+        except Exception as e:
+            logger.error("Clear job %s failed: %s", job["_id"], e)
+            update = {"status": "failed", "error": str(e)}
+            self.failed += 1
+        await self._finish(job, update, deleted)
+
+    async def _finish(self, job, update, deleted):
+        await self.jobs.update_one(
+            {"_id": job["_id"]},
+            {"$set": {**update, "deleted": deleted, "finished_at": datetime.utcnow()}},
+        )
+
+    async def close(self):
+        """Cancels clears still in progress at shutdown; their job is marked failed and the user can clear again."""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "started": self.started,
+            "completed": self.completed,
+            "failed": self.failed,
+            "recovered": self.recovered,
+            "active": len(self._tasks),
+        }
+
+
+clear_jobs = ClearJobManager(
+    db["jobs"],
+    chat_collection,
+    bucket_collection,
+    analytics_collection,
+    chunk_size=int(os.getenv("CHAT_DELETE_CHUNK_SIZE", "500")),
+    pause_ms=float(os.getenv("CHAT_DELETE_PAUSE_MS", "20")),
+    concurrency=int(os.getenv("CHAT_CLEAR_CONCURRENCY", "2")),
+    stale_seconds=float(os.getenv("CHAT_CLEAR_STALE_SECONDS", "900")),
+)
+metrics.register("clear_jobs", clear_jobs.stats)
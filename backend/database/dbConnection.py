@@ -1,11 +1,30 @@
-from pymongo import MongoClient
+from pymongo import AsyncMongoClient
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
-client = MongoClient(MONGO_URI)
+
+def write_concern_w(value: str):
+    # "majority" / tag sets stay strings, "0" / "1" / "2" mean a number of acknowledging nodes
+    return int(value) if value.isdigit() else value
+
+# ⚙️ Connection pool, timeouts and write concern, all tunable per deployment
+client = AsyncMongoClient(
+    MONGO_URI,
+    maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+    minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+    maxIdleTimeMS=int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000")),
+    waitQueueTimeoutMS=int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000")),
+    serverSelectionTimeoutMS=int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+    connectTimeoutMS=int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+    socketTimeoutMS=int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "10000")),
+    w=write_concern_w(os.getenv("MONGO_WRITE_CONCERN", "1")),
+    journal=os.getenv("MONGO_JOURNAL", "false").lower() == "true",
+)
 db = client["mindmate_db"]
 chat_collection = db["chats"]
+bucket_collection = db["chat_buckets"]  # bucketed chat layout, see database/chatBuckets.py
 user_collection = db["user"]
+analytics_collection = db["emotion_daily"]  # per-user daily emotion counts, see database/analytics.py
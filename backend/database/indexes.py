@@ -0,0 +1,134 @@
+import logging
+from pymongo import ASCENDING, IndexModel
+from database.retention import retention_index, RETENTION_INDEX
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# 🗂️ Declared indexes per collection; ensure_indexes() makes the database match on startup
+INDEXES = {
+    "user": [
+        # Login/register lookups, and the guard against two accounts racing for one email
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "chats": [
+        # History, clear and context reads all filter on user_id and order by timestamp;
+        # _id breaks timestamp ties for keyset pagination
+        IndexModel([("user_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)], name="user_id_timestamp"),
+        # Retention: TTL expiry, or a plain index for the archive sweeper (see database/retention.py)
+        *filter(None, [retention_index()]),
+    ],
+    "chat_buckets": [
+        # Appends find the user's open bucket for the day
+        IndexModel([("user_id", ASCENDING), ("day", ASCENDING)], name="user_id_day"),
+        # History reads walk buckets by their newest turn (back in time) or oldest turn (forward)
+        IndexModel([("user_id", ASCENDING), ("end", ASCENDING)], name="user_id_end"),
+        IndexModel([("user_id", ASCENDING), ("start", ASCENDING)], name="user_id_start"),
+        *filter(None, [retention_index("end")]),
+    ],
+    "emotion_daily": [
+        # One rollup document per user and day; the upserting $inc relies on this being unique
+        IndexModel([("user_id", ASCENDING), ("day", ASCENDING)], name="user_id_day", unique=True),
+    ],
+    "jobs": [
+        # Finished background jobs are kept a day for polling, then expire
+        IndexModel([("finished_at", ASCENDING)], name="finished_at_ttl", expireAfterSeconds=86400),
+    ],
+}
+
+# Indexes this module creates only under some settings; dropped when the settings no longer call for them
+# (a leftover TTL index would otherwise keep deleting chats after retention is switched off)
+OPTIONAL_INDEXES = {"chats": [RETENTION_INDEX], "chat_buckets": [RETENTION_INDEX]}
+
+# Options that change what an index means; anything else (v, ns, background) is ignored when comparing
+_COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+last_report = {}
+
+
+def _spec(document: dict) -> tuple:
+    key = document["key"]
+    key = list(key.items()) if isinstance(key, dict) else [tuple(pair) for pair in key]
+    options = {option: document[option] for option in _COMPARED_OPTIONS if document.get(option) not in (None, False)}
+    return key, options
+
+
+def _ttl_only_change(current: dict, wanted: dict) -> bool:
+    if "expireAfterSeconds" not in current or "expireAfterSeconds" not in wanted:
+        return False
+    (current_key, current_options), (wanted_key, wanted_options) = _spec(current), _spec(wanted)
+    current_options.pop("expireAfterSeconds")
+    wanted_options.pop("expireAfterSeconds")
+    return current_key == wanted_key and current_options == wanted_options
+
+
+async def ensure_indexes(db) -> dict:
+    """Creates missing declared indexes and rebuilds ones whose definition changed.
+
+    Indexes that are not declared here are left alone, so manual or operational indexes survive,
+    except for OPTIONAL_INDEXES the current settings no longer declare. Returns a report of what
+    was created, rebuilt, modified, dropped or already in place.
+    """
+    report = {"created": [], "rebuilt": [], "modified": [], "dropped": [], "existing": []}
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+
+        declared = {model.document["name"] for model in models}
+        for name in OPTIONAL_INDEXES.get(collection_name, []):
+            if name in existing and name not in declared:
+                await collection.drop_index(name)
+                report["dropped"].append(f"{collection_name}.{name}")
+
+        for model in models:
+            name = model.document["name"]
+            wanted = _spec(model.document)
+            current = existing.get(name)
+            same_key = next((n for n, info in existing.items() if n != name and _spec(info)[0] == wanted[0]), None)
+
+            if current is not None and _spec(current) == wanted:
+                report["existing"].append(f"{collection_name}.{name}")
+                continue
+            if current is None and same_key is not None and _spec(existing[same_key]) == wanted:
+                # Same index under another name (e.g. created by hand); no need for a duplicate
+                report["existing"].append(f"{collection_name}.{same_key}")
+                continue
+
+            if current is not None and _ttl_only_change(current, model.document):
+                # A new retention period doesn't need a rebuild; collMod updates the TTL in place
+                await db.command("collMod", collection_name,
+                                 index={"name": name, "expireAfterSeconds": model.document["expireAfterSeconds"]})
+                report["modified"].append(f"{collection_name}.{name}")
+                continue
+
+            stale = name if current is not None else same_key
+            if stale is not None:
+                await collection.drop_index(stale)
+                report["rebuilt"].append(f"{collection_name}.{name}")
+            else:
+                report["created"].append(f"{collection_name}.{name}")
+            await collection.create_indexes([model])
+
+    last_report.clear()
+    last_report.update(report)
+    return report
+
+
+async def ensure_indexes_safely(db) -> None:
+    """Startup hook: index problems (e.g. duplicate emails blocking the unique index) are logged, not fatal."""
+    try:
+        report = await ensure_indexes(db)
+        changes = {k: v for k, v in report.items() if k != "existing" and v}
+        if changes:
+            logger.info("Index changes: %s", changes)
+    except Exception as e:
+        last_report.clear()
+        last_report["error"] = str(e)
+        logger.warning("Index reconciliation failed: %s", e)
+
+
+def stats() -> dict:
+    return dict(last_report)
+
+
+metrics.register("indexes", stats)
@@ -0,0 +1,132 @@
+import asyncio
+import gzip
+import logging
+import os
+from datetime import datetime, timedelta
+from bson import json_util
+from pymongo import ASCENDING, IndexModel
+from database.dbConnection import chat_collection, bucket_collection
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# ⏳ Chat retention: 0 keeps chats forever. "ttl" lets MongoDB expire them; "archive" has the
+# sweeper below write them to gzip NDJSON files before deleting.
+RETENTION_DAYS = int(os.getenv("CHAT_RETENTION_DAYS", "0"))
+RETENTION_MODE = os.getenv("CHAT_RETENTION_MODE", "ttl")
+ARCHIVE_DIR = os.getenv("CHAT_ARCHIVE_DIR", "archive/chats")
+RETENTION_INDEX = "timestamp_retention"
+
+
+def retention_index(field="timestamp"):
+    """The index retention needs on `field` for the current settings, or None when retention is off.
+
+    Chats expire on their timestamp; buckets on `end`, i.e. once their newest turn is past retention.
+    """
+    if RETENTION_DAYS <= 0:
+        return None
+    if RETENTION_MODE == "ttl":
+        return IndexModel([(field, ASCENDING)], name=RETENTION_INDEX, expireAfterSeconds=RETENTION_DAYS * 86400)
+    # Archive mode: same key without TTL, so the sweeper's range scan is indexed but nothing auto-expires
+    return IndexModel([(field, ASCENDING)], name=RETENTION_INDEX)
+
+
+class RetentionSweeper:
+    """Archives chats older than the retention window to gzip NDJSON, then deletes them, in chunks.
+
+    `targets` are (collection, timestamp field) pairs, so both storage layouts are swept. Each chunk
+    is appended to the sweep's archive file (as its own gzip member) and fsynced before the matching
+    documents are deleted, so a crash can duplicate archived records but never lose them.
+    """
+
+    def __init__(self, targets, retention_days, archive_dir, chunk_size=500, interval_seconds=3600.0,
+                 pause_ms=50.0):
+        self.targets = targets
+        self.retention = timedelta(days=retention_days)
+        self.archive_dir = archive_dir
+        self.chunk_size = chunk_size
+        self.interval = interval_seconds
+        self.pause = pause_ms / 1000
+        self._task = None
+        self.sweeps = self.archived = 0
+        self.last_sweep = None
+        self.last_error = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name="chat-retention-sweeper")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sweep()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error("Chat retention sweep failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    async def sweep(self) -> int:
+        """Archives and deletes every document past the retention window; returns how many."""
+        now = datetime.utcnow()
+        cutoff = now - self.retention
+        swept = 0
+        for collection, field in self.targets:
+            path = os.path.join(self.archive_dir, f"{collection.name}-{now:%Y%m%dT%H%M%S}.ndjson.gz")
+            archived = 0
+            while True:
+                cursor = collection.find({field: {"$lt": cutoff}}).sort(field, ASCENDING)
+                docs = await cursor.limit(self.chunk_size).to_list(None)
+                if not docs:
+                    break
+                await asyncio.to_thread(self._append, path, docs)
+                await collection.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+                archived += len(docs)
+                await asyncio.sleep(self.pause)  # leave room for user traffic between chunks
+            if archived:
+                logger.info("Archived %d %s documents older than %s to %s", archived, collection.name, cutoff.date(), path)
+            swept += archived
+
+        self.archived += swept
+        self.sweeps += 1
+        self.last_sweep = now.isoformat()
+        return swept
+
+    @staticmethod
+    def _append(path, docs):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "ab") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb") as f:
+                for doc in docs:
+                    f.write(json_util.dumps(doc, json_options=json_util.RELAXED_JSON_OPTIONS).encode() + b"\n")
+            raw.flush()
+            os.fsync(raw.fileno())
+
+    def stats(self) -> dict:
+        return {
+            "retention_days": self.retention.days,
+            "sweeps": self.sweeps,
+            "archived": self.archived,
+            "last_sweep": self.last_sweep,
+            "last_error": self.last_error,
+        }
+
+
+retention_sweeper = None
+if RETENTION_DAYS > 0 and RETENTION_MODE == "archive":
+    retention_sweeper = RetentionSweeper(
+        [(chat_collection, "timestamp"), (bucket_collection, "end")],
+        RETENTION_DAYS,
+        ARCHIVE_DIR,
+        chunk_size=int(os.getenv("CHAT_DELETE_CHUNK_SIZE", "500")),
+        interval_seconds=float(os.getenv("CHAT_RETENTION_SWEEP_SECONDS", "3600")),
+    )
+    metrics.register("retention_sweeper", retention_sweeper.stats)
@@ -1,8 +1,53 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends
 from routes.auth import router as auth_router
 from routes.chat import router as chat_router 
+from routes.metrics import router as metrics_router
+from routes.health import router as health_router
+from routes.analytics import router as analytics_router
+from routes.speech import router as speech_router
+from models.modelRegistry import registry
+from database.dbConnection import client, db
+from database.indexes import ensure_indexes_safely
+from database.chatLogWriter import chat_log_writer
+from database.clearJobs import clear_jobs
+from database.retention import retention_sweeper
+from utils.password_hasher import password_hasher
+from models.ttsEngine import speech_synthesizer, static_texts
+from models.asrEngine import speech_recognizer
 
-app = FastAPI(title="MindMate - Mental Health Chatbot")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Models load in the background; /readyz reports progress and chat routes return 503 until done
+    registry.start_loading()
+    if speech_recognizer is not None:
+        speech_recognizer.start_loading()  # /chat/voice answers 503 until the recognizer is loaded
+    await ensure_indexes_safely(db)
+    await password_hasher.start()
+    await clear_jobs.recover()  # clears a killed process left queued/running
+    chat_log_writer.start()
+    if retention_sweeper is not None:
+        retention_sweeper.start()
+    if speech_synthesizer is not None and speech_synthesizer.available:
+        speech_synthesizer.start_prerender(static_texts())  # crisis and coping audio, in the background
+    yield
+    await chat_log_writer.close()  # flush queued chat records before the client goes away
+    await clear_jobs.close()
+    if retention_sweeper is not None:
+        await retention_sweeper.close()
+    registry.close()
+    if speech_recognizer is not None:
+        speech_recognizer.close()
+    if speech_synthesizer is not None:
+        speech_synthesizer.close()
+    password_hasher.close()
+    await client.close()
+
+app = FastAPI(title="MindMate - Mental Health Chatbot", lifespan=lifespan)
 
 app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
 app.include_router(chat_router, prefix="/chat", tags=["Chat"])
+app.include_router(analytics_router, prefix="/analytics", tags=["Analytics"])
+app.include_router(speech_router, prefix="/speech", tags=["Speech"])
+app.include_router(metrics_router, prefix="/metrics", tags=["Metrics"])
+app.include_router(health_router, tags=["Health"])
@@ -0,0 +1,394 @@
+import json
+import os
+import re
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from math import gcd
+import numpy as np
+from fastapi import HTTPException
+from utils import metrics
+
+SAMPLE_RATE = 16000  # what both recognizers expect; uploads are resampled to it
+
+
+class Resampler:
+    """Streaming rational resampler: a windowed-sinc low-pass applied polyphase, chunk by chunk.
+
+    The rate ratio is reduced to up/down; each output sample is one dot product of `taps` input
+    samples with the filter phase it falls on. The cutoff sits below both Nyquist frequencies, so
+    44.1/48 kHz recordings don't fold 8-24 kHz energy into the speech band, and the last input
+    samples are carried over between chunks so chunk boundaries leave no seams.
+    """
+
+    def __init__(self, rate: int, target: int = SAMPLE_RATE, taps: int = 32):
+        if rate <= 0:
+            raise ValueError("Sample rate must be positive.")
+        g = gcd(rate, target)
+        self.up, self.down = target // g, rate // g
+        self.taps = taps
+        n = taps * self.up
+        cutoff = 0.45 / max(self.up, self.down)  # cycles per sample at the upsampled rate
+        t = np.arange(n) - (n - 1) / 2
+        h = 2 * cutoff * np.sinc(2 * cutoff * t) * np.kaiser(n, 8.0) * self.up
+        self.phases = h.reshape(taps, self.up).T  # phases[p, j] = h[p + up * j]
+        self._history = np.zeros(taps - 1)
+        self._start = 1 - taps  # input index of _history[0]; the stream starts after zeros
+        self._next = 0  # index of the next output sample
+
+    def process(self, samples) -> np.ndarray:
+        buf = np.concatenate((self._history, samples))
+        end = self._start + len(buf)
+        last = (end * self.up - 1) // self.down  # newest output whose input position has arrived
+        k = np.arange(self._next, last + 1)
+        position, phase = np.divmod(k * self.down, self.up)
+        window = buf[(position - self._start)[:, None] - np.arange(self.taps)]
+        out = np.einsum("kt,kt->k", window, self.phases[phase])
+
+        self._next = last + 1
+        keep = self._next * self.down // self.up - (self.taps - 1)
+        self._history, self._start = buf[keep - self._start:], keep
+        return out
+
+
+class AudioDecoder:
+    """Turns an uploaded byte stream into 16 kHz mono int16 PCM, chunk by chunk.
+
+    Accepts 16-bit PCM WAV (`audio/wav`; the header may arrive split across chunks and the data
+    length is ignored, so streamed WAVs work) or raw little-endian PCM (`audio/l16` / `audio/pcm`,
+    with `rate=` and `channels=` parameters, default 16000 and 1).
+    """
+
+    def __init__(self, content_type: str):
+        media_type, _, params = (content_type or "").partition(";")
+        media_type = media_type.strip().lower()
+        options = dict(re.findall(r"(\w+)\s*=\s*\"?([\w.]+)", params))
+        self.header = b""
+        self.format = None  # (channels, rate) once known
+        self._rest = b""
+        self._resampler = None
+        if media_type in ("audio/wav", "audio/x-wav", "audio/wave", "audio/vnd.wave"):
+            return
+        if media_type in ("audio/l16", "audio/pcm", "application/octet-stream"):
+            self.format = (int(options.get("channels", 1)), int(options.get("rate", SAMPLE_RATE)))
+            return
+        raise ValueError("Send 16-bit PCM audio as audio/wav or audio/l16;rate=<hz>.")
+
+    def _read_header(self):
+        buf = self.header
+        if len(buf) < 12:
+            return None
+        if buf[:4] != b"RIFF" or buf[8:12] != b"WAVE":
+            raise ValueError("Not a WAV file.")
+        pos, fmt = 12, None
+        while pos + 8 <= len(buf):
+            chunk_id, size = buf[pos:pos + 4], struct.unpack("<I", buf[pos + 4:pos + 8])[0]
+            if chunk_id == b"data":
+                if fmt is None:
+                    raise ValueError("WAV data before its format chunk.")
+                return fmt, pos + 8
+            if pos + 8 + size > len(buf):
+                return None
+            if chunk_id == b"fmt ":
+                tag, channels, rate = struct.unpack("<HHI", buf[pos + 8:pos + 16])
+                bits = struct.unpack("<H", buf[pos + 22:pos + 24])[0]
+                if tag not in (1, 0xFFFE) or bits != 16:
+                    raise ValueError("Only 16-bit PCM WAV is supported.")
+                fmt = (channels, rate)
+            pos += 8 + size + (size & 1)
+        return None
+
+    def feed(self, data: bytes) -> bytes:
+        if self.format is None:
+            self.header += data
+            parsed = self._read_header()
+            if parsed is None:
+                return b""
+            self.format, offset = parsed
+            data, self.header = self.header[offset:], b""
+
+        channels, rate = self.format
+        data = self._rest + data
+        usable = len(data) - len(data) % (2 * channels)
+        data, self._rest = data[:usable], data[usable:]
+        if not data:
+            return b""
+
+        samples = np.frombuffer(data, dtype="<i2")
+        if channels > 1:
+            samples = samples.reshape(-1, channels).mean(axis=1)
+        if rate != SAMPLE_RATE:
+            if self._resampler is None:
+                self._resampler = Resampler(rate)
+            samples = np.clip(np.rint(self._resampler.process(samples)), -32768, 32767)
+        return samples.astype("<i2").tobytes()
+
+
+class VoiceActivitySegmenter:
+    """Cuts a PCM stream into utterance segments on pauses, using frame energy.
+
+    A frame is speech when its RMS is `ratio` times above an adaptive noise floor (and above
+    `min_rms`). A segment closes after `pause_ms` of silence or at `max_segment_s`, keeping
+    `padding_ms` of audio on either side; segments with less than `min_speech_ms` of speech
+    are dropped as noise. Frame energies are computed for a whole chunk at once with NumPy.
+    """
+
+    def __init__(self, frame_ms=30, ratio=3.0, min_rms=300.0, pause_ms=500, padding_ms=200,
+                 min_speech_ms=150, max_segment_s=15.0):
+        self.frame_bytes = SAMPLE_RATE * frame_ms // 1000 * 2
+        self.frame_ms = frame_ms
+        self.ratio = ratio
+        self.min_rms = min_rms
+        self.pause_frames = pause_ms // frame_ms
+        self.padding_frames = padding_ms // frame_ms
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.max_frames = int(max_segment_s * 1000 // frame_ms)
+        self.noise_floor = None
+        self._rest = b""
+        self._frames = []  # current segment, or the pre-roll padding while not in speech
+        self._speech = 0  # speech frames in the current segment
+        self._silence = 0  # trailing silent frames
+        self.in_speech = False
+        self.heard_speech = False
+
+    @property
+    def silence_ms(self) -> int:
+        """Length of the current pause, for callers deciding the speaker is done."""
+        return self._silence * self.frame_ms
+
+    def feed(self, pcm: bytes):
+        """Adds 16 kHz int16 audio; returns the segments (PCM bytes) it completed."""
+        data = self._rest + pcm
+        count = len(data) // self.frame_bytes
+        self._rest = data[count * self.frame_bytes:]
+        if not count:
+            return []
+
+        samples = np.frombuffer(data[:count * self.frame_bytes], dtype="<i2").astype(np.float32)
+        rms = np.sqrt(np.mean(samples.reshape(count, -1) ** 2, axis=1))
+        if self.noise_floor is None:
+            self.noise_floor = float(np.percentile(rms, 10))
+
+        done = []
+        for i, energy in enumerate(rms):
+            frame = data[i * self.frame_bytes:(i + 1) * self.frame_bytes]
+            is_speech = energy > max(self.min_rms, self.noise_floor * self.ratio)
+            if not is_speech:
+                self.noise_floor = 0.95 * self.noise_floor + 0.05 * float(energy)
+            segment = self._add(frame, is_speech)
+            if segment:
+                done.append(segment)
+        return done
+
+    def _add(self, frame, is_speech):
+        self._frames.append(frame)
+        if not self.in_speech:
+            if is_speech:
+                self.in_speech = self.heard_speech = True
+                self._speech, self._silence = 1, 0
+            else:
+                self._silence += 1
+                if len(self._frames) > self.padding_frames:
+                    del self._frames[:len(self._frames) - self.padding_frames]
+            return None
+
+        if is_speech:
+            self._speech += 1
+            self._silence = 0
+        else:
+            self._silence += 1
+        if self._silence >= self.pause_frames or len(self._frames) >= self.max_frames:
+            return self._close()
+        return None
+
+    def _close(self):
+        drop = max(0, self._silence - self.padding_frames)  # trailing silence beyond the padding
+        frames = self._frames[:len(self._frames) - drop] if drop else self._frames
+        segment = b"".join(frames) if self._speech >= self.min_speech_frames else None
+        self._frames, self._speech, self.in_speech = [], 0, False
+        return segment
+
+    def flush(self):
+        """The segment in progress, if it has enough speech."""
+        segment = self._close() if self.in_speech else None
+        self._frames = []
+        return segment
+
+
+class VoskRecognizer:
+    """Kaldi models through Vosk: small, fast on CPU. `model` is the path of an unpacked model."""
+
+    name = "vosk"
+
+    def __init__(self, model):
+        from vosk import Model, SetLogLevel
+
+        SetLogLevel(-1)
+        self.model_name = model
+        self.model = Model(model)
+
+    def transcribe(self, pcm: bytes) -> str:
+        from vosk import KaldiRecognizer
+
+        recognizer = KaldiRecognizer(self.model, SAMPLE_RATE)
+        recognizer.AcceptWaveform(pcm)
+        return json.loads(recognizer.FinalResult()).get("text", "")
+
+
+class WhisperRecognizer:
+    """faster-whisper (CTranslate2) with int8 weights on CPU. `model` is a size ("base.en") or a path."""
+
+    name = "whisper"
+
+    def __init__(self, model, threads=1):
+        from faster_whisper import WhisperModel
+
+        self.model_name = model
+        self.model = WhisperModel(model, device="cpu", compute_type="int8", cpu_threads=threads)
+
+    def transcribe(self, pcm: bytes) -> str:
+        audio = np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768
+        segments, _ = self.model.transcribe(audio, beam_size=1, condition_on_previous_text=False)
+        return " ".join(segment.text.strip() for segment in segments)
+
+
+ASR_ENGINES = {"vosk": VoskRecognizer, "whisper": WhisperRecognizer}
+
+
+class StreamingTranscriber:
+    """Transcribes one audio stream segment by segment while the rest is still arriving.
+
+    Every segment the VAD closes goes to the recognizer pool right away, so by the time the
+    speaker stops, only the last segment is left to transcribe.
+    """
+
+    def __init__(self, recognizer, pool, segmenter):
+        self.recognizer = recognizer
+        self.pool = pool
+        self.segmenter = segmenter
+        self.futures = []
+        self.seconds = 0.0
+
+    def feed(self, pcm: bytes):
+        self.seconds += len(pcm) / (2 * SAMPLE_RATE)
+        for segment in self.segmenter.feed(pcm):
+            self.futures.append(self.pool.submit(self.recognizer.transcribe, segment))
+
+    def finish(self):
+        """Submits the trailing segment; returns every segment's Future, in order."""
+        segment = self.segmenter.flush()
+        if segment:
+            self.futures.append(self.pool.submit(self.recognizer.transcribe, segment))
+        return self.futures
+
+    def cancel(self):
+        for future in self.futures:
+            future.cancel()
+
+
+def join_transcript(texts) -> str:
+    return " ".join(text.strip() for text in texts if text and text.strip())
+
+
+class SpeechRecognizerService:
+    """Loads the configured recognizer in the background and hands out streaming transcribers.
+
+    Recognition runs on a pool of `workers` threads (both engines release the GIL), shared by all
+    streams; at most `max_streams` voice requests are transcribed at once, beyond that they get a 503.
+    """
+
+    def __init__(self, engine, model, workers=2, max_streams=8, vad_settings=None):
+        if engine not in ASR_ENGINES:
+            raise ValueError(f"Unknown ASR engine '{engine}', expected one of {list(ASR_ENGINES)} or 'off'")
+        self.engine = engine
+        self.model = model
+        self.workers = workers
+        self.max_streams = max_streams
+        self.vad_settings = vad_settings or {}
+        self.recognizer = None
+        self.pool = None
+        self.ready = False
+        self.error = None
+        self.active = 0
+        self.transcribed = self.rejected = 0
+        self.audio_seconds = 0.0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start_loading(self):
+        self._thread = threading.Thread(target=self.load, name="asr-loader", daemon=True)
+        self._thread.start()
+
+    def load(self):
+        try:
+            if self.engine == "whisper":
+                self.recognizer = WhisperRecognizer(self.model, threads=int(os.getenv("ASR_THREADS", "1")))
+            else:
+                self.recognizer = VoskRecognizer(self.model)
+            self.pool = ThreadPoolExecutor(self.workers, thread_name_prefix="asr")
+            self.ready = True
+        except Exception as e:
+            self.error = str(e)
+
+    def require_ready(self):
+        if not self.ready:
+            detail = "Speech recognition failed to load." if self.error else "Speech recognition is still loading. Try again shortly."
+            raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": "5"})
+
+    def open(self) -> StreamingTranscriber:
+        """A transcriber for one stream; pair with `release`. Raises 503 when too many are open."""
+        with self._lock:
+            if self.active >= self.max_streams:
+                self.rejected += 1
+                raise HTTPException(status_code=503, detail="Too many voice messages right now. Try again shortly.",
+                                    headers={"Retry-After": "2"})
+            self.active += 1
+        return StreamingTranscriber(self.recognizer, self.pool, VoiceActivitySegmenter(**self.vad_settings))
+
+    def release(self, transcriber: StreamingTranscriber):
+        with self._lock:
+            self.active -= 1
+            self.transcribed += 1
+            self.audio_seconds += transcriber.seconds
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "engine": self.engine,
+            "model": self.model,
+            "ready": self.ready,
+            "error": self.error,
+            "active_streams": self.active,
+            "max_streams": self.max_streams,
+            "transcribed": self.transcribed,
+            "rejected": self.rejected,
+            "audio_seconds": round(self.audio_seconds, 1),
+        }
+
+
+def build_recognizer_service():
+    """The service configured by ASR_* env vars, or None when ASR_ENGINE=off."""
+    engine = os.getenv("ASR_ENGINE", "vosk")
+    if engine == "off":
+        return None
+    default_model = "base.en" if engine == "whisper" else "asr/vosk-model-small-en-us-0.15"
+    return SpeechRecognizerService(
+        engine,
+        os.getenv("ASR_MODEL", default_model),
+        workers=int(os.getenv("ASR_WORKERS", "2")),
+        max_streams=int(os.getenv("ASR_MAX_STREAMS", "8")),
+        vad_settings={
+            "ratio": float(os.getenv("ASR_VAD_RATIO", "3.0")),
+            "min_rms": float(os.getenv("ASR_VAD_MIN_RMS", "300")),
+            "pause_ms": int(os.getenv("ASR_VAD_PAUSE_MS", "500")),
+            "max_segment_s": float(os.getenv("ASR_MAX_SEGMENT_SECONDS", "15")),
+        },
+    )
+
+
+speech_recognizer = build_recognizer_service()
+if speech_recognizer is not None:
+    metrics.register("asr", speech_recognizer.stats)
@@ -0,0 +1,68 @@
+import threading
+import time
+from concurrent.futures import Future
+from queue import Queue, Empty
+
+
+class MicroBatcher:
+    """Groups concurrent calls into small batches and runs each batch through one function call.
+
+    Callers `submit` single items and get a Future back. A background thread waits up to
+    `max_wait_ms` for more items (or until `max_batch_size` is reached), then calls
+    `batch_fn(items)`, which must return one result per item in the same order.
+    """
+
+    _STOP = object()
+
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=5.0, name="micro-batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms) / 1000.0)
+        self._queue = Queue()
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, item) -> Future:
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def close(self):
+        """Stops the worker once everything already queued has been processed."""
+        self._queue.put((self._STOP, None))
+        self._worker.join()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size and batch[-1][0] is not self._STOP:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            stop = batch[-1][0] is self._STOP
+            if stop:
+                batch.pop()
+
+            # Skip callers that gave up (cancelled futures) before we spend compute on them
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if batch:
+                self._process(batch)
+            if stop:
+                return
+
+    def _process(self, batch):
+        try:
+            results = self.batch_fn([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
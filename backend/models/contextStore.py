@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from database.chatHistory import history_page
+
+COPING_MARKER = "\n\n💡 *Coping Tip:*"
+
+
+class ConversationContextStore:
+    """Per-user ring buffer of recent (message, reply) turns, kept in memory.
+
+    A user's buffer is filled from stored chats (either layout) only when it is not in memory yet,
+    after `flush_user` has written any of the user's chats still queued; after that every turn is
+    appended here, so steady-state multi-turn replies need no reads. Crisis turns are left out: the
+    helpline block would crowd the real conversation out of the reply model's short context.
+    Sessions idle for longer than `idle_seconds`, or beyond `max_sessions`, are evicted.
+    """
+
+    def __init__(self, chats, buckets=None, max_turns=3, max_sessions=10000, idle_seconds=1800.0, flush_user=None):
+        self.chats = chats
+        self.buckets = buckets
+        self.flush_user = flush_user
+        self.max_turns = max_turns
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    @staticmethod
+    def _turn(message, reply):
+        # Coping tips are boilerplate; keep only the conversational part of the reply
+        return message, reply.split(COPING_MARKER, 1)[0]
+
+    async def history(self, user_id):
+        """Recent turns for `user_id`, oldest first."""
+        if self.max_turns <= 0:
+            return ()
+        with self._lock:
+            session = self._touch(user_id)
+            if session is not None:
+                self.hits += 1
+                return tuple(session)
+            self.misses += 1
+
+        if self.flush_user is not None:
+            await self.flush_user(user_id)  # the newest turns may still be in the write-behind queue
+        page = await history_page(self.chats, self.buckets, user_id, limit=self.max_turns,
+                                  fields=("message", "bot_reply", "emotion"))
+        turns = deque(
+            (self._turn(d["message"], d["bot_reply"]) for d in page["history"] if d.get("emotion") != "crisis"),
+            maxlen=self.max_turns,
+        )
+
+        with self._lock:
+            session = self._sessions.setdefault(user_id, {"turns": turns, "last_seen": time.monotonic()})
+            self._evict()
+            return tuple(session["turns"])
+
+    def append(self, user_id, message, reply, emotion=None):
+        if emotion == "crisis":
+            return
+        with self._lock:
+            session = self._touch(user_id)
+            if session is not None:
+                session.append(self._turn(message, reply))
+
+    def drop(self, user_id):
+        with self._lock:
+            self._sessions.pop(user_id, None)
+
+    def _touch(self, user_id):
+        entry = self._sessions.get(user_id)
+        if entry is None:
+            return None
+        now = time.monotonic()
+        if now - entry["last_seen"] > self.idle_seconds:
+            del self._sessions[user_id]
+            self.evictions += 1
+            return None
+        entry["last_seen"] = now
+        self._sessions.move_to_end(user_id)
+        return entry["turns"]
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._sessions:
+            user_id, entry = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - entry["last_seen"] <= self.idle_seconds:
+                break
+            del self._sessions[user_id]
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,52 @@
+import re
+from concurrent.futures import Future
+from utils.lru_cache import LRUTTLCache
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_message(text: str) -> str:
+    """Case-folds and collapses whitespace so trivially different messages share a cache entry."""
+    return _WHITESPACE.sub(" ", text).strip().casefold()
+
+
+class EmotionCache:
+    """Memoizes emotion labels per normalized message in front of the classifier.
+
+    `classify` takes a message and returns a Future for its label (e.g. `MicroBatcher.submit`).
+    Entries are keyed by the model name and backend (torch / onnx / onnx-int8, whose labels can
+    differ) too, and the cache is dropped whenever either changes.
+    """
+
+    def __init__(self, emotion_model, classify, max_entries=10000, ttl_seconds=3600.0):
+        self.emotion_model = emotion_model
+        self.classify = classify
+        self.cache = LRUTTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self._model = self._model_key()
+
+    def _model_key(self):
+        return self.emotion_model.model_name, getattr(self.emotion_model, "backend", None)
+
+    def submit(self, text: str) -> Future:
+        model = self._model_key()
+        if model != self._model:
+            self.cache.clear()
+            self._model = model
+
+        key = (*model, normalize_message(text))
+        label = self.cache.get(key)
+        if label is not None:
+            future = Future()
+            future.set_result(label)
+            return future
+
+        future = self.classify(text)
+        future.add_done_callback(lambda done: self._store(key, done))
+        return future
+
+    def _store(self, key, future: Future):
+        if not future.cancelled() and future.exception() is None:
+            self.cache.put(key, future.result())
+
+    def stats(self) -> dict:
+        return {"model_name": self._model[0], "backend": self._model[1], **self.cache.stats()}
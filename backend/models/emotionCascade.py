@@ -0,0 +1,252 @@
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+import numpy as np
+from models.emotionModel import EMOTION_LABELS
+
+DEFAULT_LEXICON = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config", "emotion_lexicon.json")
+
+_APOSTROPHES = str.maketrans("", "", "'’`")
+_TOKENS = re.compile(r"[a-z0-9]+|[.!?,;:]")
+_NEGATORS = frozenset({
+    "not", "no", "never", "cant", "cannot", "dont", "wont", "isnt", "arent", "wasnt", "werent", "didnt",
+    "doesnt", "couldnt", "shouldnt", "wouldnt", "nothing", "nobody", "without", "hardly",
+})
+NEGATION_SCOPE = 3  # tokens after a negator that get marked, unless punctuation ends the clause first
+
+
+def tokenize(text: str):
+    """(tokens, negated) with punctuation dropped; negated[i] marks tokens in a negator's scope."""
+    tokens, negated, scope = [], [], 0
+    for token in _TOKENS.findall(text.casefold().translate(_APOSTROPHES)):
+        if not token[0].isalnum():
+            scope = 0
+            continue
+        tokens.append(token)
+        negated.append(scope > 0)
+        scope = NEGATION_SCOPE if token in _NEGATORS else max(0, scope - 1)
+    return tokens, negated
+
+
+class EmotionLexicon:
+    """Words and short phrases per label, matched on tokens; negated matches ("not happy") don't count."""
+
+    def __init__(self, entries: dict, labels=EMOTION_LABELS):
+        self.labels = list(labels)
+        self.phrases = {}
+        for label, phrases in entries.items():
+            if label not in self.labels:
+                raise ValueError(f"Lexicon label '{label}' is not one of {self.labels}")
+            for phrase in phrases:
+                self.phrases[tuple(tokenize(phrase)[0])] = self.labels.index(label)
+        self.max_len = max(map(len, self.phrases), default=1)
+
+    @classmethod
+    def from_config(cls, path=None, labels=EMOTION_LABELS):
+        """Loads {"label": [phrases]} from EMOTION_LEXICON_PATH or the bundled config."""
+        path = path or os.getenv("EMOTION_LEXICON_PATH", DEFAULT_LEXICON)
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), labels)
+
+    def matches(self, tokens, negated):
+        """Label indices of every phrase found, one per occurrence."""
+        found = []
+        for n in range(1, self.max_len + 1):
+            for i in range(len(tokens) - n + 1):
+                label = self.phrases.get(tuple(tokens[i:i + n]))
+                if label is not None and not negated[i]:
+                    found.append(label)
+        return found
+
+
+class FastEmotionClassifier:
+    """First cascade stage: lexicon hits plus a linear model over hashed word n-grams.
+
+    Features are unigrams (prefixed when negated), bigrams and one feature per lexicon hit, hashed
+    into `dim` buckets with CRC32 so they are stable across processes. Scoring a batch is one
+    gather over the weight matrix and one `np.add.reduceat`. Until `fit` (or a saved model) gives
+    it weights, it scores with the lexicon alone.
+    """
+
+    def __init__(self, lexicon, labels=EMOTION_LABELS, dim=2**18, weights=None, bias=None, lexicon_weight=2.0):
+        self.lexicon = lexicon
+        self.labels = list(labels)
+        self.dim = dim
+        self.weights = weights  # (dim, labels) float32
+        self.bias = bias if bias is not None else np.zeros(len(self.labels), dtype=np.float32)
+        self.lexicon_weight = lexicon_weight
+
+    @property
+    def trained(self) -> bool:
+        return self.weights is not None
+
+    def _hash(self, feature: str) -> int:
+        return zlib.crc32(feature.encode()) % self.dim
+
+    def analyze(self, text):
+        """(hashed feature indices, per-label lexicon hit counts) for one message."""
+        tokens, negated = tokenize(text)
+        hits = self.lexicon.matches(tokens, negated)
+        unigrams = [f"n:{t}" if neg else t for t, neg in zip(tokens, negated)]
+        features = unigrams + [f"{a} {b}" for a, b in zip(unigrams, unigrams[1:])]
+        features += [f"lex:{self.labels[label]}" for label in hits]
+        indices = np.unique(np.fromiter((self._hash(f) for f in features), dtype=np.int64, count=len(features)))
+        return indices, np.bincount(np.asarray(hits, dtype=np.int64), minlength=len(self.labels))
+
+    def _batch(self, texts):
+        analyzed = [self.analyze(text) for text in texts]
+        indices = [a[0] for a in analyzed]
+        counts = np.stack([a[1] for a in analyzed]).astype(np.float32)
+        return indices, counts
+
+    def _logits(self, indices, counts):
+        if not self.trained:
+            return counts * self.lexicon_weight
+        lengths = np.fromiter((len(i) for i in indices), dtype=np.int64, count=len(indices))
+        logits = np.tile(self.bias, (len(indices), 1))
+        nonempty = lengths > 0
+        if nonempty.any():
+            flat = np.concatenate([i for i in indices if len(i)])
+            offsets = np.concatenate(([0], np.cumsum(lengths[nonempty])[:-1]))
+            logits[nonempty] += np.add.reduceat(self.weights[flat], offsets, axis=0)
+        return logits
+
+    @staticmethod
+    def _softmax(logits):
+        logits = logits - logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict_proba(self, texts):
+        return self._softmax(self._logits(*self._batch(texts)))
+
+    def fit(self, texts, labels, epochs=8, learning_rate=0.5, l2=1e-6, batch_size=64, seed=0):
+        """Softmax regression on (message, label) pairs, e.g. messages labelled by the transformer."""
+        targets = np.array([self.labels.index(label) for label in labels])
+        indices, counts = self._batch(texts)
+        self.weights = np.zeros((self.dim, len(self.labels)), dtype=np.float32)
+        self.bias = np.zeros(len(self.labels), dtype=np.float32)
+        rng = np.random.default_rng(seed)
+        for _ in range(epochs):
+            order = rng.permutation(len(texts))
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                batch_indices = [indices[i] for i in batch]
+                grad = self._softmax(self._logits(batch_indices, counts[batch]))
+                grad[np.arange(len(batch)), targets[batch]] -= 1
+                grad /= len(batch)
+                rows = np.concatenate(batch_indices)
+                owners = np.repeat(np.arange(len(batch)), [len(i) for i in batch_indices])
+                if l2:
+                    self.weights[rows] *= 1 - learning_rate * l2
+                np.add.at(self.weights, rows, -learning_rate * grad[owners])
+                self.bias -= learning_rate * grad.sum(axis=0)
+        return self
+
+    def save(self, path, thresholds=None):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez_compressed(
+            path, weights=self.weights, bias=self.bias, labels=np.array(self.labels), dim=self.dim,
+            thresholds=np.array([(thresholds or {}).get(label, np.nan) for label in self.labels]),
+        )
+
+    @classmethod
+    def load(cls, path, lexicon):
+        """(classifier, thresholds) from a file written by `save`."""
+        data = np.load(path)
+        labels = [str(label) for label in data["labels"]]
+        model = cls(lexicon, labels, int(data["dim"]), data["weights"], data["bias"])
+        thresholds = {label: float(t) for label, t in zip(labels, data["thresholds"]) if not np.isnan(t)}
+        return model, thresholds
+
+
+class EmotionCascade:
+    """Answers confident messages with the fast stage and escalates the rest to the transformer.
+
+    A message is answered by the fast stage when its top probability reaches the threshold of the
+    label it predicts (per-label thresholds from calibration, `default_threshold` otherwise).
+    """
+
+    def __init__(self, fast, thresholds=None, default_threshold=0.9):
+        self.fast = fast
+        self.thresholds = thresholds or {}
+        self.default_threshold = default_threshold
+        self._lock = threading.Lock()
+        self.answered = self.escalated = 0
+        self.fast_seconds = 0.0
+
+    def decide(self, texts):
+        """[(label, confidence, confident)] for each message."""
+        start = time.perf_counter()
+        probs = self.fast.predict_proba(texts)
+        elapsed = time.perf_counter() - start
+        best = probs.argmax(axis=1)
+        decisions = []
+        for row, label_id in zip(probs, best):
+            label = self.fast.labels[label_id]
+            confidence = float(row[label_id])
+            decisions.append((label, confidence, confidence >= self.thresholds.get(label, self.default_threshold)))
+        with self._lock:
+            self.fast_seconds += elapsed
+            confident = sum(d[2] for d in decisions)
+            self.answered += confident
+            self.escalated += len(decisions) - confident
+        return decisions
+
+    def submit(self, text, escalate) -> Future:
+        """Future for the label of `text`: resolved at once when confident, else `escalate(text)`."""
+        label, _, confident = self.decide([text])[0]
+        if not confident:
+            return escalate(text)
+        future = Future()
+        future.set_result(label)
+        return future
+
+    def stats(self) -> dict:
+        total = self.answered + self.escalated
+        return {
+            "mode": "model" if self.fast.trained else "lexicon",
+            "answered": self.answered,
+            "escalated": self.escalated,
+            "escalation_rate": round(self.escalated / total, 4) if total else 0.0,
+            "fast_us_per_message": round(self.fast_seconds / total * 1e6, 1) if total else 0.0,
+            "thresholds": {label: self.thresholds.get(label, self.default_threshold) for label in self.fast.labels},
+        }
+
+    @classmethod
+    def from_config(cls):
+        """The cascade from EMOTION_CASCADE_PATH if trained, else lexicon-only, with EMOTION_CASCADE_THRESHOLD as default."""
+        lexicon = EmotionLexicon.from_config()
+        path = os.getenv("EMOTION_CASCADE_PATH", "cascade/emotion.npz")
+        default = float(os.getenv("EMOTION_CASCADE_THRESHOLD", "0.9"))
+        if os.path.exists(path):
+            fast, thresholds = FastEmotionClassifier.load(path, lexicon)
+            return cls(fast, thresholds, default)
+        return cls(FastEmotionClassifier(lexicon), None, default)
+
+
+class CascadeEmotionModel:
+    """The cascade behind the EmotionModel interface (`predict`, `predict_batch`, `labels`, `model_name`)."""
+
+    def __init__(self, fallback, cascade=None):
+        self.fallback = fallback
+        self.cascade = cascade or EmotionCascade.from_config()
+        self.labels = fallback.labels
+        self.model_name = f"{fallback.model_name}+cascade"
+
+    def predict(self, text):
+        return self.predict_batch([text])[0]
+
+    def predict_batch(self, texts):
+        texts = list(texts)
+        decisions = self.cascade.decide(texts)
+        labels = [label if confident else None for label, _, confident in decisions]
+        escalate = [i for i, label in enumerate(labels) if label is None]
+        if escalate:
+            for i, label in zip(escalate, self.fallback.predict_batch([texts[i] for i in escalate])):
+                labels[i] = label
+        return labels
@@ -1,16 +1,98 @@
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
+import numpy as np
 import torch
+import os
+from models.snapshots import model_source, construct_lock, fetch_lock
+
+# "torch" runs the fp32 PyTorch model; the ONNX backends run through onnxruntime on CPU
+EMOTION_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# Output order of cardiffnlp/twitter-roberta-base-emotion
+EMOTION_LABELS = ['anger', 'joy', 'optimism', 'sadness']
+
+
+def export_onnx(model_name: str, onnx_dir: str) -> None:
+    """Exports the classifier to `onnx_dir/model.onnx` plus a dynamically int8-quantized `model.int8.onnx`."""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    os.makedirs(onnx_dir, exist_ok=True)
+    # Written under per-process temporary names and moved into place, so a worker starting alongside
+    # never opens a half-written model
+    fp32_tmp = os.path.join(onnx_dir, f"model.onnx.{os.getpid()}.tmp")
+    int8_tmp = os.path.join(onnx_dir, f"model.int8.onnx.{os.getpid()}.tmp")
+    source, kwargs = model_source(model_name)
+    with construct_lock:
+        model = AutoModelForSequenceClassification.from_pretrained(source, **kwargs)
+    model.eval()
+
+    dummy = torch.ones((1, 8), dtype=torch.long)
+    torch.onnx.export(
+        model,
+        (dummy, dummy),
+        fp32_tmp,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "logits": {0: "batch"},
+        },
+        opset_version=17,
+        dynamo=False,
+    )
+    quantize_dynamic(fp32_tmp, int8_tmp, weight_type=QuantType.QInt8)
+    os.replace(int8_tmp, os.path.join(onnx_dir, "model.int8.onnx"))
+    os.replace(fp32_tmp, os.path.join(onnx_dir, "model.onnx"))
+
 
 class EmotionModel:
-    def __init__(self):
+    def __init__(self, backend=None, onnx_dir=None):
         self.model_name = "cardiffnlp/twitter-roberta-base-emotion"
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-        self.model = AutoModelForSequenceClassification.from_pretrained(self.model_name)
-        self.labels = ['anger', 'joy', 'optimism', 'sadness']
+        self.backend = backend or os.getenv("EMOTION_BACKEND", "torch")
+        if self.backend not in EMOTION_BACKENDS:
+            raise ValueError(f"Unknown emotion backend '{self.backend}', expected one of {EMOTION_BACKENDS}")
+
+        source, kwargs = model_source(self.model_name)
+        self.tokenizer = AutoTokenizer.from_pretrained(source, **kwargs)
+        self.labels = list(EMOTION_LABELS)
+        self.model = None
+        self.session = None
+
+        if self.backend == "torch":
+            with construct_lock:
+                self.model = AutoModelForSequenceClassification.from_pretrained(source, **kwargs)
+        else:
+            self.onnx_dir = onnx_dir or os.getenv("EMOTION_ONNX_DIR", "onnx/emotion")
+            self.session = self._load_onnx_session()
+
+    def _load_onnx_session(self):
+        import onnxruntime as ort
+
+        filename = "model.int8.onnx" if self.backend == "onnx-int8" else "model.onnx"
+        path = os.path.join(self.onnx_dir, filename)
+        with fetch_lock(self.onnx_dir):
+            if not os.path.exists(path):
+                export_onnx(self.model_name, self.onnx_dir)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        return ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
 
     def predict(self, text):
-        inputs = self.tokenizer(text, return_tensors="pt", truncation=True)
-        outputs = self.model(**inputs)
+        return self.predict_batch([text])[0]
+
+    def predict_batch(self, texts):
+        """Classifies several messages with one padded forward pass."""
+        if self.session is not None:
+            inputs = self.tokenizer(list(texts), return_tensors="np", truncation=True, padding=True)
+            feed = {arg.name: inputs[arg.name].astype(np.int64) for arg in self.session.get_inputs()}
+            logits = self.session.run(["logits"], feed)[0]
+            label_ids = np.argmax(logits, axis=1).tolist()
+            return [self.labels[label_id] for label_id in label_ids]
+
+        inputs = self.tokenizer(list(texts), return_tensors="pt", truncation=True, padding=True)
+        with torch.no_grad():
+            outputs = self.model(**inputs)
         probs = torch.nn.functional.softmax(outputs.logits, dim=1)
-        label_id = torch.argmax(probs, dim=1).item()
-        return self.labels[label_id]
+        label_ids = torch.argmax(probs, dim=1).tolist()
+        return [self.labels[label_id] for label_id in label_ids]
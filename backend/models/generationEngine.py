@@ -0,0 +1,46 @@
+from concurrent.futures import Future
+from models.batching import MicroBatcher
+from models.responseModel import CRISIS_MESSAGE
+
+
+class GenerationEngine:
+    """Queues reply requests from concurrent callers and decodes them together with Blenderbot.
+
+    Each request keeps its own emotion prefix, so messages with different tones still share
+    one padded `generate` call. Requests are split by decoding profile inside a batch, since
+    generation settings apply to the whole call. Crisis messages never enter the queue.
+    """
+
+    def __init__(self, response_model, max_batch_size=8, max_wait_ms=10.0):
+        self.response_model = response_model
+        self._batcher = MicroBatcher(
+            self._generate, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, name="generation-engine"
+        )
+
+    def submit(self, user_input: str, emotion: str, profile=None, history=()) -> Future:
+        """Returns a Future that resolves to the full reply (bot text plus coping tips).
+
+        `history` holds the user's recent (message, reply) turns, oldest first.
+        """
+        if self.response_model.detect_crisis(user_input):
+            future = Future()
+            future.set_result(CRISIS_MESSAGE)
+            return future
+        profile = profile or self.response_model.default_profile
+        self.response_model.decoding_settings(profile)  # unknown profiles fail here, not inside a shared batch
+        return self._batcher.submit((user_input, emotion, profile, tuple(history)))
+
+    def close(self):
+        self._batcher.close()
+
+    def _generate(self, requests):
+        replies = [None] * len(requests)
+        by_profile = {}
+        for i, (_, _, profile, _) in enumerate(requests):
+            by_profile.setdefault(profile, []).append(i)
+
+        for profile, indices in by_profile.items():
+            prompts = [self.response_model.build_context_prompt(requests[i][0], requests[i][1], requests[i][3]) for i in indices]
+            for i, reply in zip(indices, self.response_model.generate_batch(prompts, profile)):
+                replies[i] = self.response_model.format_reply(reply, requests[i][1])
+        return replies
@@ -0,0 +1,212 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from models.emotionModel import EmotionModel
+from models.responseModel import ResponseModel
+from models.batching import MicroBatcher
+from models.emotionCache import EmotionCache
+from models.generationEngine import GenerationEngine
+from models.workerPool import InferenceWorkerPool
+from utils import metrics
+
+
+class ModelRegistry:
+    """Loads both models in the background at startup and owns everything built on top of them.
+
+    With INFERENCE_WORKERS > 0 the models live in a pool of worker processes instead, and this
+    process only keeps the emotion cache. Routes go through `classify`/`generate`/`stream` and
+    only after `ready` is set; `require_ready` turns that into a 503.
+    """
+
+    def __init__(self, workers=None, reply_cache=None, cascade=None):
+        self.workers = int(os.getenv("INFERENCE_WORKERS", "0")) if workers is None else workers
+        self.timeout = float(os.getenv("INFERENCE_TIMEOUT_SECONDS", "60"))
+        self.default_profile = os.getenv("RESPONSE_PROFILE", "quality")
+        self.use_reply_cache = os.getenv("SEMANTIC_CACHE", "off") == "on" if reply_cache is None else reply_cache
+        self.use_cascade = os.getenv("EMOTION_CASCADE", "off") == "on" if cascade is None else cascade
+        self.emotion_model = None
+        self.response_model = None
+        self.emotion_batcher = None
+        self.emotion_cache = None
+        self.generation_engine = None
+        self.pool = None
+        self.reply_cache = None
+        self.cascade = None
+
+        self.ready = False
+        self.error = None
+        self.timeouts = 0
+        stages = ("worker_pool",) if self.workers > 0 else ("emotion_model", "response_model", "warmup")
+        if self.use_reply_cache:
+            stages += ("reply_cache",)
+        if self.use_cascade:
+            stages += ("emotion_cascade",)
+        self.progress = {name: {"state": "pending"} for name in stages}
+        self._thread = None
+
+    def start_loading(self):
+        """Loads in a background thread so the server can bind and answer probes meanwhile."""
+        self._thread = threading.Thread(target=self.load, name="model-loader", daemon=True)
+        self._thread.start()
+
+    def load(self):
+        try:
+            with ThreadPoolExecutor(max_workers=3, thread_name_prefix="model-load") as pool:
+                reply_cache = pool.submit(self._timed, "reply_cache", self._load_reply_cache) if self.use_reply_cache else None
+                if self.use_cascade:
+                    self.cascade = self._timed("emotion_cascade", self._load_cascade)
+
+                if self.workers > 0:
+                    self._timed("worker_pool", self._start_pool)
+                else:
+                    emotion = pool.submit(self._timed, "emotion_model", EmotionModel)
+                    response = pool.submit(self._timed, "response_model", ResponseModel)
+                    self.emotion_model, self.response_model = emotion.result(), response.result()
+                    self._build_pipeline()
+                    self._timed("warmup", self._warm_up)
+
+                if reply_cache is not None:
+                    self.reply_cache = reply_cache.result()
+            self.ready = True
+        except Exception as e:
+            self.error = str(e)
+
+    def _timed(self, name, fn):
+        self.progress[name] = {"state": "loading"}
+        start = time.monotonic()
+        try:
+            result = fn()
+        except Exception as e:
+            self.progress[name] = {"state": "failed", "error": str(e)}
+            raise
+        self.progress[name] = {"state": "ready", "seconds": round(time.monotonic() - start, 2)}
+        return result
+
+    def _build_pipeline(self):
+        # ⚡ Concurrent /chat requests share one padded RoBERTa forward pass
+        self.emotion_batcher = MicroBatcher(
+            self.emotion_model.predict_batch,
+            max_batch_size=int(os.getenv("EMOTION_MAX_BATCH_SIZE", "16")),
+            max_wait_ms=float(os.getenv("EMOTION_MAX_WAIT_MS", "5")),
+            name="emotion-batcher",
+        )
+
+        # 🗂️ Repeated messages ("I feel sad", "hi") skip the classifier entirely
+        self.emotion_cache = EmotionCache(
+            self.emotion_model,
+            self._with_cascade(self.emotion_batcher.submit),
+            max_entries=int(os.getenv("EMOTION_CACHE_MAX_ENTRIES", "10000")),
+            ttl_seconds=float(os.getenv("EMOTION_CACHE_TTL_SECONDS", "3600")),
+        )
+        metrics.register("emotion_cache", self.emotion_cache.stats)
+
+        # 🧵 Blenderbot replies are decoded together in padded batches
+        self.generation_engine = GenerationEngine(
+            self.response_model,
+            max_batch_size=int(os.getenv("GENERATION_MAX_BATCH_SIZE", "8")),
+            max_wait_ms=float(os.getenv("GENERATION_MAX_WAIT_MS", "10")),
+        )
+
+    def _start_pool(self):
+        # 🧰 Each worker loads and warms up its own models under a pinned torch thread budget
+        self.pool = InferenceWorkerPool(
+            self.workers, torch_threads=int(os.getenv("INFERENCE_TORCH_THREADS", "1"))
+        )
+        self.pool.wait_ready(timeout=float(os.getenv("INFERENCE_START_TIMEOUT_SECONDS", "900")))
+        metrics.register("worker_pool", self.pool.stats)
+
+        self.emotion_cache = EmotionCache(
+            self.pool,
+            self._with_cascade(self.pool.classify),
+            max_entries=int(os.getenv("EMOTION_CACHE_MAX_ENTRIES", "10000")),
+            ttl_seconds=float(os.getenv("EMOTION_CACHE_TTL_SECONDS", "3600")),
+        )
+        metrics.register("emotion_cache", self.emotion_cache.stats)
+
+    def _load_reply_cache(self):
+        # 🔁 Near-duplicate messages reuse an earlier reply instead of running beam search
+        from models.semanticCache import SemanticReplyCache
+
+        cache = SemanticReplyCache(
+            embedder_name=os.getenv("SEMANTIC_CACHE_EMBEDDER", "sentence-transformers/all-MiniLM-L6-v2"),
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+            max_entries_per_partition=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000")),
+            cache_dir=os.getenv("SEMANTIC_CACHE_DIR", "cache/semantic"),
+            retention_days=int(os.getenv("CHAT_RETENTION_DAYS", "0")),  # cached replies expire with the chats
+        )
+        metrics.register("reply_cache", cache.stats)
+        return cache
+
+    def _load_cascade(self):
+        # 🪜 Lexicon + hashed n-gram stage; trained and calibrated by scripts/calibrate_emotion_cascade.py
+        from models.emotionCascade import EmotionCascade
+
+        cascade = EmotionCascade.from_config()
+        metrics.register("emotion_cascade", cascade.stats)
+        return cascade
+
+    def _with_cascade(self, classify):
+        """`classify`, fronted by the fast stage when EMOTION_CASCADE=on: only unsure messages reach RoBERTa."""
+        if self.cascade is None:
+            return classify
+        return lambda text: self.cascade.submit(text, classify)
+
+    def _warm_up(self):
+        # First calls pay for lazy allocations and kernel selection; do that before taking traffic
+        self.emotion_model.predict_batch(["Warming up the emotion model."])
+        self.response_model.generate_batch(["Hello, how are you today?"], "fast-greedy")
+
+    def classify(self, text):
+        """Future for the emotion label of `text`."""
+        return self.emotion_cache.submit(text)
+
+    def generate(self, user_input, emotion, profile=None, history=(), shared_cache=True, user_id=None):
+        """Future for the full reply (bot text plus coping tips), given the user's recent turns.
+
+        The reply cache is shared across users, so it only serves the first message of a conversation:
+        a reply that followed someone's earlier turns could carry their context to another user. With
+        `shared_cache=False` (the user opted out) it is neither read nor filled either.
+        """
+        if self.reply_cache is not None and shared_cache and not history:
+            return self.reply_cache.submit(user_input, emotion, profile or self.default_profile, self._generate, user_id)
+        return self._generate(user_input, emotion, profile, history)
+
+    def _generate(self, user_input, emotion, profile=None, history=()):
+        if self.pool is not None:
+            return self.pool.generate(user_input, emotion, profile, history)
+        return self.generation_engine.submit(user_input, emotion, profile, history)
+
+    def stream(self, user_input, emotion, profile=None, history=()):
+        """Iterator over reply pieces as they are decoded."""
+        if self.pool is not None:
+            return self.pool.stream(user_input, emotion, profile, history, timeout=self.timeout)
+        prompt = self.response_model.build_context_prompt(user_input, emotion, history)
+        return self.response_model.stream_reply(prompt, profile)
+
+    async def wait(self, future):
+        """Awaits an inference Future without blocking the event loop, bounded by INFERENCE_TIMEOUT_SECONDS."""
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+
+    def status(self) -> dict:
+        return {"ready": self.ready, "error": self.error, "progress": self.progress}
+
+    def require_ready(self):
+        """FastAPI dependency: 503 until the models are loaded and warm."""
+        if not self.ready:
+            detail = "Model loading failed." if self.error else "Models are still loading. Try again shortly."
+            raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": "5"})
+
+    def close(self):
+        for component in (self.reply_cache, self.pool, self.generation_engine, self.emotion_batcher):
+            if component is not None:
+                component.close()
+
+
+registry = ModelRegistry()
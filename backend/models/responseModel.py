@@ -1,69 +1,116 @@
-from transformers import BlenderbotTokenizer, BlenderbotForConditionalGeneration
+from transformers import (BlenderbotTokenizer, BlenderbotForConditionalGeneration, StoppingCriteria,
+                          StoppingCriteriaList, TextIteratorStreamer)
+from threading import Event, Thread
 import torch
-import re
+import os
+from models.safetyEngine import crisis_detector
+from models.snapshots import model_source, construct_lock
+
+CRISIS_MESSAGE = (
+    "It sounds like you're in a very difficult moment right now. 💛\n"
+    "You are not alone — please reach out to someone right away.\n\n"
+    "📞 **India:** AASRA Helpline — 91-9820466726\n"
+    "📞 **USA:** National Suicide Prevention Lifeline — 988\n"
+    "📞 **UK:** Samaritans — 116 123\n\n"
+    "If you're in immediate danger, please contact your local emergency services."
+)
+
+
+class StopOnEvent(StoppingCriteria):
+    """Ends generation at the next decoding step once `event` is set."""
+
+    def __init__(self, event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+
+# Self-help suggestions appended to replies, per detected emotion
+COPING_SUGGESTIONS = {
+    "sadness": [
+        "Try a short journaling session about what's been heavy on your heart.",
+        "Spend a few minutes focusing on your breath — in slowly, out slowly.",
+        "Remind yourself that it's okay to feel low sometimes; it always passes."
+    ],
+    "anger": [
+        "Take a deep breath in for 4 seconds, hold for 4, exhale for 4 — repeat.",
+        "Go for a short walk to clear your mind before responding to others.",
+        "Try writing down what made you upset, then note one positive action."
+    ],
+    "joy": [
+        "Write down three things you're grateful for right now.",
+        "Share your good mood — send a kind message to a friend.",
+        "Pause to savor the feeling — it's important to celebrate good moments."
+    ],
+    "optimism": [
+        "Keep focusing on the bright side, but allow yourself rest too.",
+        "Note one goal you can take action on today.",
+        "Gratitude journaling amplifies optimism — give it a try tonight."
+    ],
+    "default": [
+        "Take a few slow, deep breaths and observe how you feel.",
+        "A 5-minute mindfulness pause can reset your mood.",
+        "Small steps today can bring big changes tomorrow."
+    ]
+}
+
+# Blenderbot's separator between dialogue turns
+TURN_SEPARATOR = "</s> <s>"
+
+# Named decoding settings, picked per deployment (RESPONSE_PROFILE) or per request.
+# temperature/top_p only take effect with do_sample=True, so only "sampled" sets them.
+DECODING_PROFILES = {
+    "quality": {"num_beams": 5, "max_length": 150},
+    "balanced": {"num_beams": 2, "max_length": 100},
+    "fast-greedy": {"num_beams": 1, "do_sample": False, "max_length": 60},
+    "sampled": {"num_beams": 1, "do_sample": True, "temperature": 0.7, "top_p": 0.9, "max_length": 120},
+}
 
 class ResponseModel:
-    def __init__(self):
+    def __init__(self, profile=None, quantize=None):
         self.model_name = "facebook/blenderbot-400M-distill"
-        self.tokenizer = BlenderbotTokenizer.from_pretrained(self.model_name)
-        self.model = BlenderbotForConditionalGeneration.from_pretrained(self.model_name)
+        source, kwargs = model_source(self.model_name)
+        self.tokenizer = BlenderbotTokenizer.from_pretrained(source, **kwargs)
+        # Prompts end with the current message, so anything over the input window is cut from the front
+        self.tokenizer.truncation_side = "left"
+        with construct_lock:
+            self.model = BlenderbotForConditionalGeneration.from_pretrained(source, **kwargs)
+
+        self.default_profile = profile or os.getenv("RESPONSE_PROFILE", "quality")
+        if self.default_profile not in DECODING_PROFILES:
+            raise ValueError(f"Unknown decoding profile '{self.default_profile}', expected one of {list(DECODING_PROFILES)}")
 
-    def detect_crisis(self, text: str) -> bool:
+        # Encoder input window; older turns are dropped to fit it
+        self.max_input_tokens = self.model.config.max_position_embeddings
+
+        # Optional int8 dynamic quantization of the Linear layers (CPU only)
+        self.quantize = quantize or os.getenv("RESPONSE_QUANTIZE", "none")
+        if self.quantize == "int8":
+            self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        elif self.quantize != "none":
+            raise ValueError(f"Unknown quantization '{self.quantize}', expected 'none' or 'int8'")
+
+    def decoding_settings(self, profile=None) -> dict:
+        """Generation kwargs for a named profile (the deployment default when None)."""
+        name = profile or self.default_profile
+        if name not in DECODING_PROFILES:
+            raise ValueError(f"Unknown decoding profile '{name}', expected one of {list(DECODING_PROFILES)}")
+        return {**DECODING_PROFILES[name], "use_cache": True, "pad_token_id": self.tokenizer.eos_token_id}
+
+    @staticmethod
+    def detect_crisis(text: str) -> bool:
         """Detects words or patterns indicating severe distress or suicidal intent."""
-        crisis_keywords = [
-            "suicide", "kill myself", "end my life", "worthless", 
-            "hopeless", "want to die", "self harm", "cut myself"
-        ]
-        pattern = re.compile("|".join(crisis_keywords), re.IGNORECASE)
-        return bool(pattern.search(text))
-
-    def coping_suggestions(self, emotion: str) -> str:
+        return crisis_detector.detect(text)
+
+    @staticmethod
+    def coping_suggestions(emotion: str) -> str:
         """Provides self-help and motivational suggestions based on emotion."""
-        suggestions = {
-            "sadness": [
-                "Try a short journaling session about what's been heavy on your heart.",
-                "Spend a few minutes focusing on your breath — in slowly, out slowly.",
-                "Remind yourself that it's okay to feel low sometimes; it always passes."
-            ],
-            "anger": [
-                "Take a deep breath in for 4 seconds, hold for 4, exhale for 4 — repeat.",
-                "Go for a short walk to clear your mind before responding to others.",
-                "Try writing down what made you upset, then note one positive action."
-            ],
-            "joy": [
-                "Write down three things you're grateful for right now.",
-                "Share your good mood — send a kind message to a friend.",
-                "Pause to savor the feeling — it's important to celebrate good moments."
-            ],
-            "optimism": [
-                "Keep focusing on the bright side, but allow yourself rest too.",
-                "Note one goal you can take action on today.",
-                "Gratitude journaling amplifies optimism — give it a try tonight."
-            ],
-            "default": [
-                "Take a few slow, deep breaths and observe how you feel.",
-                "A 5-minute mindfulness pause can reset your mood.",
-                "Small steps today can bring big changes tomorrow."
-            ]
-        }
-        return "\n".join(suggestions.get(emotion, suggestions["default"]))
+        return "\n".join(COPING_SUGGESTIONS.get(emotion, COPING_SUGGESTIONS["default"]))
 
-    def generate_reply(self, user_input, emotion):
-        """Generate chatbot response with emotion tone, self-help, and crisis safety."""
-        
-        # Crisis detection
-        if self.detect_crisis(user_input):
-            crisis_message = (
-                "It sounds like you're in a very difficult moment right now. 💛\n"
-                "You are not alone — please reach out to someone right away.\n\n"
-                "📞 **India:** AASRA Helpline — 91-9820466726\n"
-                "📞 **USA:** National Suicide Prevention Lifeline — 988\n"
-                "📞 **UK:** Samaritans — 116 123\n\n"
-                "If you're in immediate danger, please contact your local emergency services."
-            )
-            return crisis_message
-
-        # Emotion-based tone
+    @staticmethod
+    def build_prompt(user_input: str, emotion: str) -> str:
+        """Prepends the emotion-specific tone instruction to the user's message."""
         if emotion == "sadness":
             prefix = "You are a gentle listener offering comfort and reassurance: "
         elif emotion == "anger":
@@ -74,23 +121,91 @@ class ResponseModel:
             prefix = "You are encouraging and positive. Reinforce their hopeful outlook: "
         else:
             prefix = "You are supportive and mindful. Offer empathy and understanding: "
+        return prefix + user_input
+
+    def build_context_prompt(self, user_input: str, emotion: str, history=()) -> str:
+        """Like `build_prompt`, preceded by as many recent turns as fit the input window (newest first)."""
+        prompt = self.build_prompt(user_input, emotion)
+        if not history:
+            return prompt
+
+        budget = self.max_input_tokens - len(self.tokenizer(prompt).input_ids)
+        kept = []
+        for message, reply in reversed(history):
+            turn = f"{message}{TURN_SEPARATOR}{reply}{TURN_SEPARATOR}"
+            cost = len(self.tokenizer(turn, add_special_tokens=False).input_ids)
+            if cost > budget:
+                break
+            kept.append(turn)
+            budget -= cost
+        return "".join(reversed(kept)) + prompt
+
+    def generate_batch(self, prompts, profile=None):
+        """Decodes several prompts together as one padded batch and returns the raw replies."""
+        inputs = self.tokenizer(list(prompts), return_tensors="pt", padding=True, truncation=True,
+                                max_length=self.max_input_tokens)
+
+        with torch.no_grad():
+            reply_ids = self.model.generate(**inputs, **self.decoding_settings(profile))
+
+        return [reply.strip() for reply in self.tokenizer.batch_decode(reply_ids, skip_special_tokens=True)]
+
+    def stream_reply(self, prompt: str, profile=None):
+        """Yields pieces of the reply as Blenderbot decodes them.
+
+        Streaming needs a single sequence per step, so beam profiles fall back to one beam here.
+        Closing the generator early (the client went away) stops decoding at the next step and
+        returns once the decode thread has exited, so callers know the model is free again.
+        """
+        inputs = self.tokenizer([prompt], return_tensors="pt", truncation=True, max_length=self.max_input_tokens)
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        stop = Event()
+        settings = {
+            **self.decoding_settings(profile),
+            "num_beams": 1,
+            "stopping_criteria": StoppingCriteriaList([StopOnEvent(stop)]),
+        }
+        errors = []
+
+        def run():
+            try:
+                with torch.no_grad():
+                    self.model.generate(**inputs, streamer=streamer, **settings)
+            except Exception as e:
+                errors.append(e)
+                streamer.end()
+
+        thread = Thread(target=run, daemon=True)
+        thread.start()
+        try:
+            for text in streamer:
+                if text:
+                    yield text
+        finally:
+            stop.set()
+            thread.join()
+        if errors:
+            raise errors[0]
+
+    @staticmethod
+    def coping_block(emotion: str) -> str:
+        """The coping-tip section appended after the bot's reply."""
+        return f"\n\n💡 *Coping Tip:*\n{ResponseModel.coping_suggestions(emotion)}"
+
+    @staticmethod
+    def format_reply(bot_reply: str, emotion: str) -> str:
+        """Appends the coping suggestions for the detected emotion."""
+        return f"{bot_reply}{ResponseModel.coping_block(emotion)}"
+
+    def generate_reply(self, user_input, emotion, profile=None):
+        """Generate chatbot response with emotion tone, self-help, and crisis safety."""
         
+        # Crisis detection
+        if self.detect_crisis(user_input):
+            return CRISIS_MESSAGE
+
         # Generate empathetic message
-        input_text = prefix + user_input
-        inputs = self.tokenizer([input_text], return_tensors="pt")
-
-        reply_ids = self.model.generate(
-            **inputs,
-            max_length=150,
-            num_beams=5,
-            temperature=0.7,
-            top_p=0.9,
-            pad_token_id=self.tokenizer.eos_token_id
-        )
-
-        bot_reply = self.tokenizer.decode(reply_ids[0], skip_special_tokens=True).strip()
+        bot_reply = self.generate_batch([self.build_prompt(user_input, emotion)], profile)[0]
         
         # Add coping suggestions
-        extra_help = self.coping_suggestions(emotion)
-        
-        return f"{bot_reply}\n\n💡 *Coping Tip:*\n{extra_help}"
+        return self.format_reply(bot_reply, emotion)
@@ -0,0 +1,81 @@
+import json
+import os
+import re
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config", "crisis_phrases.json")
+
+_APOSTROPHES = str.maketrans("", "", "'’`")
+_PUNCTUATION = re.compile(r"[^\w\s]|_")
+_REPEATS = re.compile(r"(\w)\1+")
+
+
+def _trie_pattern(phrases) -> str:
+    """Builds one prefix-factored alternation so the regex engine never re-scans shared prefixes."""
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        pattern = branches[0] if len(branches) == 1 and "" not in node else "(?:" + "|".join(branches) + ")"
+        # A phrase ending here makes the longer ones optional; the caller's trailing \b picks the fit
+        return pattern + "?" if "" in node else pattern
+
+    return build(trie)
+
+
+class CrisisDetector:
+    """Compiled multi-pattern matcher for phrases that signal severe distress or suicidal intent.
+
+    Text and phrases go through the same normalization (case, apostrophes, punctuation, repeated
+    letters, known misspellings), and every phrase is matched in a single pass over the message.
+    """
+
+    def __init__(self, phrases, misspellings=None):
+        self.misspellings = {}
+        for wrong, right in (misspellings or {}).items():
+            self.misspellings[self._clean(wrong)] = self._clean(right)
+        self._misspelling_re = None
+        if self.misspellings:
+            alternatives = sorted(self.misspellings, key=len, reverse=True)
+            self._misspelling_re = re.compile(r"\b(?:" + "|".join(map(re.escape, alternatives)) + r")\b")
+
+        self.phrases = sorted({self.normalize(phrase) for phrase in phrases if phrase.strip()})
+        # Anchored at both ends: "end it all" must not fire on "end it already", nor "hopeless" on "hopelessly"
+        self._pattern = re.compile(r"\b" + _trie_pattern(self.phrases) + r"\b")
+
+    @classmethod
+    def from_config(cls, path=None):
+        """Loads {"phrases": [...], "misspellings": {...}} from CRISIS_PHRASES_PATH or the bundled config."""
+        path = path or os.getenv("CRISIS_PHRASES_PATH", DEFAULT_CONFIG)
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+        return cls(config["phrases"], config.get("misspellings"))
+
+    @staticmethod
+    def _clean(text: str) -> str:
+        text = _PUNCTUATION.sub(" ", text.casefold().translate(_APOSTROPHES))
+        text = _REPEATS.sub(r"\1", text)  # "diiie" -> "die"; phrases get the same treatment ("kill" -> "kil")
+        return " ".join(text.split())
+
+    def normalize(self, text: str) -> str:
+        text = self._clean(text)
+        if self._misspelling_re is not None:
+            text = self._misspelling_re.sub(lambda m: self.misspellings[m.group(0)], text)
+        return text
+
+    def match(self, text: str):
+        """Returns the normalized phrase found in `text`, or None."""
+        found = self._pattern.search(self.normalize(text))
+        return found.group(0) if found else None
+
+    def detect(self, text: str) -> bool:
+        return self.match(text) is not None
+
+
+crisis_detector = CrisisDetector.from_config()
@@ -0,0 +1,248 @@
+import glob
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+import faiss
+import numpy as np
+from sentence_transformers import SentenceTransformer
+from models.batching import MicroBatcher
+from models.snapshots import model_source, construct_lock
+
+
+class SemanticReplyCache:
+    """Serves a stored reply when a new message is a near-duplicate of one answered before.
+
+    Messages are embedded with a sentence-transformer and looked up by cosine similarity in one
+    FAISS index per (emotion, decoding profile) partition, so a hit always carries the tone and
+    coping tips of the right emotion. Only single-turn replies are cached (the registry bypasses the
+    cache once a conversation has history), so a stored reply depends on nothing but its message.
+    Each partition is bounded and evicts its least recently used entries; entries older than
+    `retention_days` expire like the chats they came from. Indexes and replies (never the messages)
+    are persisted to `cache_dir` and reloaded on startup.
+    """
+
+    def __init__(self, embedder_name="sentence-transformers/all-MiniLM-L6-v2", threshold=0.95,
+                 max_entries_per_partition=5000, cache_dir=None, save_every=100, retention_days=0):
+        source, kwargs = model_source(embedder_name)
+        with construct_lock:
+            self.embedder = SentenceTransformer(source, device="cpu", **kwargs)
+        self.dim = self.embedder.get_sentence_embedding_dimension()
+        self.threshold = threshold
+        self.max_entries = max_entries_per_partition
+        self.cache_dir = cache_dir
+        self.save_every = save_every
+        self.retention = retention_days * 86400
+
+        self._batcher = MicroBatcher(self._embed, max_batch_size=32, max_wait_ms=2, name="reply-cache-embedder")
+        self._partitions = {}
+        self._next_id = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self.lookups = self.hits = self.inserts = self.evictions = self.expired = 0
+
+        if cache_dir:
+            self.load()
+
+    def _embed(self, texts):
+        vectors = self.embedder.encode(list(texts), normalize_embeddings=True, convert_to_numpy=True)
+        return list(vectors.astype(np.float32))
+
+    def _partition(self, key):
+        partition = self._partitions.get(key)
+        if partition is None:
+            partition = {"index": faiss.IndexIDMap2(faiss.IndexFlatIP(self.dim)), "entries": {}}
+            self._partitions[key] = partition
+        return partition
+
+    def submit(self, user_input, emotion, profile, generate, user_id=None) -> Future:
+        """Future for the reply: cached on a hit, otherwise from `generate(user_input, emotion, profile)`.
+
+        `user_id` is stored with a newly cached reply so `forget_user` can remove it.
+        """
+        key = f"{emotion}|{profile}"
+        result = Future()
+
+        def settle(method, value):
+            try:
+                method(value)
+            except InvalidStateError:
+                pass  # the caller cancelled while we were embedding or generating
+
+        def on_generated(done, vector):
+            if done.exception() is not None:
+                settle(result.set_exception, done.exception())
+                return
+            self.add(vector, key, user_id, done.result())
+            settle(result.set_result, done.result())
+
+        def on_embedded(done):
+            try:
+                vector = done.result()
+                reply = self.lookup(vector, key)
+                if reply is not None:
+                    settle(result.set_result, reply)
+                    return
+                if result.cancelled():
+                    return
+                generate(user_input, emotion, profile).add_done_callback(lambda g: on_generated(g, vector))
+            except Exception as e:
+                settle(result.set_exception, e)
+
+        self._batcher.submit(user_input).add_done_callback(on_embedded)
+        return result
+
+    def lookup(self, vector, key):
+        with self._lock:
+            self.lookups += 1
+            partition = self._partitions.get(key)
+            if partition is None or partition["index"].ntotal == 0:
+                return None
+            scores, ids = partition["index"].search(vector.reshape(1, -1), 1)
+            if ids[0][0] < 0 or scores[0][0] < self.threshold:
+                return None
+
+            # An index can briefly hold an id whose entry is gone (e.g. reloaded after a crash): a miss
+            entry = partition["entries"].get(int(ids[0][0]))
+            if entry is None or self._is_expired(entry, time.time()):
+                return None
+            entry["last_used"] = time.time()
+            entry["hits"] += 1
+            self.hits += 1
+            return entry["reply"]
+
+    def add(self, vector, key, user_id, reply):
+        with self._lock:
+            partition = self._partition(key)
+            entry_id = self._next_id
+            self._next_id += 1
+            partition["index"].add_with_ids(vector.reshape(1, -1), np.array([entry_id], dtype=np.int64))
+            now = time.time()
+            partition["entries"][entry_id] = {"user_id": user_id, "reply": reply, "created": now, "last_used": now, "hits": 0}
+            self.inserts += 1
+            self._evict(partition)
+            self._unsaved += 1
+            should_save = self.cache_dir and self._unsaved >= self.save_every
+
+        if should_save:
+            self.expire()
+            self.save()
+
+    def _evict(self, partition):
+        overflow = len(partition["entries"]) - self.max_entries
+        if overflow <= 0:
+            return
+        oldest = sorted(partition["entries"], key=lambda i: partition["entries"][i]["last_used"])[:overflow]
+        self._remove(partition, oldest)
+        self.evictions += len(oldest)
+
+    @staticmethod
+    def _remove(partition, entry_ids):
+        partition["index"].remove_ids(np.array(entry_ids, dtype=np.int64))
+        for entry_id in entry_ids:
+            del partition["entries"][entry_id]
+
+    def _is_expired(self, entry, now):
+        return self.retention > 0 and entry["created"] < now - self.retention
+
+    def _drop(self, matches) -> int:
+        """Removes every entry for which `matches(entry)` holds; returns how many."""
+        removed = 0
+        with self._lock:
+            for partition in self._partitions.values():
+                doomed = [i for i, entry in partition["entries"].items() if matches(entry)]
+                if doomed:
+                    self._remove(partition, doomed)
+                    removed += len(doomed)
+        return removed
+
+    def forget_user(self, user_id) -> int:
+        """Removes the replies cached from `user_id`'s messages, on disk too; called when they clear their history."""
+        removed = self._drop(lambda entry: entry["user_id"] == user_id)
+        if removed and self.cache_dir:
+            self.save()
+        return removed
+
+    def expire(self) -> int:
+        """Removes entries past the retention window from memory; the next save drops them on disk."""
+        now = time.time()
+        removed = self._drop(lambda entry: self._is_expired(entry, now))
+        with self._lock:
+            self.expired += removed
+        return removed
+
+    def save(self):
+        """Writes each partition's FAISS index plus a JSON manifest of replies.
+
+        Index files are versioned per save and the manifest is replaced last, so a crash part-way
+        leaves the previous manifest pointing at the previous, still complete, files.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with self._lock:
+            self._generation += 1
+            manifest = {"version": 2, "dim": self.dim, "next_id": self._next_id, "generation": self._generation,
+                        "partitions": {}}
+            for n, (key, partition) in enumerate(self._partitions.items()):
+                filename = f"partition-{n}-{self._generation}.faiss"
+                faiss.write_index(partition["index"], os.path.join(self.cache_dir, filename))
+                manifest["partitions"][key] = {"file": filename, "entries": dict(partition["entries"])}
+            self._unsaved = 0
+
+            path = os.path.join(self.cache_dir, "manifest.json")
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)
+            self._remove_stale_files({stored["file"] for stored in manifest["partitions"].values()})
+
+    def _remove_stale_files(self, keep):
+        for path in glob.glob(os.path.join(self.cache_dir, "partition-*.faiss*")):
+            if os.path.basename(path) not in keep:
+                os.remove(path)
+
+    def load(self):
+        path = os.path.join(self.cache_dir, "manifest.json")
+        if not os.path.exists(path):
+            return
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != 2:
+            # Older manifests stored users' messages and no user ids: discard rather than keep them
+            os.remove(path)
+            self._remove_stale_files(set())
+            return
+        if manifest["dim"] != self.dim:
+            return  # embedder changed; start empty
+
+        with self._lock:
+            self._next_id = manifest["next_id"]
+            self._generation = manifest["generation"]
+            for key, stored in manifest["partitions"].items():
+                self._partitions[key] = {
+                    "index": faiss.read_index(os.path.join(self.cache_dir, stored["file"])),
+                    "entries": {int(i): entry for i, entry in stored["entries"].items()},
+                }
+        if self.expire():
+            self.save()
+
+    def close(self):
+        self._batcher.close()
+        if self.cache_dir:
+            self.save()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "partitions": len(self._partitions),
+                "entries": sum(len(p["entries"]) for p in self._partitions.values()),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "misses": self.lookups - self.hits,
+                "inserts": self.inserts,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            }
@@ -0,0 +1,40 @@
+import os
+import threading
+from collections import defaultdict
+
+# `from_pretrained` swaps process-global state while it builds a model (it patches
+# PreTrainedModel.tie_weights class-wide and sets torch's default dtype), so two threads building
+# at once can leave weights untied. Only that step is serialized: files are fetched beforehand.
+construct_lock = threading.Lock()
+
+_fetch_locks = defaultdict(threading.Lock)
+_fetch_locks_guard = threading.Lock()
+
+
+def fetch_lock(name: str) -> threading.Lock:
+    """Lock for writing the files of `name` (a hub download, an ONNX export): one writer per model."""
+    with _fetch_locks_guard:
+        return _fetch_locks[name]
+
+
+def model_source(model_name: str):
+    """Local directory holding `model_name`, plus extra `from_pretrained` kwargs.
+
+    With MODEL_SNAPSHOT_DIR set, models load from `<dir>/<model_name>` and never contact the hub.
+    Otherwise the repo is downloaded into the hub cache first, so loaders fetch in parallel and
+    construction under `construct_lock` only reads local files.
+    """
+    snapshot_dir = os.getenv("MODEL_SNAPSHOT_DIR")
+    if snapshot_dir:
+        return os.path.join(snapshot_dir, model_name), {"local_files_only": True}
+    return fetch(model_name), {"local_files_only": True}
+
+
+def fetch(model_name: str) -> str:
+    """Downloads the config, tokenizer and PyTorch weights of `model_name`; returns the snapshot path."""
+    from huggingface_hub import HfApi, snapshot_download
+
+    with fetch_lock(model_name):
+        files = HfApi().list_repo_files(model_name)
+        weights = "*.safetensors" if any(f.endswith(".safetensors") for f in files) else "*.bin"
+        return snapshot_download(model_name, allow_patterns=["*.json", "*.txt", "*.model", weights])
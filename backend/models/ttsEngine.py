@@ -0,0 +1,335 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import threading
+import unicodedata
+from concurrent.futures import Future, ThreadPoolExecutor
+import wave
+from utils import metrics
+from utils.lru_cache import LRUTTLCache
+from models.responseModel import ResponseModel, CRISIS_MESSAGE, COPING_SUGGESTIONS
+
+logger = logging.getLogger(__name__)
+
+_MARKDOWN = re.compile(r"[*_`#>|~]+")
+_SPACES = re.compile(r"[ \t]+")
+
+
+def speakable(text: str) -> str:
+    """Drops markdown markers and emoji/pictographs, which engines either skip or spell out."""
+    text = _MARKDOWN.sub("", text)
+    text = "".join(ch for ch in text if unicodedata.category(ch) not in ("So", "Sk", "Cs", "Co") and ch != "\ufe0f")
+    return "\n".join(_SPACES.sub(" ", line).strip() for line in text.splitlines()).strip()
+
+
+def segments(text: str):
+    """Paragraphs of `text`, each synthesized and cached on its own.
+
+    Replies end with the coping block and the crisis message is fixed text, so splitting on
+    paragraphs lets those parts come straight from the pre-rendered cache.
+    """
+    return [part for part in (speakable(p) for p in text.split("\n\n")) if part]
+
+
+def static_texts():
+    """Everything the backend says verbatim: the crisis message and each emotion's coping block."""
+    return [CRISIS_MESSAGE] + [ResponseModel.coping_block(emotion) for emotion in COPING_SUGGESTIONS]
+
+
+def _wav(pcm: bytes, rate: int, channels=1, width=2) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(width)
+        w.setframerate(rate)
+        w.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def _pcm(audio: bytes):
+    """((channels, width, rate), frames) of a WAV. Streamed WAVs carry a placeholder length, so read to EOF."""
+    with wave.open(io.BytesIO(audio), "rb") as w:
+        params = (w.getnchannels(), w.getsampwidth(), w.getframerate())
+        frames = w.readframes(w.getnframes())
+    frame_size = params[0] * params[1]
+    return params, frames[:len(frames) - len(frames) % frame_size]
+
+
+def concat_wav(parts, pause_ms=300.0) -> bytes:
+    """Joins WAVs from the same engine into one, with `pause_ms` of silence between them."""
+    params, frames = None, []
+    for part in parts:
+        part_params, part_frames = _pcm(part)
+        if params is None:
+            params = part_params
+        elif part_params != params:
+            raise ValueError(f"Can't join WAVs with different formats: {params} vs {part_params}")
+        if frames and pause_ms > 0:
+            channels, width, rate = params
+            frames.append(b"\x00" * (int(rate * pause_ms / 1000) * channels * width))
+        frames.append(part_frames)
+    if params is None:
+        raise ValueError("Nothing to join.")
+    channels, width, rate = params
+    return _wav(b"".join(frames), rate, channels, width)
+
+
+class EspeakEngine:
+    """espeak-ng (or espeak) as a subprocess: fast, robotic, no model files. Text goes in on
+    stdin and the WAV comes back on stdout, so nothing touches the disk."""
+
+    name = "espeak"
+
+    def __init__(self, voice="en-us", rate=160, timeout=30.0):
+        self.voice = voice or "en-us"
+        self.rate = rate
+        self.timeout = timeout
+        self.binary = shutil.which("espeak-ng") or shutil.which("espeak")
+
+    @property
+    def settings(self) -> str:
+        return f"{self.voice}@{self.rate}"
+
+    def available(self) -> bool:
+        return self.binary is not None
+
+    def synthesize(self, text: str) -> bytes:
+        result = subprocess.run(
+            [self.binary, "--stdout", "-v", self.voice, "-s", str(self.rate)],
+            input=text.encode(), capture_output=True, timeout=self.timeout, check=True,
+        )
+        return result.stdout
+
+
+class PiperEngine:
+    """Piper neural TTS as a subprocess, with `voice` the path of a .onnx voice model (its
+    .onnx.json config alongside). Raw PCM is read from stdout and wrapped as WAV in memory."""
+
+    name = "piper"
+
+    def __init__(self, voice, timeout=60.0):
+        self.voice = voice
+        self.timeout = timeout
+        self.binary = shutil.which("piper")
+        self.sample_rate = None
+        if voice and os.path.exists(voice + ".json"):
+            with open(voice + ".json", encoding="utf-8") as f:
+                self.sample_rate = json.load(f)["audio"]["sample_rate"]
+
+    @property
+    def settings(self) -> str:
+        return os.path.basename(self.voice or "")
+
+    def available(self) -> bool:
+        return self.binary is not None and self.sample_rate is not None
+
+    def synthesize(self, text: str) -> bytes:
+        result = subprocess.run(
+            [self.binary, "--model", self.voice, "--output-raw"],
+            input=text.encode(), capture_output=True, timeout=self.timeout, check=True,
+        )
+        return _wav(result.stdout, self.sample_rate)
+
+
+TTS_ENGINES = {"espeak": EspeakEngine, "piper": PiperEngine}
+
+
+class AudioCache:
+    """Content-addressed audio: an in-memory LRU in front of a size-bounded directory of WAVs.
+
+    Files are named by their key and written atomically; a disk hit refreshes the file's mtime,
+    and when the directory outgrows `max_bytes` the least recently used files are removed.
+    """
+
+    def __init__(self, cache_dir, max_bytes=256 * 2**20, memory_entries=128):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memory = LRUTTLCache(max_entries=memory_entries, ttl_seconds=0)
+        self._lock = threading.Lock()
+        self.disk_hits = self.disk_evictions = 0
+        self.disk_bytes = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.disk_bytes = sum(size for _, size, _ in self._files())
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".wav")
+
+    def _files(self):
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if not name.endswith(".wav"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except FileNotFoundError:  # evicted by another writer meanwhile
+                    continue
+                yield os.path.join(root, name), stat.st_size, stat.st_mtime
+
+    def get(self, key):
+        audio = self.memory.get(key)
+        if audio is not None or not self.cache_dir:
+            return audio
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                audio = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        self.disk_hits += 1
+        self.memory.put(key, audio)
+        return audio
+
+    def put(self, key, audio: bytes):
+        self.memory.put(key, audio)
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"  # processes may share the directory
+        with open(tmp, "wb") as f:
+            f.write(audio)
+        try:
+            replaced = os.path.getsize(path)  # another thread or process wrote this key first
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(tmp, path)
+        with self._lock:
+            self.disk_bytes += len(audio) - replaced
+            if self.disk_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Trim to 90% so a full cache doesn't rescan the directory on every write
+        files = sorted(self._files(), key=lambda f: f[2])
+        total = sum(size for _, size, _ in files)
+        for path, size, _ in files:
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.disk_evictions += 1
+        self.disk_bytes = total
+
+    def stats(self) -> dict:
+        return {
+            "memory": self.memory.stats(),
+            "disk_hits": self.disk_hits,
+            "disk_bytes": self.disk_bytes,
+            "disk_max_bytes": self.max_bytes,
+            "disk_evictions": self.disk_evictions,
+        }
+
+
+class SpeechSynthesizer:
+    """Text to WAV through a local engine, cached per paragraph by hash of (engine, voice, text).
+
+    At most `max_concurrency` engine processes run at once. Async callers go through `submit`,
+    which runs on this synthesizer's own threads, so requests waiting for an engine slot never
+    hold the server's shared threadpool. `start_prerender` fills the cache with the static texts
+    in the background so crisis and coping audio never wait on synthesis.
+    """
+
+    def __init__(self, engine, cache, max_concurrency=2, pause_ms=300.0):
+        self.engine = engine
+        self.cache = cache
+        self.pause_ms = pause_ms
+        self._slots = threading.Semaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="tts")
+        self._thread = None
+        self.synthesized = self.failures = self.prerendered = 0
+
+    @property
+    def available(self) -> bool:
+        return self.engine.available()
+
+    def key(self, segment: str) -> str:
+        return hashlib.sha256(f"{self.engine.name}\0{self.engine.settings}\0{segment}".encode()).hexdigest()
+
+    def segment_audio(self, segment: str) -> bytes:
+        """WAV for one paragraph, from the cache or the engine."""
+        key = self.key(segment)
+        audio = self.cache.get(key)
+        if audio is None:
+            with self._slots:
+                try:
+                    audio = self.engine.synthesize(segment)
+                except Exception:
+                    self.failures += 1
+                    raise
+            self.synthesized += 1
+            self.cache.put(key, audio)
+        return audio
+
+    def synthesize(self, text: str) -> bytes:
+        """One WAV for `text`, joined from its cached or freshly synthesized paragraphs."""
+        parts = [self.segment_audio(segment) for segment in segments(text)]
+        if not parts:
+            raise ValueError("Nothing to say.")
+        return parts[0] if len(parts) == 1 else concat_wav(parts, self.pause_ms)
+
+    def submit(self, text: str) -> Future:
+        """`synthesize(text)` on the synthesizer's threads; await it with asyncio.wrap_future."""
+        return self._executor.submit(self.synthesize, text)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def prerender(self, texts) -> int:
+        for text in texts:
+            for segment in segments(text):
+                self.segment_audio(segment)
+                self.prerendered += 1
+        return self.prerendered
+
+    def start_prerender(self, texts):
+        def run():
+            try:
+                self.prerender(texts)
+            except Exception as e:
+                logger.error("Pre-rendering speech failed: %s", e)
+
+        self._thread = threading.Thread(target=run, name="tts-prerender", daemon=True)
+        self._thread.start()
+
+    def stats(self) -> dict:
+        return {
+            "engine": self.engine.name,
+            "voice": self.engine.settings,
+            "available": self.available,
+            "synthesized": self.synthesized,
+            "failures": self.failures,
+            "prerendered": self.prerendered,
+            "cache": self.cache.stats(),
+        }
+
+
+def build_synthesizer():
+    """The SpeechSynthesizer configured by TTS_* env vars, or None when TTS_ENGINE=off."""
+    name = os.getenv("TTS_ENGINE", "espeak")
+    if name == "off":
+        return None
+    if name not in TTS_ENGINES:
+        raise ValueError(f"Unknown TTS engine '{name}', expected one of {list(TTS_ENGINES)} or 'off'")
+    voice = os.getenv("TTS_VOICE") or None
+    engine = EspeakEngine(voice, rate=int(os.getenv("TTS_RATE", "160"))) if name == "espeak" else PiperEngine(voice)
+    cache = AudioCache(
+        os.getenv("TTS_CACHE_DIR", "cache/tts"),
+        max_bytes=int(float(os.getenv("TTS_CACHE_MAX_MB", "256")) * 2**20),
+        memory_entries=int(os.getenv("TTS_MEMORY_ENTRIES", "128")),
+    )
+    return SpeechSynthesizer(engine, cache, max_concurrency=int(os.getenv("TTS_MAX_CONCURRENCY", "2")))
+
+
+speech_synthesizer = build_synthesizer()
+if speech_synthesizer is not None:
+    metrics.register("tts", speech_synthesizer.stats)
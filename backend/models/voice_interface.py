@@ -1,51 +1,93 @@
 # voice_interface.py
-import os
-import speech_recognition as sr
-from gtts import gTTS
-from playsound import playsound
-from chatbot_core import MentalHealthChatbot
+import io
+import wave
+import pyaudio
+from models.responseModel import ResponseModel
+from models.emotionModel import EmotionModel
+from models.emotionCascade import CascadeEmotionModel
+from models.asrEngine import SAMPLE_RATE, join_transcript, speech_recognizer
+from models.ttsEngine import speech_synthesizer
+
+FRAMES_PER_READ = SAMPLE_RATE // 10  # 100 ms of microphone audio per read
+
+
+def play_wav(audio: bytes):
+    """Plays WAV bytes on the default output device, straight from memory."""
+    player = pyaudio.PyAudio()
+    try:
+        with wave.open(io.BytesIO(audio), "rb") as w:
+            stream = player.open(format=player.get_format_from_width(w.getsampwidth()),
+                                 channels=w.getnchannels(), rate=w.getframerate(), output=True)
+            try:
+                while frames := w.readframes(4096):
+                    stream.write(frames)
+            finally:
+                stream.stop_stream()
+                stream.close()
+    finally:
+        player.terminate()
+
 
 class VoiceInterface:
-    def __init__(self):
-        self.bot = MentalHealthChatbot()
-        self.recognizer = sr.Recognizer()
+    def __init__(self, end_of_turn_ms=1000, max_seconds=30.0):
+        if speech_recognizer is None:
+            raise RuntimeError("Voice mode needs a local recognizer; set ASR_ENGINE to vosk or whisper.")
+        speech_recognizer.load()
+        if not speech_recognizer.ready:
+            raise RuntimeError(f"Speech recognition failed to load: {speech_recognizer.error}")
+        self.bot = ResponseModel()
+        self.emotion_model = CascadeEmotionModel(EmotionModel())  # RoBERTa only for messages the fast stage is unsure of
+        self.audio = pyaudio.PyAudio()
+        self.end_of_turn_ms = end_of_turn_ms
+        self.max_seconds = max_seconds
 
     def listen(self):
-        with sr.Microphone() as source:
-            print("\n🎤 Listening...")
-            audio = self.recognizer.listen(source)
-            try:
-                text = self.recognizer.recognize_google(audio)
-                print(f"🗣️ You said: {text}")
-                return text
-            except sr.UnknownValueError:
-                return "Sorry, I didn’t catch that."
-            except sr.RequestError:
-                return "Speech recognition service unavailable."
+        """Streams the microphone through VAD, so each phrase is transcribed while the user keeps talking.
+
+        The turn ends after `end_of_turn_ms` of silence following speech; only the last phrase is
+        still being transcribed at that point.
+        """
+        stream = self.audio.open(format=pyaudio.paInt16, channels=1, rate=SAMPLE_RATE, input=True,
+                                 frames_per_buffer=FRAMES_PER_READ)
+        transcriber = speech_recognizer.open()
+        vad = transcriber.segmenter
+        print("\n🎤 Listening...")
+        try:
+            while transcriber.seconds < self.max_seconds:
+                transcriber.feed(stream.read(FRAMES_PER_READ, exception_on_overflow=False))
+                if vad.heard_speech and not vad.in_speech and vad.silence_ms >= self.end_of_turn_ms:
+                    break
+            text = join_transcript(future.result() for future in transcriber.finish())
+        finally:
+            stream.stop_stream()
+            stream.close()
+            speech_recognizer.release(transcriber)
+
+        if text:
+            print(f"🗣️ You said: {text}")
+        return text
 
     def speak(self, text):
-        tts = gTTS(text=text, lang='en')
-        tts.save("response.mp3")
-        playsound("response.mp3")
-        os.remove("response.mp3")
+        # Offline and cached: the goodbye line, crisis message and coping tips are only synthesized once
+        if speech_synthesizer is None or not speech_synthesizer.available:  # TTS_ENGINE=off or no espeak/piper
+            return
+        play_wav(speech_synthesizer.synthesize(text))
 
     def run(self):
         print("🧠 Voice Mental Health Chatbot — Speak to start.\nSay 'exit' anytime to stop.\n")
 
         while True:
             user_input = self.listen()
+            if not user_input:
+                print("Sorry, I didn’t catch that.")
+                continue
 
             if any(word in user_input.lower() for word in ["exit", "quit", "bye", "stop"]):
                 self.speak("Take care of yourself. Remember, you are not alone.")
                 print("👋 Session ended.")
                 break
 
-            emotion = (
-                "sadness" if "sad" in user_input.lower()
-                else "joy" if "happy" in user_input.lower()
-                else "anger" if "angry" in user_input.lower()
-                else "default"
-            )
+            emotion = self.emotion_model.predict(user_input)
 
             response = self.bot.generate_reply(user_input, emotion)
             print(f"🤖 Bot: {response}\n")
@@ -0,0 +1,309 @@
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+
+
+class WorkerUnavailable(RuntimeError):
+    """No inference worker is ready to take the request (all starting up or restarting)."""
+
+
+class WorkerCrashed(RuntimeError):
+    """The worker process handling the request died before answering."""
+
+
+def worker_main(worker_id, requests, results, torch_threads):
+    """Entry point of an inference worker process.
+
+    Loads its own models (with in-process batching) under a fixed torch thread budget, then
+    serves ("classify" | "generate" | "stream" | "cancel") requests from `requests` until it
+    receives None. "cancel" stops a stream the API side abandoned.
+    """
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(torch_threads)
+
+    import torch
+    torch.set_num_threads(torch_threads)
+    torch.set_num_interop_threads(1)
+
+    from models.modelRegistry import ModelRegistry
+
+    # The reply cache and the emotion cascade live in the API process; workers only see the misses
+    local = ModelRegistry(workers=0, reply_cache=False, cascade=False)
+    local.load()
+    if not local.ready:
+        results.put(("failed", worker_id, local.error))
+        return
+    results.put(("ready", worker_id, {
+        "emotion_model": local.emotion_model.model_name,
+        "emotion_backend": local.emotion_model.backend,
+    }))
+
+    def answer(request_id, future):
+        if future.exception() is not None:
+            results.put(("error", request_id, str(future.exception())))
+        else:
+            results.put(("ok", request_id, future.result()))
+
+    cancelled = {}  # request_id -> Event, per running stream
+
+    def stream(request_id, user_input, emotion, profile, history):
+        try:
+            pieces = local.stream(user_input, emotion, profile, history)
+            try:
+                for text in pieces:
+                    if cancelled[request_id].is_set():
+                        break
+                    results.put(("token", request_id, text))
+            finally:
+                pieces.close()  # stops decoding early; returns once the model is done with it
+            results.put(("end", request_id, None))
+        except Exception as e:
+            results.put(("error", request_id, str(e)))
+        finally:
+            cancelled.pop(request_id, None)
+
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+
+        request_id, kind, args = message
+        if kind == "classify":
+            future = local.emotion_batcher.submit(*args)
+        elif kind == "generate":
+            future = local.generation_engine.submit(*args)
+        elif kind == "stream":
+            cancelled[request_id] = threading.Event()
+            threading.Thread(target=stream, args=(request_id, *args), daemon=True).start()
+            continue
+        elif kind == "cancel":
+            if request_id in cancelled:
+                cancelled[request_id].set()
+            continue
+        else:
+            results.put(("error", request_id, f"Unknown request kind '{kind}'"))
+            continue
+        future.add_done_callback(lambda done, request_id=request_id: answer(request_id, done))
+
+    local.close()
+
+
+class InferenceWorkerPool:
+    """Runs inference in separate worker processes and talks to them through queues.
+
+    Each worker has its own request queue; requests go to the least-loaded ready worker.
+    A dispatcher thread resolves caller Futures from the shared result queue, and a monitor
+    thread restarts crashed workers, failing whatever they had in flight.
+    """
+
+    def __init__(self, num_workers, torch_threads=1):
+        self.num_workers = num_workers
+        self.torch_threads = torch_threads
+        self.model_name = None  # reported by workers once loaded (read by EmotionCache)
+        self.backend = None
+
+        self._ctx = mp.get_context("spawn")
+        self._results = self._ctx.Queue()
+        self._workers = {}
+        self._pending = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._closing = False
+        self.error = None
+        self.timeouts = 0
+
+        for worker_id in range(num_workers):
+            self._spawn(worker_id, restarts=0)
+        threading.Thread(target=self._dispatch, name="worker-pool-dispatch", daemon=True).start()
+        threading.Thread(target=self._monitor, name="worker-pool-monitor", daemon=True).start()
+
+    def _spawn(self, worker_id, restarts):
+        requests = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=worker_main,
+            args=(worker_id, requests, self._results, self.torch_threads),
+            name=f"inference-worker-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        self._workers[worker_id] = {
+            "process": process,
+            "requests": requests,
+            "ready": False,
+            "in_flight": set(),
+            "restarts": restarts,
+        }
+
+    def wait_ready(self, timeout=None):
+        """Blocks until every worker has loaded its models; raises if one failed to start."""
+        if not self._ready.wait(timeout):
+            raise TimeoutError("Inference workers did not become ready in time.")
+        if self.error:
+            raise RuntimeError(self.error)
+
+    # ----- API side -----
+
+    def _send(self, kind, args, waiter):
+        with self._lock:
+            ready = [(wid, w) for wid, w in self._workers.items() if w["ready"] and w["process"].is_alive()]
+            if not ready:
+                raise WorkerUnavailable("No inference worker is ready.")
+            worker_id, worker = min(ready, key=lambda item: len(item[1]["in_flight"]))
+            request_id = next(self._ids)
+            self._pending[request_id] = (worker_id, waiter)
+            worker["in_flight"].add(request_id)
+        worker["requests"].put((request_id, kind, args))
+        return request_id
+
+    def classify(self, text) -> Future:
+        future = Future()
+        self._send("classify", (text,), future)
+        return future
+
+    def generate(self, user_input, emotion, profile=None, history=()) -> Future:
+        future = Future()
+        self._send("generate", (user_input, emotion, profile, tuple(history)), future)
+        return future
+
+    def stream(self, user_input, emotion, profile=None, history=(), timeout=None):
+        """Yields reply pieces from a worker; `timeout` bounds the wait for each piece.
+
+        Closing the generator before the end cancels the stream on the worker and waits (up to
+        `timeout`) until the worker has stopped decoding.
+        """
+        pieces = queue.Queue()
+        request_id = self._send("stream", (user_input, emotion, profile, tuple(history)), pieces)
+        finished = False
+        try:
+            while True:
+                try:
+                    kind, value = pieces.get(timeout=timeout)
+                except queue.Empty:
+                    self.timeouts += 1
+                    raise TimeoutError("Timed out waiting for the inference worker.")
+                if kind == "token":
+                    yield value
+                elif kind == "end":
+                    finished = True
+                    return
+                else:
+                    finished = True
+                    raise value
+        finally:
+            if not finished:
+                self._cancel(request_id, pieces, timeout)
+            self._forget(request_id)
+
+    def _cancel(self, request_id, pieces, timeout=None):
+        with self._lock:
+            entry = self._pending.get(request_id)
+            worker = self._workers.get(entry[0]) if entry is not None else None
+        if worker is None:
+            return
+        worker["requests"].put((request_id, "cancel", ()))
+        deadline = time.monotonic() + (timeout or 10.0)
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                kind, _ = pieces.get(timeout=remaining)
+            except queue.Empty:
+                return
+            if kind != "token":  # "end", or an error if the worker crashed meanwhile
+                return
+
+    def _forget(self, request_id):
+        with self._lock:
+            entry = self._pending.pop(request_id, None)
+            if entry is not None:
+                self._workers[entry[0]]["in_flight"].discard(request_id)
+        return entry
+
+    def _resolve(self, waiter, kind, value):
+        if isinstance(waiter, queue.Queue):
+            waiter.put((kind, value))
+            return
+        try:
+            if kind == "ok":
+                waiter.set_result(value)
+            else:
+                waiter.set_exception(value)
+        except InvalidStateError:
+            pass  # the caller timed out and cancelled
+
+    # ----- background threads -----
+
+    def _dispatch(self):
+        while not self._closing:
+            try:
+                kind, key, value = self._results.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            if kind in ("ready", "failed"):
+                self._on_worker_started(kind, key, value)
+                continue
+
+            if kind == "token":
+                with self._lock:
+                    entry = self._pending.get(key)
+            else:
+                entry = self._forget(key)
+            if entry is None:
+                continue
+            if kind == "error":
+                value = RuntimeError(value)
+            self._resolve(entry[1], kind, value)
+
+    def _on_worker_started(self, kind, worker_id, value):
+        with self._lock:
+            if kind == "ready":
+                self._workers[worker_id]["ready"] = True
+                self.model_name = value["emotion_model"]
+                self.backend = value["emotion_backend"]
+            elif self.error is None:
+                self.error = f"Worker {worker_id} failed to load models: {value}"
+            all_ready = all(w["ready"] for w in self._workers.values())
+        if all_ready or kind == "failed":
+            self._ready.set()
+
+    def _monitor(self):
+        while not self._closing:
+            time.sleep(0.5)
+            for worker_id, worker in list(self._workers.items()):
+                if self._closing or self.error or worker["process"].is_alive():
+                    continue
+                with self._lock:
+                    lost = [self._pending.pop(rid) for rid in worker["in_flight"] if rid in self._pending]
+                    worker["in_flight"].clear()
+                    self._spawn(worker_id, restarts=worker["restarts"] + 1)
+                for _, waiter in lost:
+                    self._resolve(waiter, "error", WorkerCrashed(f"Inference worker {worker_id} crashed."))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": {
+                    worker_id: {
+                        "alive": worker["process"].is_alive(),
+                        "ready": worker["ready"],
+                        "in_flight": len(worker["in_flight"]),
+                        "restarts": worker["restarts"],
+                    }
+                    for worker_id, worker in self._workers.items()
+                },
+                "pending": len(self._pending),
+                "timeouts": self.timeouts,
+            }
+
+    def close(self, timeout=10.0):
+        self._closing = True
+        for worker in self._workers.values():
+            worker["requests"].put(None)
+        for worker in self._workers.values():
+            worker["process"].join(timeout)
+            if worker["process"].is_alive():
+                worker["process"].terminate()
@@ -0,0 +1,31 @@
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Query
+from database.dbConnection import analytics_collection
+from database.analytics import daily_emotions, default_range
+from database.chatLogWriter import chat_log_writer
+from routes.auth import get_current_user
+
+router = APIRouter()
+
+MAX_RANGE_DAYS = 366
+
+# 📊 Daily emotion counts (Mood Trend / Timeline / Summary), read from the rollups instead of raw chats
+@router.get("/emotions")
+async def get_emotions(
+    user_id: str = Depends(get_current_user),
+    start: Optional[date] = Query(None, description="First day (UTC, YYYY-MM-DD); defaults to 30 days before end"),
+    end: Optional[date] = Query(None, description="Last day (UTC, YYYY-MM-DD), inclusive; defaults to today"),
+):
+    default_start, default_end = default_range()
+    end = end or default_end
+    start = start or min(default_start, end)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end.")
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range is limited to {MAX_RANGE_DAYS} days.")
+    try:
+        await chat_log_writer.flush_user(user_id)  # include chats still in the write-behind queue
+        return await daily_emotions(analytics_collection, user_id, start, end)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,47 +1,38 @@
 from fastapi import APIRouter, HTTPException, Depends
-from passlib.context import CryptContext
 from models.user_model import User
 from database.dbConnection import user_collection
 from utils.jwt_handler import create_access_token, verify_token
 from fastapi.security import OAuth2PasswordBearer
 from bson import ObjectId
-import hashlib
+from pymongo.errors import DuplicateKeyError
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-import hashlib
 from fastapi import APIRouter, HTTPException
-from passlib.context import CryptContext
 from models.user_model import User
 from database.dbConnection import user_collection
 from utils.jwt_handler import create_access_token
+from utils.password_hasher import password_hasher  # SHA256 then bcrypt, on a dedicated process pool
 
 router = APIRouter()
-bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def hash_password(password: str) -> str:
-    # Step 1: Full SHA256 hashing (no truncation)
-    sha_hash = hashlib.sha256(password.encode()).hexdigest()
-    # Step 2: Then bcrypt that fixed-size hash
-    return bcrypt_context.hash(sha_hash)
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    sha_hash = hashlib.sha256(plain_password.encode()).hexdigest()
-    return bcrypt_context.verify(sha_hash, hashed_password)
 
 @router.post("/register")
-def register(user: User):
+async def register(user: User):
     # Check if user already exists
-    if user_collection.find_one({"email": user.email}):
+    if await user_collection.find_one({"email": user.email}):
         raise HTTPException(status_code=400, detail="Email already registered")
 
     # Store user info
     user_data = {
         "name": user.name,
         "email": user.email,
-        "password": user.password
+        "password": await password_hasher.hash(user.password)
     }
-    result = user_collection.insert_one(user_data)
+    try:
+        result = await user_collection.insert_one(user_data)
+    except DuplicateKeyError:
+        # Lost a race with a concurrent registration; the unique email index rejected the second one
+        raise HTTPException(status_code=400, detail="Email already registered")
 
     # Generate JWT token
     token = create_access_token(str(result.inserted_id))
@@ -49,13 +40,18 @@ def register(user: User):
 
 
 @router.post("/login")
-def login(user: User):
-    db_user = user_collection.find_one({"email": user.email})
+async def login(user: User):
+    db_user = await user_collection.find_one({"email": user.email})
     if not db_user:
+        await password_hasher.verify_unknown(user.password)  # same bcrypt work as a wrong password
         raise HTTPException(status_code=400, detail="Invalid email or password")
 
-    if not (user.password, db_user["password"]):
+    matches, new_hash = await password_hasher.verify(user.password, db_user["password"])
+    if not matches:
         raise HTTPException(status_code=400, detail="Invalid email or password")
+    if new_hash:
+        # Transparent upgrade: legacy plaintext or a cost factor below the current one
+        await user_collection.update_one({"_id": db_user["_id"]}, {"$set": {"password": new_hash}})
 
     token = create_access_token(str(db_user["_id"]))
     return {
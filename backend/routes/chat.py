@@ -1,53 +1,271 @@
-from fastapi import APIRouter, HTTPException, Depends
+import os
+import json
+import asyncio
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool, iterate_in_threadpool
 from pydantic import BaseModel
-from models.emotionModel import EmotionModel
-from models.responseModel import ResponseModel
-from database.dbConnection import chat_collection
+from typing import Optional
+from models.responseModel import ResponseModel, CRISIS_MESSAGE, DECODING_PROFILES
+from models.modelRegistry import registry
+from models.safetyEngine import crisis_detector
+from models.contextStore import ConversationContextStore
+from models.workerPool import WorkerUnavailable, WorkerCrashed
+from models.asrEngine import AudioDecoder, join_transcript, speech_recognizer
+from database.dbConnection import chat_collection, bucket_collection
+from database.chatLogWriter import chat_log_writer
+from database.clearJobs import clear_jobs
+from database.chatHistory import history_page, iter_history, parse_fields
 from datetime import datetime
 from routes.auth import get_current_user  # 🔐 import auth dependency
+from utils import metrics
+from utils.admission import admission
 
 router = APIRouter()
 
-emotion_model = EmotionModel()
-response_model = ResponseModel()
+# 🧠 Recent turns per user, so replies follow the conversation without re-reading Mongo each turn
+context_store = ConversationContextStore(
+    chat_collection,
+    bucket_collection,
+    max_turns=int(os.getenv("CHAT_CONTEXT_TURNS", "3")),
+    max_sessions=int(os.getenv("CHAT_CONTEXT_MAX_SESSIONS", "10000")),
+    idle_seconds=float(os.getenv("CHAT_CONTEXT_IDLE_SECONDS", "1800")),
+    flush_user=chat_log_writer.flush_user,
+)
+metrics.register("context_store", context_store.stats)
+
+MAX_VOICE_SECONDS = float(os.getenv("ASR_MAX_SECONDS", "60"))
 
 class ChatRequest(BaseModel):
     message: str  # removed user_id (we’ll use from token)
+    profile: Optional[str] = None  # decoding profile, defaults to RESPONSE_PROFILE
+    private: bool = False  # opt out of the semantic reply cache shared across users
 
-# 💬 Chat Endpoint
-@router.post("/")
-def chat(request: ChatRequest, user_id: str = Depends(get_current_user)):
+def check_profile(profile: Optional[str]):
+    if profile is not None and profile not in DECODING_PROFILES:
+        raise HTTPException(status_code=400, detail=f"Unknown profile. Choose one of: {', '.join(DECODING_PROFILES)}")
+
+async def respond(user_id: str, message: str, profile: Optional[str] = None, private: bool = False):
+    """(emotion, reply) for one message, logged and added to the user's context. Shared by typed and voice chat."""
     try:
-        emotion = emotion_model.predict(request.message)
-        reply = response_model.generate_reply(request.message, emotion)
+        # 🚨 Crisis fast lane: answered before, and without, any model inference (even while models load)
+        if crisis_detector.detect(message):
+            emotion, reply = "crisis", CRISIS_MESSAGE
+        else:
+            registry.require_ready()
+            # 🚦 Rate limit and admission: shed early (429/503) rather than queue past the deadline
+            async with admission.admit(user_id):
+                history = await context_store.history(user_id)
+                emotion = await registry.wait(registry.classify(message))
+                reply = await registry.wait(registry.generate(message, emotion, profile, history, shared_cache=not private,
+                                                                user_id=user_id))
 
         chat_log = {
             "user_id": user_id,
-            "message": request.message,
+            "message": message,
             "bot_reply": reply,
             "emotion": emotion,
             "timestamp": datetime.utcnow()
         }
-        chat_collection.insert_one(chat_log)
+        await chat_log_writer.write(chat_log)  # queued; persisted by the write-behind flusher
+        context_store.append(user_id, message, reply, emotion)
+        return emotion, reply
+    except HTTPException:
+        raise
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="The model took too long to respond. Try again.")
+    except (WorkerUnavailable, WorkerCrashed) as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        return {"emotion": emotion, "reply": reply}
+# 💬 Chat Endpoint
+# Async so that waiting on inference or MongoDB never holds a request-handling thread
+@router.post("/")
+async def chat(request: ChatRequest, user_id: str = Depends(get_current_user)):
+    check_profile(request.profile)
+    emotion, reply = await respond(user_id, request.message, request.profile, request.private)
+    return {"emotion": emotion, "reply": reply}
+
+# 🎙️ Voice Chat
+# The request body is transcribed while it uploads (VAD splits it on pauses, each phrase goes to the
+# recognizer right away), then the transcript is answered exactly like a typed message
+@router.post("/voice")
+async def chat_voice(http_request: Request, profile: Optional[str] = Query(None), private: bool = Query(False),
+                     user_id: str = Depends(get_current_user)):
+    check_profile(profile)
+    if speech_recognizer is None:
+        raise HTTPException(status_code=404, detail="Voice chat is disabled.")
+    speech_recognizer.require_ready()
+    try:
+        decoder = AudioDecoder(http_request.headers.get("content-type", ""))
+    except ValueError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+
+    transcriber = speech_recognizer.open()
+    try:
+        async for chunk in http_request.stream():
+            transcriber.feed(decoder.feed(chunk))
+            if transcriber.seconds > MAX_VOICE_SECONDS:
+                raise HTTPException(status_code=413, detail=f"Voice messages are limited to {MAX_VOICE_SECONDS:g} seconds.")
+        texts = await asyncio.gather(*(asyncio.wrap_future(f) for f in transcriber.finish()))
+    except ValueError as e:  # malformed WAV header
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        transcriber.cancel()
+        speech_recognizer.release(transcriber)
+
+    transcript = join_transcript(texts)
+    if not transcript:
+        raise HTTPException(status_code=422, detail="Couldn't make out any speech. Try again a little closer to the microphone.")
+    emotion, reply = await respond(user_id, transcript, profile, private)
+    return {"transcript": transcript, "emotion": emotion, "reply": reply}
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# 📡 Streaming Chat Endpoint (Server-Sent Events)
+@router.post("/stream")
+async def chat_stream(request: ChatRequest, user_id: str = Depends(get_current_user)):
+    check_profile(request.profile)
+    crisis = crisis_detector.detect(request.message)
+    release = None
+    if not crisis:
+        registry.require_ready()
+        release = await admission.acquire(user_id)  # rejected before the stream starts, with a real status code
+    started = False
+    stream = None  # the decode iterator, once generation has begun
+
+    def release_unstarted():
+        # The client left before the body was iterated, so events() never ran to release the slot
+        if release is not None and not started:
+            release()
+
+    async def events():
+        nonlocal started, stream
+        started = True
+        finished = False
+        try:
+            # 🚨 Crisis message goes out first and skips the models entirely
+            if crisis:
+                yield format_sse("crisis", {"text": CRISIS_MESSAGE})
+                emotion, reply = "crisis", CRISIS_MESSAGE
+            else:
+                history = await context_store.history(user_id)
+                emotion = await registry.wait(registry.classify(request.message))
+                yield format_sse("emotion", {"emotion": emotion})
+
+                pieces = []
+                # Decoding blocks, so the token iterator is drained from the threadpool
+                stream = await run_in_threadpool(registry.stream, request.message, emotion, request.profile, history)
+                async for text in iterate_in_threadpool(stream):
+                    pieces.append(text)
+                    yield format_sse("token", {"text": text})
+                finished = True
+                release()
+
+                coping = ResponseModel.coping_block(emotion)
+                yield format_sse("coping", {"text": coping})
+                reply = "".join(pieces).strip() + coping
+
+            await chat_log_writer.write({
+                "user_id": user_id,
+                "message": request.message,
+                "bot_reply": reply,
+                "emotion": emotion,
+                "timestamp": datetime.utcnow()
+            })
+            context_store.append(user_id, request.message, reply, emotion)
+            yield format_sse("done", {"emotion": emotion, "reply": reply})
+        except asyncio.TimeoutError:
+            yield format_sse("error", {"detail": "The model took too long to respond. Try again."})
+        except Exception as e:
+            finished = True  # an error from the decode iterator ends it
+            yield format_sse("error", {"detail": str(e)})
+        finally:
+            if release is not None and stream is not None and not finished:
+                # The client went away mid-reply: stop decoding, and only free the slot once the
+                # model has actually stopped (closing blocks for up to a decoding step)
+                closing = asyncio.get_running_loop().run_in_executor(None, stream.close)
+                closing.add_done_callback(lambda _: release())
+            elif release is not None:
+                release()
+
+    return StreamingResponse(
+        events(),
+        background=BackgroundTask(release_unstarted),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def json_default(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
 
 # 🕓 Get Chat History
+# Keyset-paginated on (timestamp, _id); format=ndjson streams documents straight from the cursor instead
 @router.get("/history")
-def get_history(user_id: str = Depends(get_current_user)):
+async def get_history(
+    user_id: str = Depends(get_current_user),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size (default 50); no limit in ndjson mode"),
+    before: Optional[str] = Query(None, description="Cursor: return chats older than this"),
+    after: Optional[str] = Query(None, description="Cursor: return chats newer than this"),
+    fields: Optional[str] = Query(None, description="Comma-separated subset of message,bot_reply,emotion,timestamp"),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+):
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both.")
     try:
-        chats = list(chat_collection.find({"user_id": user_id}, {"_id": 0}))
-        return {"history": chats}
+        wanted = parse_fields(fields)
+        await chat_log_writer.flush_user(user_id)  # read-your-writes for chats still in the write-behind queue
+        if format == "ndjson":
+            if before:
+                raise HTTPException(status_code=400, detail="ndjson streams forward in time; use after.")
+            docs = iter_history(chat_collection, bucket_collection, user_id, after=after, limit=limit, fields=wanted)
+            first = await anext(docs, None)  # surfaces a bad cursor or a database error before the 200 goes out
+
+            async def lines():
+                try:
+                    if first is None:
+                        return
+                    yield json.dumps(first, default=json_default) + "\n"
+                    async for doc in docs:
+                        yield json.dumps(doc, default=json_default) + "\n"
+                finally:
+                    await docs.aclose()  # the client may leave mid-stream; don't leave the cursors open
+
+            # aclose is a no-op once lines() has closed it; this covers a client gone before the body started
+            return StreamingResponse(lines(), background=BackgroundTask(docs.aclose), media_type="application/x-ndjson")
+
+        return await history_page(chat_collection, bucket_collection, user_id, limit or 50, before, after, wanted)
+    except HTTPException:
+        raise
+    except ValueError as e:  # InvalidCursor or unknown fields
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # 🧹 Clear Chat History
-@router.delete("/clear")
-def clear_chat(user_id: str = Depends(get_current_user)):
+# Runs as a background job deleting in chunks; poll /chat/clear/{job_id} for progress
+@router.delete("/clear", status_code=202)
+async def clear_chat(user_id: str = Depends(get_current_user)):
     try:
-        chat_collection.delete_many({"user_id": user_id})
-        return {"message": "Chat history cleared."}
+        await chat_log_writer.flush_user(user_id)  # so queued records can't reappear after the delete
+        context_store.drop(user_id)
+        if registry.reply_cache is not None:
+            await run_in_threadpool(registry.reply_cache.forget_user, user_id)  # replies cached from their messages
+        job = await clear_jobs.submit(user_id)
+        return {"message": "Chat history is being cleared.", **job}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/clear/{job_id}")
+async def clear_status(job_id: str, user_id: str = Depends(get_current_user)):
+    job = await clear_jobs.get(job_id, user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from models.modelRegistry import registry
+
+router = APIRouter()
+
+# 💓 Liveness: the process is up and serving requests
+@router.get("/healthz")
+def healthz():
+    return {"status": "ok"}
+
+# 🚦 Readiness: models are loaded and warmed up
+@router.get("/readyz")
+def readyz():
+    status = registry.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
@@ -0,0 +1,25 @@
+import hmac
+import os
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from utils import metrics
+
+router = APIRouter()
+
+# Internals (queue depths, cache sizes, model state) are only served with this bearer token
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+bearer = HTTPBearer(auto_error=False)
+
+
+def require_metrics_token(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer)):
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Metrics are disabled; set METRICS_TOKEN to enable them.")
+    if credentials is None or not hmac.compare_digest(credentials.credentials.encode(), METRICS_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"})
+
+
+# 📈 Runtime counters (caches, queues, batchers)
+@router.get("/", dependencies=[Depends(require_metrics_token)])
+def get_metrics():
+    return metrics.snapshot()
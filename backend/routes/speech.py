@@ -0,0 +1,33 @@
+import asyncio
+import os
+from fastapi import APIRouter, HTTPException, Depends, Response
+from pydantic import BaseModel
+from models.ttsEngine import speech_synthesizer
+from routes.auth import get_current_user
+
+router = APIRouter()
+
+MAX_CHARS = int(os.getenv("TTS_MAX_CHARS", "2000"))
+
+
+class SpeechRequest(BaseModel):
+    text: str
+
+
+# 🔊 Text to speech, synthesized locally and cached per paragraph (crisis and coping audio is pre-rendered)
+@router.post("/")
+async def speak(request: SpeechRequest, user_id: str = Depends(get_current_user)):
+    if not request.text.strip():
+        raise HTTPException(status_code=400, detail="Nothing to say.")
+    if len(request.text) > MAX_CHARS:
+        raise HTTPException(status_code=413, detail=f"Text is limited to {MAX_CHARS} characters.")
+    if speech_synthesizer is None or not speech_synthesizer.available:
+        raise HTTPException(status_code=503, detail="Speech synthesis is unavailable.")
+    try:
+        # Own executor, not the shared threadpool: a burst of /speech calls must not starve /chat/stream
+        audio = await asyncio.wrap_future(speech_synthesizer.submit(request.text))
+    except ValueError as e:  # only markup/emoji, nothing speakable
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return Response(audio, media_type="audio/wav")
@@ -0,0 +1,98 @@
+"""Rebuilds the emotion_daily rollups from stored chats, in both storage layouts.
+
+Run from the backend directory against the configured MONGO_URI:
+
+    python -m scripts.backfill_analytics
+    python -m scripts.backfill_analytics --user 64f... --until 2026-01-01
+
+Counts are recomputed user by user from both storage layouts (chats documents and chat_buckets
+turns), counting each chat _id once so chats caught mid-migration in both layouts aren't doubled,
+and written with $set as soon as a user is done, so the backfill is idempotent and can be re-run.
+Chats stored without an emotion are skipped, as the live updates never count them either.
+Only days before --until (default: today, UTC) are written: from then on the live $inc updates
+own the counts, and overwriting a day that is still receiving chats could lose increments.
+"""
+import argparse
+import asyncio
+from collections import Counter, defaultdict
+from datetime import datetime
+from pymongo import UpdateOne
+from database.dbConnection import client, db, chat_collection, bucket_collection, analytics_collection
+from database.analytics import day_key
+from database.indexes import ensure_indexes
+
+
+async def user_ids(user_id=None):
+    """Every user with stored chats, from both layouts."""
+    if user_id:
+        return [user_id]
+    users = set()
+    for collection in (chat_collection, bucket_collection):
+        cursor = await collection.aggregate([{"$group": {"_id": "$user_id"}}], allowDiskUse=True)
+        users.update([doc["_id"] async for doc in cursor])
+    return sorted(users, key=str)
+
+
+async def user_chats(user_id, until: datetime):
+    """(_id, timestamp, emotion) of the user's chats before `until`, bucket turns unwound into the same shape."""
+    cursor = chat_collection.find({"user_id": user_id, "timestamp": {"$lt": until}}, {"timestamp": 1, "emotion": 1})
+    async for doc in cursor:
+        yield doc["_id"], doc["timestamp"], doc.get("emotion")
+    cursor = await bucket_collection.aggregate([
+        {"$match": {"user_id": user_id, "start": {"$lt": until}}},
+        {"$unwind": "$turns"},
+        {"$match": {"turns.t": {"$lt": until}}},
+        {"$project": {"_id": "$turns.i", "timestamp": "$turns.t", "emotion": "$turns.e"}},
+    ])
+    async for doc in cursor:
+        yield doc["_id"], doc["timestamp"], doc.get("emotion")
+
+
+async def daily_counts(user_id, until: datetime) -> dict:
+    """{day: Counter(emotion -> n)} for one user, each chat _id counted once across both layouts."""
+    counts, seen = defaultdict(Counter), set()
+    async for chat_id, timestamp, emotion in user_chats(user_id, until):
+        if chat_id in seen or emotion is None:  # None would become a "counts.None" field
+            continue
+        seen.add(chat_id)
+        counts[day_key(timestamp)][emotion] += 1
+    return counts
+
+
+async def run(until: datetime, user_id=None, batch_size=1000):
+    try:
+        await ensure_indexes(db)  # the unique (user_id, day) index keeps the upserts from duplicating days
+        days = chats = 0
+        batch = []
+        for user in await user_ids(user_id):
+            for day, emotions in (await daily_counts(user, until)).items():
+                batch.append(UpdateOne(
+                    {"user_id": user, "day": day},
+                    {"$set": {"counts": dict(emotions), "total": sum(emotions.values())}},
+                    upsert=True,
+                ))
+                days += 1
+                chats += sum(emotions.values())
+            if len(batch) >= batch_size:
+                await analytics_collection.bulk_write(batch, ordered=False)
+                batch = []
+        if batch:
+            await analytics_collection.bulk_write(batch, ordered=False)
+        print(f"Backfilled {days:,} user-days covering {chats:,} chats before {until.date()}")
+    finally:
+        await client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--user", help="only backfill this user_id")
+    parser.add_argument("--until", type=datetime.fromisoformat,
+                        default=datetime.combine(datetime.utcnow().date(), datetime.min.time()),
+                        help="exclusive end (UTC date), default today")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(run(args.until, args.user, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Storage size and history-read latency of the document vs. bucket chat layouts.
+
+Run from the backend directory against a MongoDB you can write a scratch database to:
+
+    python -m scripts.bench_chat_storage --users 200 --messages 2000
+    python -m scripts.bench_chat_storage --db mindmate_bench --keep
+
+Both layouts are loaded with the same synthetic chats into a separate database (dropped afterwards
+unless --keep), indexed like production, and read through the same history code path.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from database.dbConnection import client
+from database.chatBuckets import build_buckets
+from database.chatHistory import history_page
+from database.indexes import ensure_indexes
+
+EMOTIONS = ["joy", "sadness", "anger", "fear", "love", "surprise", "neutral"]
+MESSAGES = [
+    "I feel sad today", "I'm stressed about exams", "work was exhausting again",
+    "I had a great day with my friends!", "can't sleep, mind keeps racing", "I miss home so much",
+]
+
+
+def synthetic_chats(users, messages, days, seed=7):
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1)
+    chats = []
+    for u in range(users):
+        user_id = str(ObjectId())
+        times = sorted(start + timedelta(seconds=rng.randrange(days * 86400)) for _ in range(messages))
+        for t in times:
+            chats.append({
+                "_id": ObjectId(),
+                "user_id": user_id,
+                "message": rng.choice(MESSAGES),
+                "bot_reply": "I'm here for you. " * rng.randint(2, 8),
+                "emotion": rng.choice(EMOTIONS),
+                "timestamp": t.replace(microsecond=t.microsecond // 1000 * 1000),
+            })
+    return chats
+
+
+async def load(db, chats, batch_size=10000):
+    for i in range(0, len(chats), batch_size):
+        await db["chats"].insert_many([dict(c) for c in chats[i:i + batch_size]], ordered=False)
+    buckets = build_buckets(sorted(chats, key=lambda c: (c["user_id"], c["timestamp"], c["_id"])))
+    for i in range(0, len(buckets), 1000):
+        await db["chat_buckets"].insert_many(buckets[i:i + 1000], ordered=False)
+
+
+async def collection_stats(db, name):
+    stats = await db.command("collStats", name)
+    return stats["count"], stats["size"], stats["storageSize"], stats["totalIndexSize"]
+
+
+async def read_latency(chats, buckets, user_ids, pages, limit):
+    """Milliseconds per page: the newest page, then `pages - 1` pages back through `before`."""
+    timings = []
+    for user_id in user_ids:
+        before = None
+        for _ in range(pages):
+            start = time.perf_counter()
+            page = await history_page(chats, buckets, user_id, limit=limit, before=before)
+            timings.append((time.perf_counter() - start) * 1000)
+            before = page["before"]
+            if before is None:
+                break
+    timings.sort()
+    return statistics.mean(timings), timings[len(timings) // 2], timings[int(len(timings) * 0.95)]
+
+
+async def run(args):
+    db = client[args.db]
+    try:
+        await db["chats"].drop()
+        await db["chat_buckets"].drop()
+        chats = synthetic_chats(args.users, args.messages, args.days)
+        print(f"{len(chats):,} chats, {args.users} users, {args.days} days")
+        start = time.perf_counter()
+        await load(db, chats)
+        await ensure_indexes(db)
+        print(f"loaded and indexed in {time.perf_counter() - start:.1f}s\n")
+
+        print(f"{'layout':<10} {'docs':>10} {'data MB':>9} {'storage MB':>11} {'index MB':>9}")
+        for layout, name in (("documents", "chats"), ("buckets", "chat_buckets")):
+            count, size, storage, index = await collection_stats(db, name)
+            print(f"{layout:<10} {count:>10,} {size / 2**20:>9.2f} {storage / 2**20:>11.2f} {index / 2**20:>9.2f}")
+
+        user_ids = random.Random(1).sample(sorted({c["user_id"] for c in chats}), min(args.sample, args.users))
+        print(f"\nhistory reads: {len(user_ids)} users x {args.pages} pages of {args.limit}")
+        for layout, sources in (("documents", (db["chats"], None)), ("buckets", (None, db["chat_buckets"]))):
+            await read_latency(*sources, user_ids[:3], 1, args.limit)  # warm up
+            mean, p50, p95 = await read_latency(*sources, user_ids, args.pages, args.limit)
+            print(f"{layout:<10} mean={mean:6.2f}ms p50={p50:6.2f}ms p95={p95:6.2f}ms")
+    finally:
+        if not args.keep:
+            await client.drop_database(args.db)
+        await client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default="mindmate_bench", help="scratch database (dropped afterwards)")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=1000, help="chats per user")
+    parser.add_argument("--days", type=int, default=90, help="spread of chats per user")
+    parser.add_argument("--sample", type=int, default=50, help="users to read history for")
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch database")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Benchmark of the compiled crisis detector against the old per-call keyword regex.
+
+Run from the backend directory:
+
+    python -m scripts.bench_crisis --messages 200000
+    python -m scripts.bench_crisis --corpus messages.txt
+
+Without --corpus a synthetic corpus is generated: everyday messages mixed with noisy crisis
+phrasing (capitals, punctuation, stretched letters, misspellings).
+"""
+import argparse
+import random
+import re
+import statistics
+import time
+from models.safetyEngine import crisis_detector
+
+LEGACY_KEYWORDS = [
+    "suicide", "kill myself", "end my life", "worthless",
+    "hopeless", "want to die", "self harm", "cut myself"
+]
+
+EVERYDAY = [
+    "I feel sad today", "hi", "I'm stressed about exams", "work was exhausting again",
+    "I had a great day with my friends!", "can't sleep, mind keeps racing", "why is everything so hard",
+    "my boss yelled at me and I'm furious", "I think tomorrow will be better", "I miss home so much",
+    "nothing special happened, just tired", "I finally finished my project :)",
+]
+CRISIS = [
+    "I want to DIIIE", "i wanna die", "thinking about suicde", "I'll kms", "self-harm again...",
+    "I don't want to live anymore", "I feel so worthless", "Im hopless", "going to unalive myself",
+    "I want to end my life tonight", "better off dead honestly", "I cut myself again",
+]
+
+
+def legacy_detect(text):
+    """The previous implementation: keyword list and regex rebuilt on every call."""
+    pattern = re.compile("|".join(LEGACY_KEYWORDS), re.IGNORECASE)
+    return bool(pattern.search(text))
+
+
+def synthetic_corpus(size, crisis_ratio, seed=7):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        base = rng.choice(CRISIS if rng.random() < crisis_ratio else EVERYDAY)
+        filler = " ".join(rng.choice(EVERYDAY).split()[: rng.randint(0, 8)])
+        corpus.append(f"{filler} {base}" if rng.random() < 0.5 else f"{base} {filler}")
+    return corpus
+
+
+def bench(name, detect, corpus):
+    timings, hits = [], 0
+    for text in corpus:
+        start = time.perf_counter_ns()
+        hits += detect(text)
+        timings.append(time.perf_counter_ns() - start)
+
+    timings.sort()
+    total_s = sum(timings) / 1e9
+    print(
+        f"{name:<10} hits={hits:<8} mean={statistics.mean(timings) / 1000:7.2f}µs "
+        f"p50={timings[len(timings) // 2] / 1000:7.2f}µs p99={timings[int(len(timings) * 0.99)] / 1000:7.2f}µs "
+        f"max={timings[-1] / 1000:8.2f}µs throughput={len(corpus) / total_s:,.0f} msg/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", help="text file with one message per line")
+    parser.add_argument("--messages", type=int, default=100000, help="synthetic corpus size")
+    parser.add_argument("--crisis-ratio", type=float, default=0.05)
+    args = parser.parse_args()
+
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            corpus = [line.strip() for line in f if line.strip()]
+    else:
+        corpus = synthetic_corpus(args.messages, args.crisis_ratio)
+
+    print(f"{len(corpus):,} messages, {len(crisis_detector.phrases)} phrases")
+    bench("compiled", crisis_detector.detect, corpus)
+    bench("legacy", legacy_detect, corpus)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Trains the fast emotion stage on transformer labels and calibrates its escalation thresholds.
+
+Run from the backend directory:
+
+    python -m scripts.calibrate_emotion_cascade --corpus messages.txt
+    python -m scripts.calibrate_emotion_cascade --from-db 20000 --target-agreement 0.97
+    python -m scripts.calibrate_emotion_cascade --corpus messages.txt --lexicon-only --dry-run
+
+Every message is labelled by the transformer (EMOTION_BACKEND), which is the reference the
+cascade has to agree with. The messages are split three ways: the linear model is fitted on the
+training part; per-label thresholds are picked on the calibration part as the lowest confidence
+at which the fast stage still agrees with the transformer at least --target-agreement of the
+time; the report is computed on the held-out test part. The model and thresholds are written to
+EMOTION_CASCADE_PATH (serve them with EMOTION_CASCADE=on).
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from models.emotionModel import EmotionModel
+from models.emotionCascade import EmotionCascade, EmotionLexicon, FastEmotionClassifier
+from scripts.compare_emotion_backends import load_corpus
+
+NEVER = 1.01  # threshold for labels the fast stage can't answer reliably: always escalate
+
+
+async def sample_messages(size):
+    """Up to `size` random user messages from both storage layouts."""
+    from database.dbConnection import client, chat_collection, bucket_collection
+
+    try:
+        cursor = await chat_collection.aggregate([{"$sample": {"size": size}}, {"$project": {"_id": 0, "message": 1}}])
+        messages = [doc["message"] for doc in await cursor.to_list(None)]
+        cursor = await bucket_collection.aggregate([
+            {"$sample": {"size": max(1, size // 20)}},
+            {"$unwind": "$turns"},
+            {"$project": {"_id": 0, "message": "$turns.m"}},
+            {"$limit": size},
+        ])
+        messages += [doc["message"] for doc in await cursor.to_list(None)]
+        return messages[:size]
+    finally:
+        await client.close()
+
+
+def transformer_labels(model, messages, batch_size):
+    start = time.perf_counter()
+    labels = []
+    for i in range(0, len(messages), batch_size):
+        labels += model.predict_batch(messages[i:i + batch_size])
+    return labels, (time.perf_counter() - start) / len(messages)
+
+
+def calibrate(decisions, reference, labels, target, min_support):
+    """Per label, the lowest confidence whose fast answers (at or above it) agree with `target` of the reference."""
+    thresholds = {}
+    for label in labels:
+        scored = sorted(((conf, ref == label) for (pred, conf, _), ref in zip(decisions, reference) if pred == label), reverse=True)
+        threshold, agreed = NEVER, 0
+        for k, (conf, agrees) in enumerate(scored, 1):
+            agreed += agrees
+            if k >= min_support and agreed / k >= target:
+                threshold = conf
+        thresholds[label] = threshold
+    return thresholds
+
+
+def report(cascade, messages, reference, transformer_seconds):
+    start = time.perf_counter()
+    decisions = cascade.decide(messages)
+    fast_seconds = (time.perf_counter() - start) / len(messages)
+
+    answered = [(pred, ref) for (pred, _, confident), ref in zip(decisions, reference) if confident]
+    agree = sum(pred == ref for pred, ref in answered)
+    escalation = 1 - len(answered) / len(messages)
+    print(f"\n{len(messages)} test messages")
+    print(f"escalation rate      {escalation:>7.1%}")
+    print(f"fast-stage agreement {agree / len(answered) if answered else 0:>7.1%}  ({len(answered)} answered)")
+    print(f"cascade agreement    {(agree + len(messages) - len(answered)) / len(messages):>7.1%}")
+    print(f"fast stage           {fast_seconds * 1e6:>7.1f} us/message")
+    print(f"transformer          {transformer_seconds * 1e3:>7.2f} ms/message (batched)")
+    print(f"expected cost        {(fast_seconds + escalation * transformer_seconds) * 1e3:>7.2f} ms/message")
+
+    print(f"\n{'label':<10} {'threshold':>9} {'answered':>9} {'agreement':>10} {'reference':>10}")
+    for label in cascade.fast.labels:
+        mine = [(pred, ref) for pred, ref in answered if pred == label]
+        print(
+            f"{label:<10} {cascade.thresholds.get(label, cascade.default_threshold):>9.3f} {len(mine):>9} "
+            f"{(sum(p == r for p, r in mine) / len(mine)) if mine else 0:>9.1%} {reference.count(label):>10}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", help="text file with one message per line")
+    parser.add_argument("--from-db", type=int, metavar="N", help="sample N messages from stored chats instead")
+    parser.add_argument("--target-agreement", type=float, default=0.95)
+    parser.add_argument("--min-support", type=int, default=20, help="fewest calibration answers to trust a label's threshold")
+    parser.add_argument("--split", type=float, nargs=2, default=(0.6, 0.2), metavar=("TRAIN", "CALIBRATE"),
+                        help="fractions for training and calibration; the rest is the test set")
+    parser.add_argument("--lexicon-only", action="store_true", help="don't fit the linear model, only calibrate the lexicon")
+    parser.add_argument("--epochs", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=32, help="transformer batch size for labelling")
+    parser.add_argument("--out", default=os.getenv("EMOTION_CASCADE_PATH", "cascade/emotion.npz"))
+    parser.add_argument("--dry-run", action="store_true", help="report only, don't write the model")
+    args = parser.parse_args()
+
+    messages = asyncio.run(sample_messages(args.from_db)) if args.from_db else load_corpus(args.corpus)
+    messages = list(dict.fromkeys(m.strip() for m in messages if m and m.strip()))
+    random.Random(0).shuffle(messages)
+    if len(messages) < 200:
+        print(f"Only {len(messages)} messages; thresholds will be noisy. A few thousand are a better start.")
+
+    model = EmotionModel()
+    reference, transformer_seconds = transformer_labels(model, messages, args.batch_size)
+
+    n_train = int(len(messages) * args.split[0])
+    n_cal = int(len(messages) * args.split[1])
+    train, cal, test = slice(0, n_train), slice(n_train, n_train + n_cal), slice(n_train + n_cal, None)
+
+    fast = FastEmotionClassifier(EmotionLexicon.from_config(), model.labels)
+    if not args.lexicon_only:
+        start = time.perf_counter()
+        fast.fit(messages[train], reference[train], epochs=args.epochs)
+        print(f"fitted on {n_train} messages in {time.perf_counter() - start:.1f}s")
+
+    cascade = EmotionCascade(fast)
+    thresholds = calibrate(cascade.decide(messages[cal]), reference[cal], fast.labels, args.target_agreement, args.min_support)
+    cascade = EmotionCascade(fast, thresholds)
+    if messages[test]:
+        report(cascade, messages[test], reference[test], transformer_seconds)
+
+    if not args.dry_run:
+        if fast.trained:
+            fast.save(args.out, thresholds)
+            print(f"\nSaved the model and thresholds to {args.out}")
+        else:
+            print(f"\nLexicon-only thresholds (not saved; set EMOTION_CASCADE_THRESHOLD instead): {thresholds}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Checks that the hot queries are served by the declared indexes, using explain().
+
+Run from the backend directory against the configured MONGO_URI:
+
+    python -m scripts.check_indexes
+    python -m scripts.check_indexes --no-ensure   # only inspect, don't create missing indexes
+
+Exits non-zero if any query plan falls back to a collection scan, uses an unexpected index,
+or needs an in-memory sort.
+"""
+import argparse
+import asyncio
+import sys
+from database.dbConnection import client, db
+from database.indexes import ensure_indexes
+
+# (description, collection, filter, sort, limit, expected index)
+HOT_QUERIES = [
+    ("register/login by email", "user", {"email": "someone@example.com"}, None, 1, "email_unique"),
+    ("chat history page", "chats", {"user_id": "000000000000000000000000"}, [("timestamp", -1), ("_id", -1)], 51, "user_id_timestamp"),
+    ("chat history stream", "chats", {"user_id": "000000000000000000000000"}, [("timestamp", 1), ("_id", 1)], 0, "user_id_timestamp"),
+    ("conversation context", "chats", {"user_id": "000000000000000000000000"}, [("timestamp", -1)], 3, "user_id_timestamp"),
+    ("clear chat", "chats", {"user_id": "000000000000000000000000"}, None, 0, "user_id_timestamp"),
+    ("bucket history page", "chat_buckets", {"user_id": "000000000000000000000000"}, [("end", -1)], 0, "user_id_end"),
+    ("bucket history stream", "chat_buckets", {"user_id": "000000000000000000000000"}, [("start", 1)], 0, "user_id_start"),
+    ("bucket append", "chat_buckets", {"user_id": "000000000000000000000000", "day": "2026-01-01", "count": {"$lte": 199}}, None, 1, "user_id_day"),
+    ("emotion analytics", "emotion_daily", {"user_id": "000000000000000000000000", "day": {"$gte": "2026-01-01", "$lte": "2026-01-30"}}, [("day", 1)], 0, "user_id_day"),
+]
+
+
+def plan_stages(plan):
+    """Yields every stage of a winning plan, for both classic and slot-based (SBE) explain output."""
+    if not isinstance(plan, dict):
+        return
+    if "queryPlan" in plan:
+        plan = plan["queryPlan"]
+    yield plan
+    for child in [plan.get("inputStage")] + plan.get("inputStages", []):
+        yield from plan_stages(child)
+
+
+async def check(description, collection, query, sort, limit, expected) -> bool:
+    cursor = db[collection].find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+    explain = await cursor.explain()
+    stages = list(plan_stages(explain["queryPlanner"]["winningPlan"]))
+
+    names = [stage["stage"] for stage in stages]
+    used = {stage.get("indexName") for stage in stages if stage["stage"] == "IXSCAN"}
+    problems = []
+    if "COLLSCAN" in names:
+        problems.append("collection scan")
+    if expected not in used:
+        problems.append(f"expected index {expected}, used {sorted(filter(None, used)) or 'none'}")
+    if "SORT" in names:
+        problems.append("in-memory sort")
+
+    status = "ok  " if not problems else "FAIL"
+    print(f"{status} {description:<24} {' -> '.join(reversed(names))}" + (f"  ({'; '.join(problems)})" if problems else ""))
+    return not problems
+
+
+async def run(ensure: bool) -> bool:
+    try:
+        if ensure:
+            report = await ensure_indexes(db)
+            print("indexes " + " ".join(f"{action}={names}" for action, names in report.items()))
+        results = [await check(*query) for query in HOT_QUERIES]
+        return all(results)
+    finally:
+        await client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--no-ensure", action="store_true", help="don't create or rebuild indexes first")
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(not args.no_ensure)) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Label parity and latency of the ONNX emotion backends against the PyTorch model.
+
+Run from the backend directory:
+
+    python -m scripts.compare_emotion_backends --corpus messages.txt --batch-size 16
+
+The corpus is a text file with one message per line; a small built-in sample is used otherwise.
+"""
+import argparse
+import statistics
+import time
+from models.emotionModel import EmotionModel, EMOTION_BACKENDS
+
+SAMPLE_CORPUS = [
+    "I feel sad",
+    "hi",
+    "I'm stressed about my exams tomorrow",
+    "I got the job!! I can't believe it",
+    "Everything is falling apart and nobody cares",
+    "I'm so angry at my brother right now",
+    "Today was actually a pretty good day",
+    "I think things will get better soon",
+    "I can't sleep, my mind keeps racing",
+    "Why does this always happen to me",
+    "My friends threw me a surprise party",
+    "I'm tired of pretending I'm okay",
+    "Looking forward to the weekend",
+    "I hate how people treat me at work",
+    "I miss my grandmother so much",
+    "I finally finished my project and I'm proud of it",
+    "Nothing I do ever seems to matter",
+    "I'm hopeful the new therapy will help",
+    "Stop telling me to calm down",
+    "The sun is out and I went for a walk",
+]
+
+
+def load_corpus(path):
+    if not path:
+        return SAMPLE_CORPUS
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def run_backend(model, corpus, batch_size):
+    """Returns (labels, per-message latencies in ms at batch size 1, messages/sec at `batch_size`)."""
+    model.predict(corpus[0])  # warm-up
+
+    labels, latencies = [], []
+    for text in corpus:
+        start = time.perf_counter()
+        labels.append(model.predict(text))
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    for i in range(0, len(corpus), batch_size):
+        model.predict_batch(corpus[i:i + batch_size])
+    throughput = len(corpus) / (time.perf_counter() - start)
+    return labels, latencies, throughput
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", help="text file with one message per line")
+    parser.add_argument("--backends", nargs="+", default=["onnx", "onnx-int8"], choices=EMOTION_BACKENDS[1:])
+    parser.add_argument("--batch-size", type=int, default=16)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    results = {}
+    for backend in ("torch", *args.backends):
+        results[backend] = run_backend(EmotionModel(backend=backend), corpus, args.batch_size)
+
+    reference = results["torch"][0]
+    print(f"{len(corpus)} messages, batch size {args.batch_size}\n")
+    print(f"{'backend':<10} {'agreement':>10} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8} {'msg/s':>8}")
+    for backend, (labels, latencies, throughput) in results.items():
+        agreement = sum(a == b for a, b in zip(labels, reference)) / len(corpus)
+        print(
+            f"{backend:<10} {agreement:>9.1%} {percentile(latencies, 50):>8.2f} {percentile(latencies, 95):>8.2f} "
+            f"{statistics.mean(latencies):>8.2f} {throughput:>8.1f}"
+        )
+
+    for backend in args.backends:
+        disagreements = [
+            (text, ref, label) for text, ref, label in zip(corpus, reference, results[backend][0]) if ref != label
+        ]
+        for text, ref, label in disagreements:
+            print(f"  [{backend}] {text!r}: torch={ref} {backend}={label}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Saves local snapshots of both models so the API can start with MODEL_SNAPSHOT_DIR and no hub lookups.
+
+Run from the backend directory:
+
+    python -m scripts.download_models snapshots/
+    MODEL_SNAPSHOT_DIR=snapshots uvicorn main:app
+"""
+import os
+import sys
+from sentence_transformers import SentenceTransformer
+from transformers import (
+    AutoTokenizer,
+    AutoModelForSequenceClassification,
+    BlenderbotTokenizer,
+    BlenderbotForConditionalGeneration,
+)
+
+MODELS = [
+    ("cardiffnlp/twitter-roberta-base-emotion", AutoTokenizer, AutoModelForSequenceClassification),
+    ("facebook/blenderbot-400M-distill", BlenderbotTokenizer, BlenderbotForConditionalGeneration),
+]
+
+
+def main():
+    snapshot_dir = sys.argv[1] if len(sys.argv) > 1 else "snapshots"
+    for model_name, tokenizer_cls, model_cls in MODELS:
+        target = os.path.join(snapshot_dir, model_name)
+        tokenizer_cls.from_pretrained(model_name).save_pretrained(target)
+        model_cls.from_pretrained(model_name).save_pretrained(target)
+        print(f"✅ {model_name} -> {target}")
+
+    # Embedder for the semantic reply cache (SEMANTIC_CACHE=on)
+    embedder = os.getenv("SEMANTIC_CACHE_EMBEDDER", "sentence-transformers/all-MiniLM-L6-v2")
+    target = os.path.join(snapshot_dir, embedder)
+    SentenceTransformer(embedder).save(target)
+    print(f"✅ {embedder} -> {target}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Moves stored chats between the document and bucket layouts (see database/chatBuckets.py).
+
+Run from the backend directory against the configured MONGO_URI:
+
+    python -m scripts.migrate_chat_storage --to buckets
+    python -m scripts.migrate_chat_storage --to documents --user 64f...
+
+Chats are copied chunk by chunk and each chunk is deleted from the source layout only after it
+was written to the target, so the migration can run while the app is serving (history reads merge
+both layouts and drop duplicates) and can be resumed after an interruption. Set CHAT_STORAGE_MODE
+to the target layout before or after migrating; new chats are written in whichever mode is set.
+"""
+import argparse
+import asyncio
+import time
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError
+from database.dbConnection import client, db, chat_collection, bucket_collection
+from database.chatBuckets import BUCKET_MAX_TURNS, build_buckets, from_turn
+from database.analytics import day_key
+from database.indexes import ensure_indexes
+
+DUPLICATE_KEY = 11000
+
+
+async def to_buckets(user_id=None, chunk_size=5000, max_turns=BUCKET_MAX_TURNS):
+    query = {"user_id": user_id} if user_id else {}
+    cursor = chat_collection.find(query).sort([("user_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)])
+    moved, pending = 0, []
+
+    async def write(records):
+        remaining = records
+        while remaining:
+            buckets = build_buckets(remaining, max_turns)
+            try:
+                await bucket_collection.insert_many(buckets, ordered=False)
+                break
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                if any(err.get("code") != DUPLICATE_KEY for err in errors):
+                    raise
+            # Buckets written by an interrupted run have the same _id and come back as duplicates, but
+            # chats logged for that user-day since then aren't in them: those go into new buckets
+            duplicates = [buckets[err["index"]] for err in errors]
+            stored = set(await bucket_collection.distinct("turns.i", {"_id": {"$in": [b["_id"] for b in duplicates]}}))
+            wanted = {turn["i"] for bucket in duplicates for turn in bucket["turns"]}
+            remaining = [r for r in remaining if r["_id"] in wanted and r["_id"] not in stored]
+        await chat_collection.delete_many({"_id": {"$in": [r["_id"] for r in records]}})
+        return len(records)
+
+    async for doc in cursor:
+        pending.append(doc)
+        if len(pending) >= chunk_size:
+            # Hold back the last user-day so it isn't split across two partly filled buckets
+            last = (pending[-1]["user_id"], day_key(pending[-1]["timestamp"]))
+            split = next((i for i in range(len(pending) - 1, -1, -1)
+                          if (pending[i]["user_id"], day_key(pending[i]["timestamp"])) != last), -1) + 1
+            if split:
+                moved += await write(pending[:split])
+                pending = pending[split:]
+                print(f"  {moved:,} chats moved", end="\r")
+    if pending:
+        moved += await write(pending)
+    return moved
+
+
+async def to_documents(user_id=None, chunk_size=20):
+    query = {"user_id": user_id} if user_id else {}
+    moved = 0
+    while buckets := await bucket_collection.find(query).sort("_id", ASCENDING).limit(chunk_size).to_list(None):
+        docs = [{"user_id": bucket["user_id"], **from_turn(turn)} for bucket in buckets for turn in bucket["turns"]]
+        if docs:
+            try:
+                await chat_collection.insert_many(docs, ordered=False)
+            except BulkWriteError as e:
+                # Turns already copied by an interrupted run keep their _id and come back as duplicates
+                if any(err.get("code") != DUPLICATE_KEY for err in e.details.get("writeErrors", [])):
+                    raise
+        await bucket_collection.delete_many({"_id": {"$in": [bucket["_id"] for bucket in buckets]}})
+        moved += len(docs)
+        print(f"  {moved:,} chats moved", end="\r")
+    return moved
+
+
+async def run(target, user_id=None):
+    try:
+        await ensure_indexes(db)
+        start = time.perf_counter()
+        moved = await (to_buckets(user_id) if target == "buckets" else to_documents(user_id))
+        print(f"Moved {moved:,} chats to the {target} layout in {time.perf_counter() - start:.1f}s")
+    finally:
+        await client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--to", choices=("buckets", "documents"), required=True, help="target layout")
+    parser.add_argument("--user", help="only migrate this user_id")
+    args = parser.parse_args()
+    asyncio.run(run(args.to, args.user))
+
+
+if __name__ == "__main__":
+    main()
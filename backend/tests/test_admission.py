@@ -0,0 +1,100 @@
+import asyncio
+import pytest
+
+pytest.importorskip("fastapi")
+from fastapi import HTTPException
+from utils.admission import AdmissionController, TokenBucket
+
+
+def test_token_bucket_allows_burst_then_asks_to_wait(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("utils.admission.time.monotonic", lambda: now[0])
+    bucket = TokenBucket(rate_per_minute=60, burst=3)
+
+    assert [bucket.take("u") for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.take("u") == pytest.approx(1.0)
+    assert bucket.take("other") == 0.0  # buckets are per user
+
+    now[0] += 1.0  # one token refilled at 1 per second
+    assert bucket.take("u") == 0.0
+    assert bucket.take("u") > 0
+
+
+def test_rate_limited_user_gets_429_with_retry_after():
+    async def run():
+        admission = AdmissionController(max_in_flight=4, rate_per_minute=60, burst=1)
+        async with admission.admit("u"):
+            pass
+        with pytest.raises(HTTPException) as rejected:
+            await admission.acquire("u")
+        return admission, rejected.value
+
+    admission, error = asyncio.run(run())
+    assert error.status_code == 429
+    assert error.headers["Retry-After"] == "1"
+    assert admission.rate_limited == 1 and admission.admitted == 1
+
+
+def test_request_that_cannot_meet_its_deadline_is_shed_up_front():
+    async def run():
+        admission = AdmissionController(max_in_flight=1, max_queue=10, deadline_ms=1000, rate_per_minute=0)
+        admission.service_time = 0.6  # one request ahead: 0.6 s wait + 0.6 s service > 1 s
+        release = await admission.acquire("a")
+        with pytest.raises(HTTPException) as rejected:
+            await admission.acquire("b")
+        release()
+        return admission, rejected.value
+
+    admission, error = asyncio.run(run())
+    assert error.status_code == 503
+    assert "deadline" in error.detail and "Retry-After" in error.headers
+    assert admission.shed_deadline == 1 and admission.queued == 0 and admission.in_flight == 0
+
+
+def test_queued_request_gives_up_once_its_deadline_passes():
+    async def run():
+        admission = AdmissionController(max_in_flight=1, max_queue=10, deadline_ms=300, rate_per_minute=0)
+        admission.service_time = 0.1
+        release = await admission.acquire("a")  # held past b's deadline
+        with pytest.raises(HTTPException) as rejected:
+            await admission.acquire("b")
+        release()
+        await admission.acquire("c")  # the slot is usable again
+        return admission, rejected.value
+
+    admission, error = asyncio.run(run())
+    assert error.status_code == 503
+    assert admission.shed_deadline == 1 and admission.admitted == 2
+
+
+def test_release_is_idempotent():
+    async def run():
+        admission = AdmissionController(max_in_flight=1, rate_per_minute=0)
+        release = await admission.acquire("u")
+        release()
+        release()
+        return admission
+
+    admission = asyncio.run(run())
+    assert admission.in_flight == 0 and admission._slots._value == 1
+
+
+def test_crisis_messages_bypass_admission(monkeypatch):
+    chat = pytest.importorskip("routes.chat")
+    from models.responseModel import CRISIS_MESSAGE
+
+    closed = AdmissionController(max_in_flight=1, rate_per_minute=60, burst=1)
+    closed.rate_limit.take("u")  # out of tokens: anything going through admission gets a 429
+    written = []
+
+    async def write(record):
+        written.append(record)
+
+    monkeypatch.setattr(chat, "admission", closed)
+    monkeypatch.setattr(chat.chat_log_writer, "write", write)
+    monkeypatch.setattr(chat.registry, "ready", False)  # and no models needed either
+
+    emotion, reply = asyncio.run(chat.respond("u", "I want to kill myself"))
+    assert (emotion, reply) == ("crisis", CRISIS_MESSAGE)
+    assert closed.rate_limited == 0 and closed.admitted == 0
+    assert written[0]["emotion"] == "crisis"
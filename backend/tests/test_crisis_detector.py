@@ -0,0 +1,75 @@
+import pytest
+from models.safetyEngine import CrisisDetector, crisis_detector
+
+
+@pytest.mark.parametrize("message", [
+    "I want to kill myself",
+    "i think about suicide a lot",
+    "I feel hopeless",
+    "I'm worthless.",
+    "I just want to end it all",
+    "I don't want to live anymore",
+    "Sometimes I wish I was dead",
+    "I've been self harming again",
+])
+def test_flags_crisis_phrases(message):
+    assert crisis_detector.detect(message)
+
+
+@pytest.mark.parametrize("message", [
+    "I feel hopelessness every morning",
+    "all this worthlessness",
+    "I keep thinking about killing myself",
+    "I nearly overdosed last week",
+    "I've been cutting myself",
+    "ending my life seems easier",
+    "having suicidal thoughts",
+])
+def test_flags_inflected_forms(message):
+    assert crisis_detector.detect(message)
+
+
+@pytest.mark.parametrize("message", [
+    "I want to kiiiill myselfff!!!",
+    "KILL MYSELF",
+    "I'm so HOPELESS...",
+    "I want to end it alllll",
+])
+def test_normalizes_case_punctuation_and_repeated_letters(message):
+    assert crisis_detector.detect(message)
+
+
+@pytest.mark.parametrize("message", [
+    "Let's just end it already and order pizza",
+    "I'm a hopelessly romantic person",
+    "I'm killing it at work this week",
+    "My library books are overdue",
+])
+def test_ignores_lookalike_phrases(message):
+    assert not crisis_detector.detect(message)
+
+
+@pytest.mark.parametrize("message", [
+    "thinking about suicde",
+    "sucidal again",
+    "i wanna die",
+    "kms",
+    "i feel so hopless",
+    "I want to hurt my self",
+    "I do not want to live",
+])
+def test_misspellings_map_to_phrases(message):
+    assert crisis_detector.detect(message)
+
+
+def test_misspellings_only_replace_whole_words():
+    detector = CrisisDetector(["kill myself"], {"kms": "kill myself"})
+    assert detector.match("ok kms") == "kil myself"
+    assert detector.match("the bookms shelf") is None
+
+
+def test_longer_phrases_sharing_a_prefix_still_match():
+    detector = CrisisDetector(["end it", "end it all"])
+    assert detector.match("I want to end it all") == "end it al"
+    assert detector.match("I want to end it") == "end it"
+    assert detector.match("I want to end items") is None
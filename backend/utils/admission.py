@@ -0,0 +1,140 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+from utils import metrics
+
+
+class TokenBucket:
+    """Per-user rate limit: `burst` requests at once, refilled at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute=30.0, burst=10, max_users=100000):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.max_users = max_users
+        self._buckets = OrderedDict()  # user_id -> [tokens, last refill]
+
+    def take(self, user_id) -> float:
+        """Takes a token; returns 0 if one was available, else seconds until the next one."""
+        now = time.monotonic()
+        bucket = self._buckets.pop(user_id, None) or [float(self.burst), now]
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        self._buckets[user_id] = bucket
+        if len(self._buckets) > self.max_users:
+            self._buckets.popitem(last=False)  # least recently seen; it would be refilled by now anyway
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) / self.rate
+
+
+class AdmissionController:
+    """Bounds the work queued for the models so admitted requests keep a bounded latency.
+
+    At most `max_in_flight` requests run inference at once and at most `max_queue` wait for a slot.
+    A request is shed with 503 + Retry-After when the queue is full, or when the expected wait plus
+    service time (an EWMA of recent requests) would already blow its `deadline_ms`; a waiting request
+    gives up as soon as its deadline can no longer be met. Per-user token buckets answer 429 first.
+    Crisis messages never come through here.
+    """
+
+    def __init__(self, max_in_flight=16, max_queue=64, deadline_ms=15000.0, rate_per_minute=30.0, burst=10):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.deadline = deadline_ms / 1000
+        self.rate_limit = TokenBucket(rate_per_minute, burst) if rate_per_minute > 0 else None
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self.in_flight = self.queued = 0
+        self.service_time = 1.0  # seconds, EWMA; starts pessimistic-ish and adapts within a few requests
+        self.admitted = self.shed_queue_full = self.shed_deadline = self.rate_limited = 0
+
+    def expected_wait(self) -> float:
+        if self.in_flight < self.max_in_flight:
+            return 0.0
+        # Every slot ahead of us frees up after about one service time, max_in_flight at a time
+        return (self.queued // self.max_in_flight + 1) * self.service_time
+
+    def _shed(self, reason, retry_after):
+        raise HTTPException(
+            status_code=503,
+            detail=f"The service is busy ({reason}). Try again shortly.",
+            headers={"Retry-After": str(max(1, round(retry_after)))},
+        )
+
+    async def acquire(self, user_id):
+        """Admits one request or raises 429/503; returns an idempotent release callback."""
+        if self.rate_limit is not None:
+            retry_after = self.rate_limit.take(user_id)
+            if retry_after:
+                self.rate_limited += 1
+                raise HTTPException(status_code=429, detail="You're sending messages too quickly. Take a breath and try again.",
+                                    headers={"Retry-After": str(max(1, round(retry_after)))})
+
+        wait = self.expected_wait()
+        if wait and self.queued >= self.max_queue:
+            self.shed_queue_full += 1
+            self._shed("queue full", wait)
+        if wait + self.service_time > self.deadline:
+            self.shed_deadline += 1
+            self._shed("deadline", wait)
+
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.deadline - self.service_time)
+        except asyncio.TimeoutError:
+            self.shed_deadline += 1
+            self._shed("deadline", self.expected_wait())
+        finally:
+            self.queued -= 1
+
+        self.in_flight += 1
+        self.admitted += 1
+        start = time.monotonic()
+        released = False
+
+        def release():
+            nonlocal released
+            if released:
+                return
+            released = True
+            self.in_flight -= 1
+            self.service_time = 0.8 * self.service_time + 0.2 * (time.monotonic() - start)
+            self._slots.release()
+
+        return release
+
+    @asynccontextmanager
+    async def admit(self, user_id):
+        release = await self.acquire(user_id)
+        try:
+            yield
+        finally:
+            release()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_deadline": self.shed_deadline,
+            "rate_limited": self.rate_limited,
+            "service_time_ms": round(self.service_time * 1000, 1),
+            "expected_wait_ms": round(self.expected_wait() * 1000, 1),
+        }
+
+
+admission = AdmissionController(
+    max_in_flight=int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "16")),
+    max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "64")),
+    deadline_ms=float(os.getenv("ADMISSION_DEADLINE_MS", "15000")),
+    rate_per_minute=float(os.getenv("CHAT_RATE_PER_MINUTE", "30")),
+    burst=int(os.getenv("CHAT_RATE_BURST", "10")),
+)
+metrics.register("admission", admission.stats)
@@ -0,0 +1,11 @@
+# Process-wide registry of component stats, served by GET /metrics
+_providers = {}
+
+
+def register(name: str, provider):
+    """`provider` is a zero-argument callable returning a JSON-serializable dict."""
+    _providers[name] = provider
+
+
+def snapshot() -> dict:
+    return {name: provider() for name, provider in _providers.items()}
@@ -0,0 +1,170 @@
+import asyncio
+import hashlib
+import hmac
+import multiprocessing
+import os
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+import bcrypt
+from fastapi import HTTPException
+from utils import metrics
+
+
+def _prehash(password: str) -> bytes:
+    # Full SHA256 first (no truncation), so passwords over bcrypt's 72-byte limit still count in full
+    return hashlib.sha256(password.encode()).hexdigest().encode()
+
+
+def _init_worker(nice: int):
+    if nice and hasattr(os, "nice"):
+        os.nice(nice)  # hashing yields the CPU to inference when both are busy
+
+
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(_prehash(password), bcrypt.gensalt(rounds)).decode()
+
+
+def _verify(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(_prehash(password), hashed.encode())
+
+
+def _time_hash(rounds: int) -> float:
+    start = time.perf_counter()
+    _hash("calibration", rounds)
+    return (time.perf_counter() - start) * 1000
+
+
+def cost_of(hashed: str):
+    """The bcrypt cost factor of a stored hash, or None if it isn't a bcrypt hash (legacy plaintext)."""
+    parts = hashed.split("$")
+    if len(parts) == 4 and parts[1] in ("2a", "2b", "2y") and parts[2].isdigit():
+        return int(parts[2])
+    return None
+
+
+class PasswordHasher:
+    """bcrypt(SHA-256(password)) on a dedicated process pool, away from the event loop and inference.
+
+    At most `max_concurrency` hashes run at once and at most `max_waiting` more may queue; beyond that
+    requests get a 503 right away, so a login flood costs a bounded amount of CPU. The cost factor is
+    calibrated on startup to the highest that hashes within `target_ms`, unless `rounds` is fixed, and
+    `verify()` returns a fresh hash whenever a stored one is weaker (or legacy plaintext).
+    """
+
+    def __init__(self, workers=1, max_concurrency=None, max_waiting=64, target_ms=250.0, rounds=None,
+                 min_rounds=10, max_rounds=16, nice=5):
+        self.workers = workers
+        self.max_concurrency = max_concurrency or workers
+        self.max_waiting = max_waiting
+        self.target_ms = target_ms
+        self.rounds = rounds or min_rounds
+        self.fixed_rounds = rounds is not None
+        self.min_rounds = min_rounds
+        self.max_rounds = max_rounds
+        self.nice = nice
+        self._pool = None
+        self._slots = None
+        self._waiting = 0
+        self._dummy_hash = None  # verified against for unknown accounts
+        self.hashes = self.verifications = self.upgrades = self.rejected = 0
+        self.busy_ms = 0.0
+
+    async def start(self):
+        # spawn: forking the API process would copy the loaded models and event loop state
+        context = multiprocessing.get_context("spawn")
+        self._pool = ProcessPoolExecutor(self.workers, mp_context=context, initializer=_init_worker, initargs=(self.nice,))
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        if not self.fixed_rounds:
+            self.rounds = await self.calibrate()
+        self._dummy_hash = await self._run(_hash, secrets.token_hex(16), self.rounds)
+
+    async def calibrate(self) -> int:
+        """Highest cost in [min_rounds, max_rounds] whose hash time stays within target_ms.
+
+        Each extra round doubles bcrypt's work, so one timed hash at min_rounds is extrapolated.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._pool, _time_hash, 4)  # first call pays for process startup
+        elapsed = await loop.run_in_executor(self._pool, _time_hash, self.min_rounds)
+        rounds = self.min_rounds
+        while rounds < self.max_rounds and elapsed * 2 <= self.target_ms:
+            rounds += 1
+            elapsed *= 2
+        return rounds
+
+    async def _run(self, fn, *args):
+        if self._pool is None:
+            return fn(*args)  # not started (scripts): hash inline
+        if self._waiting >= self.max_concurrency + self.max_waiting:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Too many sign-in attempts right now. Try again shortly.",
+                                headers={"Retry-After": "2"})
+        self._waiting += 1
+        try:
+            async with self._slots:
+                start = time.perf_counter()
+                try:
+                    return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+                finally:
+                    self.busy_ms += (time.perf_counter() - start) * 1000
+        finally:
+            self._waiting -= 1
+
+    async def hash(self, password: str) -> str:
+        self.hashes += 1
+        return await self._run(_hash, password, self.rounds)
+
+    async def verify(self, password: str, stored: str):
+        """(matches, new_hash). new_hash is set when the stored hash should be replaced."""
+        self.verifications += 1
+        cost = cost_of(stored)
+        if cost is None:
+            # Accounts registered before passwords were hashed stored them in plaintext
+            matches = hmac.compare_digest(password.encode(), stored.encode())
+        else:
+            matches = await self._run(_verify, password, stored)
+        if not matches or (cost is not None and cost >= self.rounds):
+            return matches, None
+        self.upgrades += 1
+        return True, await self.hash(password)
+
+    async def verify_unknown(self, password: str) -> bool:
+        """Spends a real verification on a dummy hash at the current cost, then returns False.
+
+        Login calls this when the email isn't registered, so unknown accounts take as long to
+        reject as wrong passwords and response times don't reveal which emails exist.
+        """
+        self.verifications += 1
+        if cost_of(self._dummy_hash or "") != self.rounds:
+            self._dummy_hash = await self._run(_hash, secrets.token_hex(16), self.rounds)
+        await self._run(_verify, password, self._dummy_hash)
+        return False
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> dict:
+        return {
+            "rounds": self.rounds,
+            "workers": self.workers,
+            "in_flight": self._waiting,
+            "hashes": self.hashes,
+            "verifications": self.verifications,
+            "upgrades": self.upgrades,
+            "rejected": self.rejected,
+            "busy_ms": round(self.busy_ms, 1),
+        }
+
+
+password_hasher = PasswordHasher(
+    workers=int(os.getenv("PASSWORD_HASH_WORKERS", "1")),
+    max_concurrency=int(os.getenv("PASSWORD_HASH_CONCURRENCY", "0")) or None,
+    max_waiting=int(os.getenv("PASSWORD_HASH_MAX_WAITING", "64")),
+    target_ms=float(os.getenv("PASSWORD_HASH_TARGET_MS", "250")),
+    rounds=int(os.getenv("BCRYPT_ROUNDS", "0")) or None,
+    nice=int(os.getenv("PASSWORD_HASH_NICE", "5")),
+)
+metrics.register("password_hasher", password_hasher.stats)
@@ -1,60 +1,57 @@
 import streamlit as st
 import requests
-from gtts import gTTS
-from io import BytesIO
-import base64
-import speech_recognition as sr
 import pandas as pd
 import plotly.express as px
-from collections import Counter
+from collections import Counter, deque
+from uuid import uuid4
 import random
-
-# ===== Backend URLs =====
-FASTAPI_BASE = "http://127.0.0.1:8000"
-CHAT_URL = f"{FASTAPI_BASE}/chat"
-REGISTER_URL = f"{FASTAPI_BASE}/auth/register"
-LOGIN_URL = f"{FASTAPI_BASE}/auth/login"
-HISTORY_URL = f"{FASTAPI_BASE}/get-history"
-CLEAR_URL = f"{FASTAPI_BASE}/clear-chat"
+import backend_client as api
 
 # ===== Page Setup =====
 st.set_page_config(page_title="MindMate - Mental Health Chatbot", page_icon="🧠", layout="wide")
 
-# ===== Helper: Auth API =====
-import requests
-
-
-def register_user(username, email, password):
-    try:
-        payload = {
-            "name": username,
-            "email": email,
-            "password": password
-        }
-        res = requests.post(REGISTER_URL, json=payload)
-
-        if res.status_code == 200:
-            data = res.json()
-            return {
-                "success": True,
-                "message": data.get("message", "Registration successful"),
-                "token": data.get("token")
-            }
-        else:
-            data = res.json()
-            return {
-                "success": False,
-                "error": data.get("detail", "Registration failed. Try again.")
-            }
-    except requests.exceptions.RequestException as e:
-        return {
-            "success": False,
-            "error": f"Connection error: {str(e)}"
-        }
-
-def login_user(name, email, password):
-    res = requests.post(LOGIN_URL, json={"name": name, "email": email, "password": password})
-    return res.json() if res.status_code == 200 else {"error": "Login failed"}
+# ===== Running Mood Aggregates =====
+# Updated once per reply, so reruns don't rescan the whole conversation
+IGNORED_EMOTIONS = (None, "error", "default")
+EMOTION_LEVELS = {"sadness": 1, "anger": 2, "neutral": 3, "joy": 4}
+TIMELINE_POINTS = 200  # Emotion Flow shows the most recent replies
+VISIBLE_MESSAGES = 20  # chat entries shown before older ones are collapsed
+CLEAR_MAX_POLLS = 30  # status checks on a history clear before the app stops tracking it
+
+
+def reset_mood():
+    st.session_state.mood_counts = Counter()
+    st.session_state.mood_timeline = deque(maxlen=TIMELINE_POINTS)  # (reply number, emotion)
+    st.session_state.mood_replies = 0
+    st.session_state.history_id = uuid4().hex  # figure caches are shared by all sessions
+    st.session_state.history_version = 0
+    st.session_state.visible_messages = VISIBLE_MESSAGES
+
+
+def record_reply(emotion):
+    st.session_state.history_version += 1
+    if emotion in IGNORED_EMOTIONS:
+        return
+    st.session_state.mood_counts[emotion] += 1
+    st.session_state.mood_replies += 1
+    st.session_state.mood_timeline.append((st.session_state.mood_replies, emotion))
+
+
+# Plotly figures are rebuilt only when the history version changes; the underscored
+# arguments aren't hashed, (history_id, version) stands in for them
+@st.cache_data(max_entries=256)
+def mood_trend_figure(history_id, version, _counts):
+    df_emotions = pd.DataFrame(list(_counts.items()), columns=["Emotion", "Count"])
+    return px.bar(df_emotions, x="Emotion", y="Count", color="Emotion", title="Mood Trend 💫")
+
+
+@st.cache_data(max_entries=256)
+def emotion_flow_figure(history_id, version, _timeline):
+    df = pd.DataFrame(list(_timeline), columns=["timestamp", "emotion"])
+    df["level"] = df["emotion"].map(EMOTION_LEVELS).fillna(3)
+    fig = px.line(df, x="timestamp", y="level", text="emotion", markers=True, title="Emotion Flow 🧘‍♀️")
+    fig.update_yaxes(tickvals=list(EMOTION_LEVELS.values()), ticktext=list(EMOTION_LEVELS.keys()))
+    return fig
 
 # ===== Authentication =====
 if "token" not in st.session_state:
@@ -67,6 +64,15 @@ if "user_input" not in st.session_state:
     st.session_state.user_input = ""
 if "user_name" not in st.session_state:
     st.session_state.user_name = ""
+if "analytics" not in st.session_state:
+    st.session_state.analytics = None
+if "dashboard_loaded" not in st.session_state:
+    st.session_state.dashboard_loaded = False
+if "clear_job" not in st.session_state:
+    st.session_state.clear_job = None  # id of the history clear still being tracked
+    st.session_state.clear_polls = 0
+if "mood_counts" not in st.session_state:
+    reset_mood()
 
 st.title("🧠 MindMate - Your Mental Health Companion")
 st.caption("Providing emotional support, positivity, and mindful suggestions 💬")
@@ -81,7 +87,7 @@ if not st.session_state.token:
         email = st.sidebar.text_input("Email")
         password = st.sidebar.text_input("Password", type="password")
         if st.sidebar.button("Login"):
-            data = login_user(name, email, password)
+            data = api.login_user(name, email, password)
             if "access_token" in data:
                 st.session_state.token = data["access_token"]
                 st.session_state.user_id = data["user"]["_id"]
@@ -96,49 +102,71 @@ if not st.session_state.token:
         email = st.sidebar.text_input("Email")
         password = st.sidebar.text_input("Password", type="password")
         if st.sidebar.button("Register"):
-            data = register_user(username, email, password)
+            data = api.register_user(username, email, password)
             if "message" in data:
                 st.success("🎉 Registration successful! Please login.")
             else:
                 st.error(data.get("error", "Registrationnnnnn failed."))
 else:
     # ===== MAIN CHAT SECTION =====
-    def listen_to_voice():
-        recognizer = sr.Recognizer()
-        with sr.Microphone() as source:
-            st.info("🎙️ Listening... please speak clearly.")
-            audio = recognizer.listen(source)
-            try:
-                text = recognizer.recognize_google(audio)
-                st.success(f"🗣️ You said: {text}")
-                return text
-            except sr.UnknownValueError:
-                st.error("❌ Sorry, I didn’t catch that.")
-            except sr.RequestError:
-                st.error("⚠️ Speech recognition service unavailable.")
-            return None
+    # Replies repeat (crisis message, coping tips), so their audio is kept for the whole process
+    @st.cache_data(max_entries=64, show_spinner=False)
+    def reply_audio(text, _token):
+        return api.synthesize(_token, text)
 
     def speak_text(text):
-        tts = gTTS(text=text, lang="en")
-        mp3_fp = BytesIO()
-        tts.write_to_fp(mp3_fp)
-        mp3_fp.seek(0)
-        b64 = base64.b64encode(mp3_fp.read()).decode()
-        md = f"""
-        <audio autoplay>
-        <source src="data:audio/mp3;base64,{b64}" type="audio/mp3">
-        </audio>
-        """
-        st.markdown(md, unsafe_allow_html=True)
-
-    def send_message(message):
-        headers = {"Authorization": f"Bearer {st.session_state.token}"}
-        response = requests.post(CHAT_URL, json={"user_id": st.session_state.user_id, "message": message}, headers=headers)
-        if response.status_code == 200:
-            data = response.json()
-            return data["reply"], data["emotion"]
-        else:
-            return "⚠️ Server error. Try again later.", "error"
+        try:
+            audio = reply_audio(text, st.session_state.token)
+        except requests.exceptions.RequestException:
+            return  # the reply is on screen either way
+        st.audio(audio, format="audio/wav", autoplay=True)
+
+    def stream_message(message, placeholder):
+        """Renders the reply as the backend streams it; returns (reply, emotion) once done."""
+        emotion, shown = None, ""
+        try:
+            for event, data in api.stream_events(st.session_state.token, message):
+                if event == "crisis":
+                    shown = data["text"]
+                elif event == "emotion":
+                    emotion = data["emotion"]
+                elif event in ("token", "coping"):
+                    shown += data["text"]
+                elif event == "done":
+                    return data["reply"], data["emotion"]
+                elif event == "error":
+                    return api.SERVER_ERROR, "error"
+
+                placeholder.markdown(
+                    f"🤖 <b>MindMate:</b> {shown}<br><small>Emotion: {emotion or '…'}</small>",
+                    unsafe_allow_html=True,
+                )
+        except api.StreamUnavailable:
+            # Nothing reached the backend, so plain /chat can't answer the message twice
+            return api.send_message(st.session_state.token, message, st.session_state.private_replies)
+        except api.StreamRejected as e:
+            return e.reply, "error"
+        except requests.exceptions.RequestException:
+            return api.SERVER_ERROR, "error"
+        return shown or api.SERVER_ERROR, emotion or "error"
+
+    def load_dashboard():
+        """Restores saved history and 30-day analytics once per login, both fetched in parallel."""
+        history, analytics = api.load_dashboard(st.session_state.token)
+        if history is not None:
+            st.session_state.history = [
+                entry
+                for chat in history["history"]
+                for entry in (("You", chat["message"], None), ("MindMate", chat["bot_reply"], chat["emotion"]))
+            ]
+            reset_mood()
+            for chat in history["history"]:
+                record_reply(chat["emotion"])
+        st.session_state.analytics = analytics
+        st.session_state.dashboard_loaded = True
+
+    if not st.session_state.dashboard_loaded:
+        load_dashboard()
 
     # ===== Sidebar User Info =====
     st.sidebar.markdown(f"👤 Logged in as: **{st.session_state.user_name}**")
@@ -146,8 +174,46 @@ else:
         st.session_state.token = None
         st.session_state.user_id = None
         st.session_state.history = []
+        st.session_state.analytics = None
+        st.session_state.dashboard_loaded = False
+        st.session_state.clear_job = None
+        reset_mood()
         st.rerun()
 
+    if st.sidebar.button("🧹 Clear History"):
+        job = api.clear_history(st.session_state.token)
+        if job:
+            st.session_state.history = []
+            st.session_state.analytics = None
+            st.session_state.clear_job = job["job_id"]
+            st.session_state.clear_polls = 0
+            reset_mood()
+        else:
+            st.sidebar.error("⚠️ Couldn't clear history. Try again later.")
+
+    # The clear runs as a background job on the backend; check on it once per rerun until it ends,
+    # or until CLEAR_MAX_POLLS checks in case the job is stuck
+    if st.session_state.clear_job:
+        job = api.clear_status(st.session_state.token, st.session_state.clear_job)
+        st.session_state.clear_polls += 1
+        if (job is None or job["status"] in ("queued", "running")) and st.session_state.clear_polls >= CLEAR_MAX_POLLS:
+            st.sidebar.warning("🧹 Clearing is taking longer than expected. Check your history later, "
+                               "or clear it again if older messages are still there.")
+            st.session_state.clear_job = None
+        elif job is None or job["status"] in ("queued", "running"):
+            removed = job["deleted"] if job else 0
+            st.sidebar.info(f"🧹 Your chat history is being cleared... ({removed} messages so far)")
+            if st.sidebar.button("🔄 Check again"):
+                st.rerun()
+        elif job["status"] == "done":
+            st.sidebar.success(f"🧹 Chat history cleared ({job['deleted']} messages).")
+            st.session_state.clear_job = None
+        else:
+            st.sidebar.error(f"⚠️ Clearing history failed: {job.get('error', 'unknown error')}")
+            st.session_state.clear_job = None
+
+    st.sidebar.checkbox("🔒 Private replies", key="private_replies",
+                        help="Never answer with, or save into, the reply cache shared by all users.")
     st.sidebar.markdown("---")
 
     # ===== Main Layout =====
@@ -160,48 +226,70 @@ else:
         with col1:
             user_input = st.text_input("Type your message...", value=st.session_state.user_input, key="user_input")
 
-        def update_from_voice():
-            voice_text = listen_to_voice()
-            if voice_text:
-                st.session_state.user_input = voice_text
-
         with col2:
-            st.button("🎤 Speak", on_click=update_from_voice)
+            # Recorded in the browser; the backend transcribes it locally and answers it like a typed message
+            recording = st.audio_input("🎤 Speak", label_visibility="collapsed")
 
-        if st.button("Send") and st.session_state.user_input.strip():
-            reply, emotion = send_message(st.session_state.user_input.strip())
-            st.session_state.history.append(("You", st.session_state.user_input.strip(), None))
+        def add_exchange(message, reply, emotion):
+            st.session_state.history.append(("You", message, None))
             st.session_state.history.append(("MindMate", reply, emotion))
-            speak_text(reply)
+            record_reply(emotion)
+            st.session_state.pending_speech = reply  # played after the rerun, which would drop the player
+
+        if recording is not None and recording.file_id != st.session_state.get("last_recording"):
+            st.session_state.last_recording = recording.file_id  # the widget keeps its value across reruns
+            with st.spinner("🎧 Listening to your message..."):
+                data = api.voice_chat(st.session_state.token, recording.getvalue(), st.session_state.private_replies)
+            if "error" in data:
+                st.error(data["error"])
+            else:
+                add_exchange(data["transcript"], data["reply"], data["emotion"])
+                st.rerun()
+
+        if st.button("Send") and st.session_state.user_input.strip():
+            reply, emotion = stream_message(st.session_state.user_input.strip(), st.empty())
+            add_exchange(st.session_state.user_input.strip(), reply, emotion)
             # st.session_state.user_input = ""
             st.rerun()
 
         # ===== Chat Display =====
-        st.markdown("<div class='main'>", unsafe_allow_html=True)
+        # Only the newest messages are rendered, as one markdown block; older ones stay collapsed
+        history = st.session_state.history
+        hidden = max(0, len(history) - st.session_state.visible_messages)
+
+        def show_earlier():
+            st.session_state.visible_messages += VISIBLE_MESSAGES
+
+        if hidden:
+            st.button(f"⬆️ Show earlier messages ({hidden})", on_click=show_earlier)
+
         emotion_colors = {"joy": "#00C853", "sadness": "#42A5F5", "anger": "#EF5350", "neutral": "#A9A9A9"}
-        for sender, text, emotion in st.session_state.history:
+        bubbles = []
+        for sender, text, emotion in history[hidden:]:
             if sender == "You":
-                st.markdown(f"<div class='chat-bubble-user'><b>🧍You:</b> {text}</div>", unsafe_allow_html=True)
+                bubbles.append(f"<div class='chat-bubble-user'><b>🧍You:</b> {text}</div>")
             else:
                 color = emotion_colors.get(emotion, "#E8EAF6")
-                st.markdown(
-                    f"<div style='background-color:{color};padding:10px;border-radius:12px;margin:6px 0;'>🤖 <b>MindMate:</b> {text}<br><small>Emotion: {emotion}</small></div>",
-                    unsafe_allow_html=True,
+                bubbles.append(
+                    f"<div style='background-color:{color};padding:10px;border-radius:12px;margin:6px 0;'>🤖 <b>MindMate:</b> {text}<br><small>Emotion: {emotion}</small></div>"
                 )
-        st.markdown("</div>", unsafe_allow_html=True)
+        st.markdown("<div class='main'>" + "".join(bubbles) + "</div>", unsafe_allow_html=True)
+
+        if st.session_state.get("pending_speech"):
+            speak_text(st.session_state.pending_speech)
+            st.session_state.pending_speech = None
 
     # ===== Analytics Section =====
     with col_analytics:
         st.markdown("### 📊 Emotional Analytics")
+        counts = st.session_state.mood_counts
+        timeline = st.session_state.mood_timeline
+        version = (st.session_state.history_id, st.session_state.history_version)
 
         with st.expander("💫 Mood Trend Tracker", expanded=False):
             if st.session_state.history:
-                emotions = [emo for s, _, emo in st.session_state.history if s == "MindMate" and emo not in [None, "error", "default"]]
-                if emotions:
-                    counts = Counter(emotions)
-                    df_emotions = pd.DataFrame(list(counts.items()), columns=["Emotion", "Count"])
-                    fig = px.bar(df_emotions, x="Emotion", y="Count", color="Emotion", title="Mood Trend 💫")
-                    st.plotly_chart(fig, use_container_width=True)
+                if counts:
+                    st.plotly_chart(mood_trend_figure(*version, counts), use_container_width=True)
                 else:
                     st.info("No emotions detected yet.")
             else:
@@ -209,18 +297,8 @@ else:
 
         with st.expander("🕒 Emotion Timeline", expanded=False):
             if st.session_state.history:
-                emotion_data = []
-                for s, _, emo in st.session_state.history:
-                    if s == "MindMate" and emo not in [None, "error", "default"]:
-                        emotion_data.append({"timestamp": len(emotion_data) + 1, "emotion": emo})
-
-                if emotion_data:
-                    df = pd.DataFrame(emotion_data)
-                    levels = {"sadness": 1, "anger": 2, "neutral": 3, "joy": 4}
-                    df["level"] = df["emotion"].map(levels).fillna(3)
-                    fig2 = px.line(df, x="timestamp", y="level", text="emotion", markers=True, title="Emotion Flow 🧘‍♀️")
-                    fig2.update_yaxes(tickvals=list(levels.values()), ticktext=list(levels.keys()))
-                    st.plotly_chart(fig2, use_container_width=True)
+                if timeline:
+                    st.plotly_chart(emotion_flow_figure(*version, timeline), use_container_width=True)
                 else:
                     st.info("No timeline data yet.")
             else:
@@ -228,10 +306,8 @@ else:
 
         with st.expander("🌤️ Mood Summary", expanded=False):
             if st.session_state.history:
-                emotions = [emo for s, _, emo in st.session_state.history if s == "MindMate" and emo not in [None, "error", "default"]]
-                if emotions:
-                    counts = Counter(emotions)
-                    total = sum(counts.values())
+                if counts:
+                    total = st.session_state.mood_replies
                     dominant = max(counts, key=counts.get)
                     positivity = round(((counts.get("joy", 0) + 0.5 * counts.get("neutral", 0)) / total) * 100, 1)
 
@@ -250,6 +326,20 @@ else:
             else:
                 st.info("Start chatting to generate mood summary.")
 
+        with st.expander("📅 Last 30 Days", expanded=False):
+            analytics = st.session_state.analytics
+            if analytics and analytics["total"]:
+                df_days = pd.DataFrame(
+                    [{"Day": d["day"], "Emotion": emo, "Count": n} for d in analytics["days"] for emo, n in d["counts"].items()]
+                )
+                fig3 = px.bar(df_days, x="Day", y="Count", color="Emotion", title="Daily Emotions 📅")
+                st.plotly_chart(fig3, use_container_width=True)
+                st.metric("Messages", analytics["total"])
+            elif analytics is None:
+                st.info("Analytics are unavailable right now.")
+            else:
+                st.info("No messages in the last 30 days yet.")
+
         with st.expander("🪷 Self-Care Tips", expanded=True):
             self_care_tips = {
                 "sadness": [
@@ -278,11 +368,7 @@ else:
                 ]
             }
 
-            latest_emotion = None
-            for s, _, emo in reversed(st.session_state.history):
-                if s == "MindMate" and emo not in [None, "error", "default"]:
-                    latest_emotion = emo
-                    break
+            latest_emotion = timeline[-1][1] if timeline else None
 
             if latest_emotion:
                 tip = random.choice(self_care_tips.get(latest_emotion, self_care_tips["neutral"]))
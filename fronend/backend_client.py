@@ -0,0 +1,245 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# ===== Backend URLs =====
+FASTAPI_BASE = os.getenv("MINDMATE_API_URL", "http://127.0.0.1:8000").rstrip("/")
+CHAT_URL = f"{FASTAPI_BASE}/chat/"
+STREAM_URL = f"{FASTAPI_BASE}/chat/stream"
+VOICE_URL = f"{FASTAPI_BASE}/chat/voice"
+HISTORY_URL = f"{FASTAPI_BASE}/chat/history"
+CLEAR_URL = f"{FASTAPI_BASE}/chat/clear"
+REGISTER_URL = f"{FASTAPI_BASE}/auth/register"
+LOGIN_URL = f"{FASTAPI_BASE}/auth/login"
+EMOTIONS_URL = f"{FASTAPI_BASE}/analytics/emotions"
+SPEECH_URL = f"{FASTAPI_BASE}/speech/"
+
+# (connect, read) seconds. Chat replies wait on the models, so they get a longer read timeout;
+# for streams it bounds the gap between two events, not the whole reply.
+CONNECT_TIMEOUT = float(os.getenv("MINDMATE_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.getenv("MINDMATE_READ_TIMEOUT", "10"))
+CHAT_READ_TIMEOUT = float(os.getenv("MINDMATE_CHAT_TIMEOUT", "60"))
+MAX_RETRIES = int(os.getenv("MINDMATE_MAX_RETRIES", "3"))
+
+SERVER_ERROR = "⚠️ Server error. Try again later."
+
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    """One pooled session per Streamlit process, shared by every rerun and every browser session.
+
+    Failed connections are retried for any method (nothing reached the server). Responses are only
+    retried for GET/DELETE: a retried POST /chat would classify and store the message twice.
+    """
+    retry = Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=MAX_RETRIES,
+        status=MAX_RETRIES,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD", "DELETE"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _auth(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _detail(res, default):
+    try:
+        return res.json().get("detail", default)
+    except ValueError:
+        return default
+
+
+def _chat_error(res):
+    """What to show for a failed chat request: the backend's reason when it is busy or rate limiting."""
+    if res.status_code in (429, 503):
+        return f"⚠️ {_detail(res, 'The service is busy. Try again shortly.')}"
+    return SERVER_ERROR
+
+
+class StreamUnavailable(Exception):
+    """The stream endpoint couldn't be reached, so the message can still be sent to /chat instead."""
+
+
+class StreamRejected(Exception):
+    """The backend refused the stream (rate limited, busy, ...); `reply` is what to show instead."""
+
+    def __init__(self, status_code, reply):
+        super().__init__(reply)
+        self.status_code = status_code
+        self.reply = reply
+
+
+# ===== Auth =====
+def register_user(username, email, password):
+    try:
+        payload = {
+            "name": username,
+            "email": email,
+            "password": password
+        }
+        res = get_session().post(REGISTER_URL, json=payload, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+
+        if res.status_code == 200:
+            data = res.json()
+            return {
+                "success": True,
+                "message": data.get("message", "Registration successful"),
+                "token": data.get("token")
+            }
+        return {
+            "success": False,
+            "error": _detail(res, "Registration failed. Try again.")
+        }
+    except requests.exceptions.RequestException as e:
+        return {
+            "success": False,
+            "error": f"Connection error: {str(e)}"
+        }
+
+
+def login_user(name, email, password):
+    try:
+        res = get_session().post(LOGIN_URL, json={"name": name, "email": email, "password": password},
+                                 timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+    except requests.exceptions.RequestException as e:
+        return {"error": f"Connection error: {str(e)}"}
+    return res.json() if res.status_code == 200 else {"error": _detail(res, "Login failed")}
+
+
+# ===== Chat =====
+def send_message(token, message, private=False):
+    """(reply, emotion); on failure the reply is the backend's reason (busy, rate limited) or a generic error.
+
+    `private` keeps the message out of the backend's reply cache, which is shared across users.
+    """
+    try:
+        res = get_session().post(CHAT_URL, json={"message": message, "private": private}, headers=_auth(token),
+                                 timeout=(CONNECT_TIMEOUT, CHAT_READ_TIMEOUT))
+    except requests.exceptions.RequestException:
+        return SERVER_ERROR, "error"
+    if res.status_code == 200:
+        data = res.json()
+        return data["reply"], data["emotion"]
+    return _chat_error(res), "error"
+
+
+def stream_events(token, message):
+    """Yields (event, data) from the SSE stream.
+
+    Raises StreamUnavailable if the backend couldn't be reached and StreamRejected for any non-200
+    answer: a rejected message was already counted by admission, so it must not be resent to /chat.
+    Connection errors while reading propagate as requests.exceptions.RequestException.
+    """
+    try:
+        response = get_session().post(STREAM_URL, json={"message": message}, headers=_auth(token), stream=True,
+                                      timeout=(CONNECT_TIMEOUT, CHAT_READ_TIMEOUT))
+    except requests.exceptions.ConnectionError as e:
+        raise StreamUnavailable(str(e)) from e
+    with response:
+        if response.status_code != 200:
+            raise StreamRejected(response.status_code, _chat_error(response))
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                yield event, json.loads(line[len("data:"):])
+
+
+def _chunks(data, size=32 * 1024):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def voice_chat(token, wav, private=False):
+    """{"transcript", "emotion", "reply"} for a recorded WAV, or {"error": ...}.
+
+    The upload is chunked so the backend starts transcribing before it has the whole recording.
+    """
+    try:
+        res = get_session().post(VOICE_URL, data=_chunks(wav), params={"private": private},
+                                 headers={**_auth(token), "Content-Type": "audio/wav"},
+                                 timeout=(CONNECT_TIMEOUT, CHAT_READ_TIMEOUT))
+    except requests.exceptions.RequestException:
+        return {"error": SERVER_ERROR}
+    if res.status_code == 200:
+        return res.json()
+    return {"error": f"⚠️ {_detail(res, 'Voice message failed. Try again.')}"}
+
+
+def synthesize(token, text):
+    """WAV bytes of `text` from the backend's local TTS. Raises on failure."""
+    res = get_session().post(SPEECH_URL, json={"text": text}, headers=_auth(token),
+                             timeout=(CONNECT_TIMEOUT, CHAT_READ_TIMEOUT))
+    res.raise_for_status()
+    return res.content
+
+
+# ===== History / Analytics =====
+def get_history(token, limit=50, before=None):
+    """One page of chats, oldest first: {"history", "before", "after", "has_more"}."""
+    params = {"limit": limit}
+    if before:
+        params["before"] = before
+    res = get_session().get(HISTORY_URL, params=params, headers=_auth(token), timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+    res.raise_for_status()
+    return res.json()
+
+
+def get_emotions(token, start=None, end=None):
+    """Daily emotion counts from the backend rollups (last 30 days unless start/end are given)."""
+    params = {key: value.isoformat() for key, value in (("start", start), ("end", end)) if value}
+    res = get_session().get(EMOTIONS_URL, params=params, headers=_auth(token), timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+    res.raise_for_status()
+    return res.json()
+
+
+def load_dashboard(token, limit=50):
+    """Fetches the latest history page and the emotion analytics in parallel.
+
+    Returns (history, analytics); either is None if its request failed, so one slow or failing
+    endpoint doesn't blank the other.
+    """
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        history = pool.submit(get_history, token, limit)
+        emotions = pool.submit(get_emotions, token)
+
+    def result(future):
+        try:
+            return future.result()
+        except (requests.exceptions.RequestException, ValueError):
+            return None
+
+    return result(history), result(emotions)
+
+
+def clear_history(token):
+    """Starts clearing the user's history; returns the job ({"job_id", "status", ...}) or None."""
+    try:
+        res = get_session().delete(CLEAR_URL, headers=_auth(token), timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+    except requests.exceptions.RequestException:
+        return None
+    return res.json() if res.status_code == 202 else None
+
+
+def clear_status(token, job_id):
+    try:
+        res = get_session().get(f"{CLEAR_URL}/{job_id}", headers=_auth(token), timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+    except requests.exceptions.RequestException:
+        return None
+    return res.json() if res.status_code == 200 else None